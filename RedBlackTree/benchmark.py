@@ -0,0 +1,533 @@
+'''
+Benchmarks for the red-black tree. Run with the name of a benchmark and an
+optional size, e.g.
+
+    python benchmark.py memory 100000
+'''
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from redblack import *
+from snapshot import *
+from concurrenttree import *
+from persistent import *
+from ticketstore import *
+from btree import *
+
+
+class LegacyNode(object):
+    '''
+    The node layout the tree used before nodes were slotted: a full
+    __dict__ per node and two brand new sentinals for its children.
+    '''
+
+    def __init__(self, ticket, color='red'):
+        self.key = ticket.ticketID
+        self.value = ticket
+        self.color = color
+        self.parent = None
+        self.leftChild = LegacySentinal()
+        self.rightChild = LegacySentinal()
+
+
+class LegacySentinal(object):
+    '''
+    The old, dict-backed sentinal.
+    '''
+
+    def __init__(self):
+        self.key = None
+        self.value = None
+        self.leftChild = None
+        self.rightChild = None
+        self.parent = None
+        self.color = 'black'
+
+
+def measure(build):
+    '''
+    Returns the number of bytes still allocated after calling build(). The
+    built structure is kept alive until the measurement is taken.
+    '''
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def benchmarkMemory(size):
+    '''
+    Compares the bytes per node of the old layout with the current one.
+    The tickets are built up front so only node storage is measured.
+    '''
+    tickets = generateMealTickets(size)
+
+    def buildLegacy():
+        return [LegacyNode(ticket) for ticket in tickets]
+
+    def buildTree():
+        tree = RedBlackTree()
+        for ticket in tickets:
+            tree.insert(ticket)
+        return tree
+
+    legacy = measure(buildLegacy)
+    current = measure(buildTree)
+    print("=== Node memory for {} tickets ===".format(size))
+    print("Legacy layout:  {:>12} bytes ({:.1f} per node)".format(
+        legacy, legacy / size))
+    print("Slotted layout: {:>12} bytes ({:.1f} per node)".format(
+        current, current / size))
+    print("Saved: {:.1f}%".format(100 * (1 - current / legacy)))
+
+
+def timed(function, *args):
+    '''
+    Returns how many seconds function(*args) took to run.
+    '''
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def benchmarkBulk(size):
+    '''
+    Compares loading a batch with repeated inserts against from_tickets on
+    sorted and shuffled input, and against merging into a filled tree.
+    '''
+    tickets = generateMealTickets(size)
+    shuffled = tickets[:]
+    random.shuffle(shuffled)
+
+    def insertAll(batch):
+        tree = RedBlackTree()
+        for ticket in batch:
+            tree.insert(ticket)
+
+    def mergeHalf(batch):
+        tree = RedBlackTree.from_tickets(batch[::2])
+        tree.bulk_insert(batch[1::2])
+
+    print("=== Loading {} tickets ===".format(size))
+    print("insert, sorted:          {:.3f}s".format(
+        timed(insertAll, tickets)))
+    print("insert, shuffled:        {:.3f}s".format(
+        timed(insertAll, shuffled)))
+    print("from_tickets, sorted:    {:.3f}s".format(
+        timed(RedBlackTree.from_tickets, tickets)))
+    print("from_tickets, shuffled:  {:.3f}s".format(
+        timed(RedBlackTree.from_tickets, shuffled)))
+    print("bulk_insert, merge half: {:.3f}s".format(
+        timed(mergeHalf, shuffled)))
+
+
+def benchmarkColdStart(size):
+    '''
+    Compares restarting by re-inserting every ticket with reopening a
+    snapshot, both for answering lookups at once and for rebuilding a tree.
+    '''
+    tickets = generateMealTickets(size)
+    lookups = [random.choice(tickets).ticketID for i in range(1000)]
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'tickets.snap')
+    writeSnapshot(tickets, path)
+
+    def reinsert():
+        tree = RedBlackTree()
+        for ticket in tickets:
+            tree.insert(ticket)
+        for ticketID in lookups:
+            tree.find(ticketID)
+
+    def openMapped():
+        with TicketSnapshot(path) as snap:
+            for ticketID in lookups:
+                snap.find(ticketID)
+
+    def openAndBuild():
+        with TicketSnapshot(path) as snap:
+            snap.toTree()
+
+    print("=== Cold start with {} tickets ({} byte snapshot) ===".format(
+        size, os.path.getsize(path)))
+    print("re-insert + 1000 finds:     {:.3f}s".format(timed(reinsert)))
+    print("mmap open + 1000 finds:     {:.3f}s".format(timed(openMapped)))
+    print("mmap open + toTree():       {:.3f}s".format(timed(openAndBuild)))
+    os.remove(path)
+    os.rmdir(directory)
+
+
+class BigLockTree(ConcurrentRedBlackTree):
+    '''
+    The setup we are replacing: every call, read or write, behind one lock.
+    '''
+
+    def __init__(self):
+        ConcurrentRedBlackTree.__init__(self)
+        self.lock = BigLock()
+
+
+class BigLock(object):
+    '''
+    A plain mutex with the ReadWriteLock interface
+    '''
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    def reading(self):
+        return self._lock
+
+    def writing(self):
+        return self._lock
+
+
+def runThreads(tree, tickets, threads, operations, readRatio):
+    '''
+    Runs threads workers against tree, each doing operations random calls
+    of which readRatio are finds and the rest alternate inserts and deletes
+    of its own tickets. Returns the tickets each worker left in the tree.
+    '''
+    chunks = [tickets[i::threads] for i in range(threads)]
+    kept = [None] * threads
+    lookups = [ticket.ticketID for ticket in tickets]
+
+    def work(number):
+        generator = random.Random(number)
+        own = chunks[number]
+        inside = []
+        for i in range(operations):
+            if generator.random() < readRatio or not own and not inside:
+                tree.find(generator.choice(lookups))
+            elif own and (not inside or generator.random() < 0.6):
+                ticket = own.pop()
+                tree.insert(ticket)
+                inside.append(ticket)
+            else:
+                ticket = inside.pop(generator.randrange(len(inside)))
+                if not tree.delete(ticket.ticketID):
+                    raise AssertionError("lost {}".format(ticket.ticketID))
+                own.append(ticket)
+        kept[number] = inside
+
+    workers = [threading.Thread(target=work, args=(number,))
+               for number in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return kept
+
+
+def benchmarkStress(size):
+    '''
+    Hammers the concurrent and sharded trees from many threads, then checks
+    that exactly the tickets the workers left behind are in the tree, in
+    order, with matching counts.
+    '''
+    for name, tree in (('concurrent', ConcurrentRedBlackTree()),
+                       ('sharded', ShardedRedBlackTree(8))):
+        tickets = generateMealTickets(size)
+        kept = runThreads(tree, tickets, 8, size // 2, 0.5)
+        expected = sorted(ticket.ticketID for inside in kept
+                          for ticket in inside)
+        found = [ticket.ticketID for ticket in tree]
+        if found != expected or tree.size != len(expected):
+            raise AssertionError("{} tree is inconsistent".format(name))
+        for ticketID in expected:
+            if not tree.find(ticketID):
+                raise AssertionError("{} lost {}".format(name, ticketID))
+        print("{}: ok, {} tickets left after the stress run".format(
+            name, len(expected)))
+
+
+def benchmarkThreads(size):
+    '''
+    Compares throughput of one big lock, the reader/writer lock and the
+    sharded tree under a read-heavy mix from several threads.
+    '''
+    print("=== {} ops per thread, 90% reads ===".format(size))
+    for threads in (1, 2, 4, 8):
+        for name, build in (('big lock', BigLockTree),
+                            ('rw lock', ConcurrentRedBlackTree),
+                            ('sharded', lambda: ShardedRedBlackTree(8))):
+            tree = build()
+            tree.bulk_insert(generateMealTickets(size))
+            tickets = generateMealTickets(size)
+            elapsed = timed(runThreads, tree, tickets, threads, size, 0.9)
+            print("{} threads, {:<9} {:>10.0f} ops/s".format(
+                threads, name + ':', threads * size / elapsed))
+
+
+def benchmarkSnapshots(size):
+    '''
+    Measures what it costs to keep a snapshot after every 100 inserts, with
+    persistent path copying and by copying the whole tree.
+    '''
+    tickets = generateMealTickets(size)
+
+    def persistentVersions():
+        tree = PersistentRedBlackTree()
+        versions = []
+        for number, ticket in enumerate(tickets):
+            tree.insert(ticket)
+            if number % 100 == 0:
+                versions.append(tree.snapshot())
+        return versions
+
+    def copiedVersions():
+        tree = RedBlackTree()
+        versions = []
+        for number, ticket in enumerate(tickets):
+            tree.insert(ticket)
+            if number % 100 == 0:
+                versions.append(RedBlackTree.from_tickets(tree))
+        return versions
+
+    print("=== {} inserts, a snapshot every 100 ===".format(size))
+    for name, build in (('persistent', persistentVersions),
+                        ('full copy', copiedVersions)):
+        elapsed = timed(build)
+        print("{:<11} {:.3f}s {:>12} bytes".format(
+            name + ':', elapsed, measure(build)))
+
+
+def zipfLookups(ticketIDs, count, exponent=1.1):
+    '''
+    Returns count IDs drawn from ticketIDs with Zipf-distributed
+    popularity: the k-th most popular ID is drawn in proportion to 1/k^s.
+    '''
+    popular = ticketIDs[:]
+    random.shuffle(popular)
+    weights = [1 / (rank ** exponent) for rank in range(1, len(popular) + 1)]
+    return random.choices(popular, weights, k=count)
+
+
+def benchmarkLookups(size):
+    '''
+    Compares plain find with the LRU cache under Zipf-distributed lookups,
+    and with finger search for sequential and clustered lookups.
+    '''
+    tickets = generateMealTickets(size)
+    ticketIDs = [ticket.ticketID for ticket in tickets]
+    zipf = zipfLookups(ticketIDs, size)
+    sequential = ticketIDs[:]
+    clustered = []
+    position = size // 2
+    for i in range(size):
+        position = min(max(position + random.randint(-8, 8), 0), size - 1)
+        clustered.append(ticketIDs[position])
+
+    def findAll(tree, lookups):
+        for ticketID in lookups:
+            tree.find(ticketID)
+
+    def findNearAll(tree, lookups):
+        for ticketID in lookups:
+            tree.findNear(ticketID)
+
+    plain = RedBlackTree.from_tickets(tickets)
+    print("=== {} lookups over {} tickets ===".format(size, size))
+    print("zipf, no cache:          {:.3f}s".format(
+        timed(findAll, plain, zipf)))
+    for cacheSize in (256, 4096):
+        cached = RedBlackTree(cacheSize)
+        cached.bulk_insert(tickets)
+        elapsed = timed(findAll, cached, zipf)
+        print("zipf, cache of {:<5}     {:.3f}s  hit rate {:.1%}".format(
+            cacheSize, elapsed, cached.cacheStats()['hitRate']))
+    print("sequential, find:        {:.3f}s".format(
+        timed(findAll, plain, sequential)))
+    print("sequential, findNear:    {:.3f}s".format(
+        timed(findNearAll, plain, sequential)))
+    print("clustered, find:         {:.3f}s".format(
+        timed(findAll, plain, clustered)))
+    print("clustered, findNear:     {:.3f}s".format(
+        timed(findNearAll, plain, clustered)))
+
+
+def benchmarkRanges(size):
+    '''
+    Compares archiving a tenth of the tickets with one delete per ID
+    against delete_range, and union/difference with a small and a large
+    batch against per-ticket inserts and deletes.
+    '''
+    tickets = generateMealTickets(size)
+    lo = tickets[size // 4].ticketID
+    hi = tickets[size // 4 + size // 10].ticketID
+
+    def deleteEach(tree, ticketIDs):
+        for ticketID in ticketIDs:
+            tree.delete(ticketID)
+
+    def insertEach(tree, batch):
+        for ticket in batch:
+            tree.insert(ticket)
+
+    def run(label, operation, *arguments):
+        print("{:<28} {:.3f}s".format(label, timed(operation, *arguments)))
+
+    print("=== Range and set operations on {} tickets ===".format(size))
+    run("delete x{}".format(hi - lo + 1), deleteEach,
+        RedBlackTree.from_tickets(tickets), range(lo, hi + 1))
+    run("delete_range", RedBlackTree.delete_range,
+        RedBlackTree.from_tickets(tickets), lo, hi)
+    for batch in (tickets[::size // 1000 or 1], tickets[::3]):
+        ticketIDs = [ticket.ticketID for ticket in batch]
+        run("delete x{}".format(len(batch)), deleteEach,
+            RedBlackTree.from_tickets(tickets), ticketIDs)
+        run("difference, {} tickets".format(len(batch)),
+            RedBlackTree.difference, RedBlackTree.from_tickets(tickets),
+            RedBlackTree.from_tickets(batch))
+        inBatch = set(ticketIDs)
+        rest = [ticket for ticket in tickets
+                if ticket.ticketID not in inBatch]
+        run("insert x{}".format(len(batch)), insertEach,
+            RedBlackTree.from_tickets(rest), batch)
+        run("union, {} tickets".format(len(batch)), RedBlackTree.union,
+            RedBlackTree.from_tickets(rest), RedBlackTree.from_tickets(batch))
+
+
+def benchmarkStore(size):
+    '''
+    Compares a list of MealTickets with a MealTicketStore: memory per
+    ticket, and totals, the average, a histogram and a filter computed by
+    looping over objects against the vectorized store.
+    '''
+    tickets = generateMealTickets(size)
+    store = MealTicketStore.from_tickets(tickets)
+
+    def loopAggregates():
+        totals = [sum(cost for name, cost in ticket.items)
+                  for ticket in tickets]
+        mean = sum(totals) / len(totals)
+        counts = [0] * 10
+        for total in totals:
+            counts[min(int(total // 9), 9)] += 1
+        return [ticket for ticket, total in zip(tickets, totals)
+                if total > mean]
+
+    def storeAggregates():
+        totals = store._computeTotals(0, len(store))
+        store.cost_histogram(10, (0, 90))
+        return store.filter(totals > store.mean_cost())
+
+    objects = measure(lambda: generateMealTickets(size))
+    columns = measure(lambda: MealTicketStore.from_tickets(tickets))
+    views = measure(lambda: list(store))
+    print("=== Aggregating {} tickets ===".format(size))
+    print("MealTicket objects: {:>12} bytes ({:.1f} per ticket)".format(
+        objects, objects / size))
+    print("MealTicketStore:    {:>12} bytes ({:.1f} per ticket)".format(
+        columns, columns / size))
+    print("Views of the store: {:>12} bytes ({:.1f} per ticket)".format(
+        views, views / size))
+    print("aggregates, loop:   {:.3f}s".format(timed(loopAggregates)))
+    print("aggregates, store:  {:.3f}s".format(timed(storeAggregates)))
+    print("from_tickets, list: {:.3f}s".format(
+        timed(RedBlackTree.from_tickets, tickets)))
+    print("from_tickets, store:{:.3f}s".format(
+        timed(RedBlackTree.from_tickets, store)))
+
+
+def benchmarkGenerate(size):
+    '''
+    Compares the original generator with the seeded streaming, batched
+    NumPy and process-pool generators.
+    '''
+    def drain(tickets):
+        for ticket in tickets:
+            pass
+
+    def drainBatches(batches):
+        for batch in batches:
+            pass
+
+    print("=== Generating {} tickets ===".format(size))
+    print("generateMealTickets:         {:.3f}s".format(
+        timed(generateMealTickets, size)))
+    print("streamMealTickets:           {:.3f}s".format(
+        timed(drain, streamMealTickets(size, 1))))
+    print("generateMealTicketBatches:   {:.3f}s".format(
+        timed(drainBatches, generateMealTicketBatches(size, 1))))
+    for workers in (2, 4):
+        print("generateMealTicketsParallel, {} workers: {:.3f}s".format(
+            workers, timed(generateMealTicketsParallel, size, 1, workers)))
+
+
+def benchmarkBTree(size):
+    '''
+    Compares RedBlackTree with BPlusTree at a few fanouts: shuffled
+    inserts, lookups, deleting half the tickets, 1000 range scans of 100
+    tickets, and memory per ticket. Meant to be run at sizes from 10**4 up
+    to 10**7.
+    '''
+    tickets = generateMealTickets(size)
+    shuffled = tickets[:]
+    random.shuffle(shuffled)
+    lookups = [ticket.ticketID for ticket in shuffled]
+    first = tickets[0].ticketID
+    starts = [first + random.randrange(max(size - 100, 1))
+              for i in range(1000)]
+    backends = [('RedBlackTree', RedBlackTree)]
+    for fanout in (16, 64, 256):
+        backends.append(('BPlusTree({})'.format(fanout),
+                         lambda fanout=fanout: BPlusTree(fanout)))
+
+    def insertAll(tree):
+        for ticket in shuffled:
+            tree.insert(ticket)
+        return tree
+
+    def findAll(tree):
+        for ticketID in lookups:
+            tree.find(ticketID)
+
+    def scanAll(tree):
+        for start in starts:
+            for ticket in tree.iter_range(start, start + 99):
+                pass
+
+    def deleteHalf(tree):
+        for ticketID in lookups[::2]:
+            tree.delete(ticketID)
+
+    print("=== RedBlackTree against BPlusTree, {} tickets ===".format(size))
+    print("{:<18}{:>10}{:>10}{:>10}{:>10}{:>12}".format(
+        '', 'insert', 'find', 'scan', 'delete', 'bytes/key'))
+    for name, build in backends:
+        tree = build()
+        inserting = timed(insertAll, tree)
+        finding = timed(findAll, tree)
+        scanning = timed(scanAll, tree)
+        deleting = timed(deleteHalf, tree)
+        memory = measure(lambda: insertAll(build()))
+        print("{:<18}{:>9.3f}s{:>9.3f}s{:>9.3f}s{:>9.3f}s{:>12.1f}".format(
+            name, inserting, finding, scanning, deleting, memory / size))
+
+
+BENCHMARKS = {
+    'memory': benchmarkMemory,
+    'bulk': benchmarkBulk,
+    'coldstart': benchmarkColdStart,
+    'stress': benchmarkStress,
+    'threads': benchmarkThreads,
+    'snapshots': benchmarkSnapshots,
+    'lookups': benchmarkLookups,
+    'ranges': benchmarkRanges,
+    'store': benchmarkStore,
+    'generate': benchmarkGenerate,
+    'btree': benchmarkBTree,
+}
+
+if __name__ == '__main__':
+    name = sys.argv[1] if len(sys.argv) > 1 else 'memory'
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    BENCHMARKS[name](size)
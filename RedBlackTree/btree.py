@@ -0,0 +1,449 @@
+'''
+An in-memory B+-tree with the same interface as RedBlackTree, for when
+chasing one RBNode pointer per level is what dominates find. Every node
+holds up to fanout entries in flat lists, so a lookup walks only
+log_fanout(n) levels and does the rest with a bisect over a contiguous
+array. Tickets live in the leaves, which are chained together so in-order
+and range scans never climb back up the tree.
+
+Keys are kept in plain lists rather than array('q'): bisect over a list
+compares the int objects in place, while over an array it would box a new
+int on every probe.
+'''
+from bisect import bisect_left, bisect_right
+from mealticket import *
+
+
+class BTreeLeaf(object):
+    '''
+    A leaf: ticketIDs and their tickets side by side, plus links to the
+    neighbouring leaves.
+    '''
+    __slots__ = ('keys', 'values', 'next', 'prev')
+
+    def __init__(self, keys=None, values=None):
+        '''
+        Constructor for the BTreeLeaf class
+        '''
+        self.keys = keys if keys is not None else []
+        self.values = values if values is not None else []
+        self.next = None
+        self.prev = None
+
+
+class BTreeInternal(object):
+    '''
+    An internal node. keys[i] is the smallest ticketID that may sit under
+    children[i + 1]; everything under children[i] is smaller.
+    '''
+    __slots__ = ('keys', 'children')
+
+    def __init__(self, keys, children):
+        '''
+        Constructor for the BTreeInternal class
+        '''
+        self.keys = keys
+        self.children = children
+
+
+class BPlusTree(object):
+    '''
+    A B+-tree of mealtickets keyed by ticketID. fanout is the most tickets
+    a leaf, or children an internal node, may hold; every node but the root
+    keeps at least half that. Unlike RedBlackTree a ticketID can only be in
+    the tree once: inserting a duplicate fails.
+    '''
+
+    def __init__(self, fanout=64):
+        '''
+        The constructor for the B+-tree
+        '''
+        if fanout < 4:
+            raise ValueError('fanout must be at least 4')
+        self.fanout = fanout
+        self.minimum = fanout // 2
+        self.size = 0
+        self._root = BTreeLeaf()
+
+    @classmethod
+    def from_tickets(cls, tickets, fanout=64):
+        '''
+        Builds a new tree holding every mealticket in tickets, packing the
+        leaves bottom up rather than inserting one ticket at a time
+        '''
+        tree = cls(fanout)
+        tree.bulk_insert(tickets)
+        return tree
+
+    def bulk_insert(self, tickets):
+        '''
+        Inserts a batch of mealtickets at once. Returns True upon success and
+        False upon failure, in which case the tree is left untouched.
+        '''
+        batch = list(tickets)
+        for ticket in batch:
+            if not isinstance(ticket, MealTicket):
+                print("This tree is only meant to handle mealTickets")
+                return False
+        batch.sort(key=lambda ticket: ticket.ticketID)
+        for i in range(1, len(batch)):
+            if batch[i - 1].ticketID == batch[i].ticketID:
+                print("Ticket", batch[i].ticketID, "is in the batch twice")
+                return False
+        if self.size:
+            # Check every ticket before inserting any, so a duplicate cannot
+            # leave half the batch in the tree
+            for ticket in batch:
+                if self.find(ticket.ticketID):
+                    print("Ticket", ticket.ticketID, "is already in the tree")
+                    return False
+            for ticket in batch:
+                self.insert(ticket)
+            return True
+        self._root = self._build(batch)
+        self.size = len(batch)
+        return True
+
+    def _build(self, tickets):
+        '''
+        Returns the root of a tree holding the sorted tickets, with leaves
+        and internal nodes filled to about three quarters so the first few
+        inserts do not all split
+        '''
+        if not tickets:
+            return BTreeLeaf()
+        width = max(self.minimum, self.fanout * 3 // 4)
+        level = []
+        for start in self._chunks(len(tickets), width):
+            chunk = tickets[start[0]:start[1]]
+            leaf = BTreeLeaf([ticket.ticketID for ticket in chunk], chunk)
+            if level:
+                level[-1].next = leaf
+                leaf.prev = level[-1]
+            level.append(leaf)
+        # Each entry pairs a node with the smallest ticketID under it
+        level = [(leaf, leaf.keys[0]) for leaf in level]
+        while len(level) > 1:
+            parents = []
+            for start, stop in self._chunks(len(level), width):
+                group = level[start:stop]
+                node = BTreeInternal([low for child, low in group[1:]],
+                                     [child for child, low in group])
+                parents.append((node, group[0][1]))
+            level = parents
+        return level[0][0]
+
+    def _chunks(self, count, width):
+        '''
+        Splits count entries into runs of about width, none of them below
+        the minimum a node may hold
+        '''
+        groups = max(1, -(-count // width))
+        if groups > 1 and count // groups < self.minimum:
+            groups = max(1, count // self.minimum)
+        bounds = [count * i // groups for i in range(groups + 1)]
+        return list(zip(bounds, bounds[1:]))
+
+    def _leafFor(self, ticketID, path=None):
+        '''
+        Walks down to the leaf that holds (or would hold) ticketID. If path
+        is given it collects (internal node, child index) pairs on the way.
+        '''
+        node = self._root
+        while type(node) is BTreeInternal:
+            index = bisect_right(node.keys, ticketID)
+            if path is not None:
+                path.append((node, index))
+            node = node.children[index]
+        return node
+
+    def find(self, ticketID):
+        '''
+        Returns a mealticket with the specified ticketID if it exists,
+        otherwise returns false.
+        '''
+        if not isinstance(ticketID, int):
+            return False
+        node = self._root
+        while type(node) is BTreeInternal:
+            node = node.children[bisect_right(node.keys, ticketID)]
+        keys = node.keys
+        index = bisect_left(keys, ticketID)
+        if index < len(keys) and keys[index] == ticketID:
+            return node.values[index]
+        return False
+
+    def insert(self, ticket):
+        '''
+        Inserts the given mealticket into the tree. Returns True upon
+        success and False upon failure.
+        '''
+        if not isinstance(ticket, MealTicket):
+            print("This tree is only meant to handle mealTickets")
+            return False
+        ticketID = ticket.ticketID
+        path = []
+        leaf = self._leafFor(ticketID, path)
+        index = bisect_left(leaf.keys, ticketID)
+        if index < len(leaf.keys) and leaf.keys[index] == ticketID:
+            print("Ticket", ticketID, "is already in the tree")
+            return False
+        leaf.keys.insert(index, ticketID)
+        leaf.values.insert(index, ticket)
+        self.size += 1
+        if len(leaf.keys) <= self.fanout:
+            return True
+        # The leaf overflowed: move its upper half to a new right sibling
+        # and hand the sibling's first key up, splitting parents as needed.
+        middle = len(leaf.keys) // 2
+        right = BTreeLeaf(leaf.keys[middle:], leaf.values[middle:])
+        del leaf.keys[middle:]
+        del leaf.values[middle:]
+        right.next = leaf.next
+        if right.next is not None:
+            right.next.prev = right
+        leaf.next = right
+        right.prev = leaf
+        separator = right.keys[0]
+        while path:
+            parent, index = path.pop()
+            parent.keys.insert(index, separator)
+            parent.children.insert(index + 1, right)
+            if len(parent.children) <= self.fanout:
+                return True
+            middle = len(parent.children) // 2
+            # keys[middle - 1] separates the two halves and moves up
+            separator = parent.keys[middle - 1]
+            right = BTreeInternal(parent.keys[middle:],
+                                  parent.children[middle:])
+            del parent.keys[middle - 1:]
+            del parent.children[middle:]
+        # The root itself split, so the tree grows a level
+        self._root = BTreeInternal([separator], [self._root, right])
+        return True
+
+    def delete(self, ticketID):
+        '''
+        If a ticket with the specified ticketID exists in the tree, it is
+        deleted while the tree's properties are maintained. Returns True
+        upon success and False upon failure.
+        '''
+        if not isinstance(ticketID, int):
+            return False
+        path = []
+        node = self._leafFor(ticketID, path)
+        index = bisect_left(node.keys, ticketID)
+        if index == len(node.keys) or node.keys[index] != ticketID:
+            return False
+        del node.keys[index]
+        del node.values[index]
+        self.size -= 1
+        # Separators may still name the deleted ID; that is harmless since
+        # they only have to split the key space, not match a ticket.
+        while path:
+            if type(node) is BTreeLeaf:
+                if len(node.keys) >= self.minimum:
+                    return True
+            elif len(node.children) >= self.minimum:
+                return True
+            parent, index = path.pop()
+            self._rebalance(parent, index)
+            node = parent
+        # Only the root is left to check: an internal root with one child
+        # makes the tree shrink a level.
+        if type(self._root) is BTreeInternal and len(self._root.children) == 1:
+            self._root = self._root.children[0]
+        return True
+
+    def _rebalance(self, parent, index):
+        '''
+        Fixes parent.children[index], which just dropped below the minimum,
+        by borrowing an entry from a sibling that can spare one or else
+        merging it with a sibling
+        '''
+        node = parent.children[index]
+        if index > 0:
+            left = parent.children[index - 1]
+            if self._entries(left) > self.minimum:
+                self._borrowLeft(parent, index, left, node)
+            else:
+                self._merge(parent, index - 1, left, node)
+        else:
+            right = parent.children[index + 1]
+            if self._entries(right) > self.minimum:
+                self._borrowRight(parent, index, node, right)
+            else:
+                self._merge(parent, index, node, right)
+
+    def _entries(self, node):
+        '''
+        Returns how many tickets a leaf, or children an internal node, holds
+        '''
+        return len(node.keys) if type(node) is BTreeLeaf else len(node.children)
+
+    def _borrowLeft(self, parent, index, left, node):
+        '''
+        Moves the last entry of left over to the front of node
+        '''
+        if type(node) is BTreeLeaf:
+            node.keys.insert(0, left.keys.pop())
+            node.values.insert(0, left.values.pop())
+            parent.keys[index - 1] = node.keys[0]
+        else:
+            node.keys.insert(0, parent.keys[index - 1])
+            node.children.insert(0, left.children.pop())
+            parent.keys[index - 1] = left.keys.pop()
+
+    def _borrowRight(self, parent, index, node, right):
+        '''
+        Moves the first entry of right over to the end of node
+        '''
+        if type(node) is BTreeLeaf:
+            node.keys.append(right.keys.pop(0))
+            node.values.append(right.values.pop(0))
+            parent.keys[index] = right.keys[0]
+        else:
+            node.keys.append(parent.keys[index])
+            node.children.append(right.children.pop(0))
+            parent.keys[index] = right.keys.pop(0)
+
+    def _merge(self, parent, index, left, right):
+        '''
+        Folds parent.children[index + 1] (right) into its left neighbour
+        '''
+        if type(left) is BTreeLeaf:
+            left.keys.extend(right.keys)
+            left.values.extend(right.values)
+            left.next = right.next
+            if left.next is not None:
+                left.next.prev = left
+        else:
+            left.keys.append(parent.keys[index])
+            left.keys.extend(right.keys)
+            left.children.extend(right.children)
+        del parent.keys[index]
+        del parent.children[index + 1]
+
+    def _firstLeaf(self):
+        '''
+        Returns the leftmost leaf, which holds the smallest ticketIDs
+        '''
+        node = self._root
+        while type(node) is BTreeInternal:
+            node = node.children[0]
+        return node
+
+    def _lastLeaf(self):
+        '''
+        Returns the rightmost leaf, which holds the largest ticketIDs
+        '''
+        node = self._root
+        while type(node) is BTreeInternal:
+            node = node.children[-1]
+        return node
+
+    def __iter__(self):
+        '''
+        Yields every mealticket in ticketID order
+        '''
+        leaf = self._firstLeaf()
+        while leaf is not None:
+            for ticket in leaf.values:
+                yield ticket
+            leaf = leaf.next
+
+    def __reversed__(self):
+        '''
+        Yields every mealticket from the largest ticketID down
+        '''
+        leaf = self._lastLeaf()
+        while leaf is not None:
+            for ticket in reversed(leaf.values):
+                yield ticket
+            leaf = leaf.prev
+
+    def items(self):
+        '''
+        Yields (ticketID, mealticket) pairs in ticketID order
+        '''
+        for ticket in self:
+            yield ticket.ticketID, ticket
+
+    def iter_range(self, lo, hi, reverse=False):
+        '''
+        Yields the mealtickets with lo <= ticketID <= hi in ticketID order,
+        or from hi down to lo if reverse is set.
+        '''
+        if reverse:
+            leaf = self._leafFor(hi)
+            index = bisect_right(leaf.keys, hi) - 1
+            while leaf is not None:
+                while index >= 0:
+                    if leaf.keys[index] < lo:
+                        return
+                    yield leaf.values[index]
+                    index -= 1
+                leaf = leaf.prev
+                if leaf is not None:
+                    index = len(leaf.keys) - 1
+        else:
+            leaf = self._leafFor(lo)
+            index = bisect_left(leaf.keys, lo)
+            while leaf is not None:
+                keys = leaf.keys
+                while index < len(keys):
+                    if keys[index] > hi:
+                        return
+                    yield leaf.values[index]
+                    index += 1
+                leaf = leaf.next
+                index = 0
+
+    def count_range(self, lo, hi):
+        '''
+        Returns how many tickets have lo <= ticketID <= hi
+        '''
+        return sum(1 for ticket in self.iter_range(lo, hi))
+
+    def height(self):
+        '''
+        Returns the number of levels, counting the leaves
+        '''
+        levels = 1
+        node = self._root
+        while type(node) is BTreeInternal:
+            node = node.children[0]
+            levels += 1
+        return levels
+
+    def traverse(self, mode):
+        '''
+        The traverse method returns a string rep of the tree according to
+        the specified mode. in-order lists every ticketID. pre-order and
+        post-order list each node's keys before or after those of its
+        children, which shows the shape of the tree; separator keys in
+        internal nodes repeat IDs held further down.
+        '''
+        if mode == 'in-order':
+            keys = (ticket.ticketID for ticket in self)
+        elif mode in ('pre-order', 'post-order'):
+            keys = self._walkNodes(self._root, mode == 'pre-order')
+        else:
+            return ''
+        return ', '.join(str(key) for key in keys)
+
+    def _walkNodes(self, node, keysFirst):
+        '''
+        Yields the keys of node and everything below it, node's own keys
+        first if keysFirst is set and last otherwise
+        '''
+        if keysFirst:
+            for key in node.keys:
+                yield key
+        if type(node) is BTreeInternal:
+            for child in node.children:
+                for key in self._walkNodes(child, keysFirst):
+                    yield key
+        if not keysFirst:
+            for key in node.keys:
+                yield key
@@ -0,0 +1,396 @@
+'''
+Thread-safe front ends for the red-black tree. ConcurrentRedBlackTree lets
+any number of readers share the tree while writers get it to themselves,
+and ShardedRedBlackTree spreads the ticketID space over several of those so
+writers on different shards never wait on each other.
+'''
+import heapq
+import threading
+from contextlib import contextmanager
+from redblack import *
+
+
+class ReadWriteLock(object):
+    '''
+    A many-readers/one-writer lock. Waiting writers hold off new readers so
+    a steady stream of lookups cannot starve inserts, but a thread that
+    already holds a read lock may always take it again, so nested reads
+    (a find inside a loop over the tree, say) never deadlock.
+    '''
+
+    def __init__(self):
+        '''
+        Constructor for the ReadWriteLock class
+        '''
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writersWaiting = 0
+        self._local = threading.local()
+
+    def acquireRead(self):
+        '''
+        Blocks until the calling thread may read
+        '''
+        held = getattr(self._local, 'reads', 0)
+        with self._condition:
+            if not held:
+                while self._writer is not None or self._writersWaiting:
+                    self._condition.wait()
+            self._readers += 1
+        self._local.reads = held + 1
+
+    def releaseRead(self):
+        '''
+        Gives up one read hold of the calling thread
+        '''
+        self._local.reads -= 1
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquireWrite(self):
+        '''
+        Blocks until the calling thread has the lock to itself
+        '''
+        with self._condition:
+            self._writersWaiting += 1
+            while self._writer is not None or self._readers:
+                self._condition.wait()
+            self._writersWaiting -= 1
+            self._writer = threading.get_ident()
+
+    def releaseWrite(self):
+        '''
+        Gives up the write lock
+        '''
+        with self._condition:
+            self._writer = None
+            self._condition.notify_all()
+
+    @contextmanager
+    def reading(self):
+        '''
+        Holds a read lock for the body of a with statement
+        '''
+        self.acquireRead()
+        try:
+            yield
+        finally:
+            self.releaseRead()
+
+    @contextmanager
+    def writing(self):
+        '''
+        Holds the write lock for the body of a with statement
+        '''
+        self.acquireWrite()
+        try:
+            yield
+        finally:
+            self.releaseWrite()
+
+
+class ConcurrentRedBlackTree(object):
+    '''
+    A RedBlackTree guarded by a ReadWriteLock. Lookups, queries and
+    iteration run side by side; insert and delete run alone. Iterating
+    copies the tickets out under the lock, so it costs memory in proportion
+    to what is scanned but never keeps writers waiting on a loop. Wrap a tree
+    without a lookup cache: the cache is updated on every find, which is
+    not safe from several readers at once.
+    '''
+
+    def __init__(self, tree=None):
+        '''
+        Wraps tree, or a new empty tree
+        '''
+        self.tree = tree if tree is not None else RedBlackTree()
+        self.lock = ReadWriteLock()
+
+    @property
+    def size(self):
+        '''
+        The number of tickets in the tree
+        '''
+        return self.tree.size
+
+    def insert(self, ticket):
+        '''
+        Inserts ticket under the write lock. Returns True upon success and
+        False upon failure.
+        '''
+        with self.lock.writing():
+            return self.tree.insert(ticket)
+
+    def bulk_insert(self, tickets):
+        '''
+        Inserts a batch of mealtickets under one hold of the write lock. The
+        batch is gathered before the lock is taken.
+        '''
+        tickets = list(tickets)
+        with self.lock.writing():
+            return self.tree.bulk_insert(tickets)
+
+    def delete(self, ticketID):
+        '''
+        Deletes the ticket with ticketID under the write lock. Returns True
+        upon success and False upon failure.
+        '''
+        with self.lock.writing():
+            return self.tree.delete(ticketID)
+
+    def delete_range(self, lo, hi):
+        '''
+        Deletes every ticket with lo <= ticketID <= hi under the write lock
+        and returns how many went.
+        '''
+        with self.lock.writing():
+            return self.tree.delete_range(lo, hi)
+
+    def find(self, ticketID):
+        '''
+        Returns the mealticket with the specified ticketID if it exists,
+        otherwise returns false.
+        '''
+        with self.lock.reading():
+            return self.tree.find(ticketID)
+
+    def rank(self, ticketID):
+        '''
+        Returns the number of tickets with an ID less than or equal to
+        ticketID.
+        '''
+        with self.lock.reading():
+            return self.tree.rank(ticketID)
+
+    def select(self, k):
+        '''
+        Returns the mealticket with the k-th smallest ticketID (counting from
+        1) if it exists, otherwise returns false.
+        '''
+        with self.lock.reading():
+            return self.tree.select(k)
+
+    def count_range(self, lo, hi):
+        '''
+        Returns the number of tickets with lo <= ticketID <= hi.
+        '''
+        with self.lock.reading():
+            return self.tree.count_range(lo, hi)
+
+    def sum_cost_range(self, lo, hi):
+        '''
+        Returns the summed totalCost of the tickets with lo <= ticketID <= hi.
+        '''
+        with self.lock.reading():
+            return self.tree.sum_cost_range(lo, hi)
+
+    def traverse(self, mode):
+        '''
+        Returns a string rep of the tree according to the specified mode
+        '''
+        with self.lock.reading():
+            return self.tree.traverse(mode)
+
+    def _collected(self, iterator):
+        '''
+        Runs iterator to the end under a read lock and returns an iterator
+        over what it yielded. The lock is never held by a half consumed
+        generator, which would block every writer until it was finished or
+        collected, possibly on another thread.
+        '''
+        with self.lock.reading():
+            return iter(list(iterator))
+
+    def __iter__(self):
+        '''
+        Returns an iterator over the mealtickets in ticketID order, as they
+        were when it was called
+        '''
+        return self._collected(iter(self.tree))
+
+    def __reversed__(self):
+        '''
+        Returns an iterator over the mealtickets from the largest ticketID
+        down, as they were when it was called
+        '''
+        return self._collected(reversed(self.tree))
+
+    def items(self):
+        '''
+        Returns an iterator over (ticketID, mealticket) pairs in ticketID
+        order, as they were when it was called
+        '''
+        return self._collected(self.tree.items())
+
+    def iter_range(self, lo, hi, reverse=False):
+        '''
+        Returns an iterator over the mealtickets with lo <= ticketID <= hi,
+        in ticketID order or from hi down if reverse is set, as they were
+        when it was called
+        '''
+        return self._collected(self.tree.iter_range(lo, hi, reverse))
+
+
+class ShardedRedBlackTree(object):
+    '''
+    Splits tickets over several ConcurrentRedBlackTrees by ticketID modulo
+    the number of shards. Writes only lock the shard they touch; queries
+    that span shards combine per-shard answers, and ordered scans merge the
+    shards back into ticketID order. Queries over several shards are not a
+    single atomic snapshot: a write may land between two shards' answers.
+    '''
+
+    def __init__(self, shards=8):
+        '''
+        Builds a tree with the given number of empty shards
+        '''
+        self.shards = [ConcurrentRedBlackTree() for i in range(shards)]
+
+    def shardFor(self, ticketID):
+        '''
+        Returns the shard that holds (or would hold) ticketID
+        '''
+        return self.shards[ticketID % len(self.shards)]
+
+    @property
+    def size(self):
+        '''
+        The number of tickets across all shards
+        '''
+        return sum(shard.size for shard in self.shards)
+
+    def insert(self, ticket):
+        '''
+        Inserts ticket into its shard. Returns True upon success and False
+        upon failure.
+        '''
+        if not isinstance(ticket, MealTicket):
+            print("This tree is only meant to handle mealTickets")
+            return False
+        return self.shardFor(ticket.ticketID).insert(ticket)
+
+    def bulk_insert(self, tickets):
+        '''
+        Splits a batch of mealtickets by shard and bulk inserts each part.
+        Returns False, inserting nothing, if any of them is not a mealticket.
+        '''
+        batches = [[] for shard in self.shards]
+        for ticket in tickets:
+            if not isinstance(ticket, MealTicket):
+                print("This tree is only meant to handle mealTickets")
+                return False
+            batches[ticket.ticketID % len(self.shards)].append(ticket)
+        for shard, batch in zip(self.shards, batches):
+            shard.bulk_insert(batch)
+        return True
+
+    def delete(self, ticketID):
+        '''
+        Deletes the ticket with ticketID from its shard. Returns True upon
+        success and False upon failure.
+        '''
+        if not isinstance(ticketID, int):
+            return False
+        return self.shardFor(ticketID).delete(ticketID)
+
+    def delete_range(self, lo, hi):
+        '''
+        Deletes every ticket with lo <= ticketID <= hi from every shard and
+        returns how many went.
+        '''
+        return sum(shard.delete_range(lo, hi) for shard in self.shards)
+
+    def find(self, ticketID):
+        '''
+        Returns the mealticket with the specified ticketID if it exists,
+        otherwise returns false.
+        '''
+        if not isinstance(ticketID, int):
+            return False
+        return self.shardFor(ticketID).find(ticketID)
+
+    def rank(self, ticketID):
+        '''
+        Returns the number of tickets with an ID less than or equal to
+        ticketID, summed over the shards.
+        '''
+        return sum(shard.rank(ticketID) for shard in self.shards)
+
+    def select(self, k):
+        '''
+        Returns the mealticket with the k-th smallest ticketID (counting from
+        1) if it exists, otherwise returns false. IDs are integers, so this
+        binary searches the ID space for the first ID whose rank reaches k.
+        '''
+        if not isinstance(k, int) or k < 1 or k > self.size:
+            return False
+        firsts = [shard.select(1) for shard in self.shards]
+        lasts = [shard.select(shard.size) for shard in self.shards]
+        lo = min(ticket.ticketID for ticket in firsts if ticket)
+        hi = max(ticket.ticketID for ticket in lasts if ticket)
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.rank(middle) >= k:
+                hi = middle
+            else:
+                lo = middle + 1
+        return self.find(lo)
+
+    def count_range(self, lo, hi):
+        '''
+        Returns the number of tickets with lo <= ticketID <= hi.
+        '''
+        return sum(shard.count_range(lo, hi) for shard in self.shards)
+
+    def sum_cost_range(self, lo, hi):
+        '''
+        Returns the summed totalCost of the tickets with lo <= ticketID <= hi.
+        '''
+        total = sum(shard.sum_cost_range(lo, hi) for shard in self.shards)
+        return round(total, 2)
+
+    def _merged(self, iterators, reverse=False):
+        '''
+        Merges per-shard ticket iterators back into ticketID order
+        '''
+        return heapq.merge(*iterators, key=lambda ticket: ticket.ticketID,
+                           reverse=reverse)
+
+    def __iter__(self):
+        '''
+        Yields every mealticket in ticketID order
+        '''
+        return self._merged(iter(shard) for shard in self.shards)
+
+    def __reversed__(self):
+        '''
+        Yields every mealticket from the largest ticketID down
+        '''
+        return self._merged((reversed(shard) for shard in self.shards), True)
+
+    def items(self):
+        '''
+        Yields (ticketID, mealticket) pairs in ticketID order
+        '''
+        for ticket in self:
+            yield ticket.ticketID, ticket
+
+    def iter_range(self, lo, hi, reverse=False):
+        '''
+        Yields the mealtickets with lo <= ticketID <= hi in ticketID order,
+        or from hi down to lo if reverse is set.
+        '''
+        return self._merged((shard.iter_range(lo, hi, reverse)
+                             for shard in self.shards), reverse)
+
+    def traverse(self, mode):
+        '''
+        Returns the ticketIDs across all shards in order. Sharding has no
+        single tree shape, so only 'in-order' is supported.
+        '''
+        if mode != 'in-order':
+            return ''
+        return ', '.join(str(ticket.ticketID) for ticket in self)
@@ -1,10 +1,19 @@
 '''
 Provided test objects for my RB tree
 '''
-rom random import uniform
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from random import Random, uniform
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ITEM_NAMES = ("Item 1", "Item 2", "Item 3")
 
 class MealTicket():
     """ A simple meal ticket class. """
+    __slots__ = ('TicketName', 'ticketID', 'totalCost', 'items')
     ID = 1
 
     def __init__(self, ticketName):
@@ -15,6 +24,20 @@ class MealTicket():
         self.items = []
         MealTicket.ID += 1
 
+    @classmethod
+    def fromFields(cls, ticketID, ticketName, items, totalCost):
+        """ Rebuilds a ticket that already has an ID, e.g. one read back
+        from disk. The global ID counter is moved past it so new tickets
+        never reuse the ID. """
+        ticket = cls.__new__(cls)
+        ticket.TicketName = ticketName
+        ticket.ticketID = ticketID
+        ticket.totalCost = totalCost
+        ticket.items = items
+        if ticketID >= MealTicket.ID:
+            MealTicket.ID = ticketID + 1
+        return ticket
+
     def addItem(self, item):
         """ Adds items to the meal tickets """
         self.items.append(item)
@@ -34,13 +57,94 @@ class MealTicket():
             print(" -- Item cost: ", self.items[i][1])
         print("========== End ==========\n")
 
-def generateMealTickets(size):
-    """ Generates an array of mealtickets based on the integer <size> """
+def generateMealTickets(size, seed=None):
+    """ Generates an array of mealtickets based on the integer <size>. Pass
+    a seed to get the same item costs on every run. """
     mealtickets = []
+    random = Random(seed).uniform if seed is not None else uniform
     for i in range(size):
         ticket = MealTicket("Jared's Meal " + str(i))
-        ticket.addItem(("Item 1", round(uniform(0, 30), 2)))
-        ticket.addItem(("Item 2", round(uniform(0, 30), 2)))
-        ticket.addItem(("Item 3", round(uniform(0, 30), 2)))
+        ticket.addItem(("Item 1", round(random(0, 30), 2)))
+        ticket.addItem(("Item 2", round(random(0, 30), 2)))
+        ticket.addItem(("Item 3", round(random(0, 30), 2)))
         mealtickets.append(ticket)
     return mealtickets
+
+def _reserveIDs(count, firstID):
+    """ Returns the first of <count> consecutive ticket IDs. Without a
+    firstID they are taken from the global counter in one step. """
+    if firstID is None:
+        firstID = MealTicket.ID
+    MealTicket.ID = max(MealTicket.ID, firstID + count)
+    return firstID
+
+def _buildTicket(ticketID, index, costs):
+    """ Builds the <index>-th generated ticket from its three item costs,
+    totalling them the same way addItem does """
+    total = 0
+    for cost in costs:
+        total = round(total + cost, 2)
+    return MealTicket.fromFields(ticketID, "Jared's Meal " + str(index),
+                                 list(zip(ITEM_NAMES, costs)), total)
+
+def streamMealTickets(size, seed=None, firstID=None):
+    """ Yields <size> mealtickets one at a time instead of building them
+    all up front. The same seed and firstID always give the same tickets;
+    IDs come from the global counter unless firstID is given. """
+    firstID = _reserveIDs(size, firstID)
+    random = Random(seed).uniform
+    for i in range(size):
+        costs = (round(random(0, 30), 2), round(random(0, 30), 2),
+                 round(random(0, 30), 2))
+        yield _buildTicket(firstID + i, i, costs)
+
+def generateMealTicketBatches(size, seed=None, batchSize=100000,
+                              firstID=None):
+    """ Yields lists of up to <batchSize> mealtickets, drawing each batch's
+    costs in one NumPy call. The tickets do not depend on batchSize, only
+    on the seed and firstID. Needs numpy. """
+    if numpy is None:
+        raise ImportError("generateMealTicketBatches needs numpy")
+    firstID = _reserveIDs(size, firstID)
+    generator = numpy.random.default_rng(seed)
+    for start in range(0, size, batchSize):
+        count = min(batchSize, size - start)
+        costs = numpy.round(generator.uniform(0, 30, (count, 3)), 2)
+        totals = numpy.round(costs[:, 0] + costs[:, 1], 2)
+        totals = numpy.round(totals + costs[:, 2], 2)
+        batch = []
+        for i, row, total in zip(range(start, start + count),
+                                 costs.tolist(), totals.tolist()):
+            batch.append(MealTicket.fromFields(
+                firstID + i, "Jared's Meal " + str(i),
+                list(zip(ITEM_NAMES, row)), total))
+        yield batch
+
+def _generateCosts(seed, start, count):
+    """ Worker for generateMealTicketsParallel: draws the item costs of
+    tickets start..start+count-1 from their own seeded stream and hands
+    them back packed, which pickles far smaller than the tickets would """
+    random = Random("{}/{}".format(seed, start)).uniform
+    costs = array('d', [round(random(0, 30), 2) for i in range(3 * count)])
+    return costs.tobytes()
+
+def generateMealTicketsParallel(size, seed=None, workers=4, firstID=None):
+    """ Generates <size> mealtickets with a pool of <workers> processes.
+    Every worker draws a disjoint, contiguous range of IDs from its own
+    stream, so the result is the same for a given seed and worker count. """
+    if seed is None:
+        seed = Random().getrandbits(64)
+    firstID = _reserveIDs(size, firstID)
+    share = -(-size // workers) if size else 1
+    starts = list(range(0, size, share))
+    counts = [min(share, size - start) for start in starts]
+    mealtickets = []
+    with ProcessPoolExecutor(workers) as pool:
+        chunks = pool.map(_generateCosts, [seed] * len(starts), starts, counts)
+        for start, packed in zip(starts, chunks):
+            costs = array('d')
+            costs.frombytes(packed)
+            for i in range(len(costs) // 3):
+                mealtickets.append(_buildTicket(
+                    firstID + start + i, start + i, costs[3 * i:3 * i + 3]))
+    return mealtickets
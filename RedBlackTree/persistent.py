@@ -0,0 +1,468 @@
+'''
+A persistent (copy-on-write) red-black tree. insert and delete copy only the
+nodes on the path they walk, plus the few siblings the fixups recolor or
+rotate, so snapshot() is O(1) and every old version stays readable for as
+long as someone holds on to it.
+
+Nodes carry no parent pointers, since a shared node can have a different
+parent in every version. The fixups are the same CLR&S cases as in
+redblack.py, driven by the list of ancestors collected on the way down.
+'''
+from redblack import *
+
+
+class PersistentNode(RBNode):
+    '''
+    A node that may be shared between versions. edit records which version
+    created it: only that version may change it in place, everyone else has
+    to copy it first.
+    '''
+    __slots__ = ('edit',)
+
+    def __init__(self, ticket, color='red', sentinel=None, edit=None):
+        '''
+        Constructor for the PersistentNode class
+        '''
+        RBNode.__init__(self, ticket, color, sentinel)
+        self.edit = edit
+
+    def setRight(self, node):
+        '''
+        Sets a new right child. Shared nodes have no single parent, so
+        unlike RBNode this leaves the child alone.
+        '''
+        self.rightChild = node
+
+    def setLeft(self, node):
+        '''
+        Sets a new left child
+        '''
+        self.leftChild = node
+
+
+class PersistentRedBlackTree(RedBlackTree):
+    '''
+    A red-black tree whose versions share structure. The tree object is a
+    handle on the newest version; snapshot() hands out a frozen handle on
+    the current one. Every read method of RedBlackTree works on both, and
+    since nothing a snapshot can reach is ever changed again, readers of a
+    snapshot need no locks while the writer keeps inserting.
+    '''
+    _parentLinks = False
+
+    def __init__(self):
+        '''
+        The constructor for the persistent red-black tree
+        '''
+        RedBlackTree.__init__(self)
+        # Nodes stamped with this token were made since the last snapshot
+        # and can be changed in place; anything else is copied first.
+        self._edit = object()
+
+    def snapshot(self):
+        '''
+        Returns a handle on the current version in O(1). Later changes to
+        this tree do not show up in the snapshot, and the other way around.
+        '''
+        version = PersistentRedBlackTree()
+        version._root = self._root
+        version.size = self.size
+        version.sentinel = self.sentinel
+        # From now on every node we can reach is shared, so we need a fresh
+        # token as well.
+        self._edit = object()
+        return version
+
+    def findNear(self, ticketID):
+        '''
+        Finger search needs parent pointers, which shared nodes do not
+        have, so this is a plain find.
+        '''
+        return self.find(ticketID)
+
+    # The join-based split, join and set operations of RedBlackTree cut
+    # and relink nodes in place, which would reach into older versions.
+    # Here they are built from inserts, deletes and bulk loads instead.
+
+    def split(self, ticketID):
+        '''
+        Splits the tree in two: one tree with the tickets whose ID is below
+        ticketID and one with the rest. This tree is left empty. O(n).
+        '''
+        less = [ticket for ticket in self if ticket.ticketID < ticketID]
+        more = [ticket for ticket in self if ticket.ticketID >= ticketID]
+        self._root = None
+        self.size = 0
+        return (PersistentRedBlackTree.from_tickets(less),
+                PersistentRedBlackTree.from_tickets(more))
+
+    def join(self, other):
+        '''
+        Moves every ticket of other onto the end of this tree. Every ticketID
+        in this tree must be at most every ticketID in other. Returns True
+        upon success and False upon failure; other is left empty.
+        '''
+        if other is self:
+            return False
+        if (self.size and other.size and
+                next(reversed(self)).ticketID > next(iter(other)).ticketID):
+            print("Every ticketID in the joined tree must come after ours")
+            return False
+        self.bulk_insert(other)
+        other._root = None
+        other.size = 0
+        return True
+
+    def delete_range(self, lo, hi):
+        '''
+        Deletes every ticket with lo <= ticketID <= hi and returns how many
+        went
+        '''
+        doomed = [ticket.ticketID for ticket in self.iter_range(lo, hi)]
+        for ticketID in doomed:
+            self.delete(ticketID)
+        return len(doomed)
+
+    def union(self, other):
+        '''
+        Moves every ticket of other into this tree. Where both trees hold a
+        ticket with the same ID, the one from other replaces ours. other is
+        left empty.
+        '''
+        if other is self:
+            return True
+        theirs = list(other)
+        # Clear out every copy of each ID first, so that other's own
+        # duplicates do not replace each other
+        for ticketID in set(ticket.ticketID for ticket in theirs):
+            while self.delete(ticketID):
+                pass
+        for ticket in theirs:
+            self.insert(ticket)
+        other._root = None
+        other.size = 0
+        return True
+
+    def difference(self, other):
+        '''
+        Deletes every ticket whose ID is also in other, which is not changed.
+        Returns the number of tickets deleted.
+        '''
+        before = self.size
+        for ticket in list(other):
+            while self.delete(ticket.ticketID):
+                pass
+        return before - self.size
+
+    def _newNode(self, ticket, color='red'):
+        '''
+        Builds a node for ticket owned by the current version
+        '''
+        return PersistentNode(ticket, color, self.sentinel, self._edit)
+
+    def _own(self, node):
+        '''
+        Returns node if the current version may change it, otherwise a copy
+        of it that the current version owns. The caller links the copy in.
+        '''
+        if node.edit is self._edit:
+            return node
+        copy = PersistentNode.__new__(PersistentNode)
+        copy.key = node.key
+        copy.value = node.value
+        copy.color = node.color
+        copy.parent = None
+        copy.leftChild = node.leftChild
+        copy.rightChild = node.rightChild
+        copy.subtreeSize = node.subtreeSize
+        copy.subtreeCost = node.subtreeCost
+        copy.edit = self._edit
+        return copy
+
+    def insert(self, ticket):
+        '''
+        Inserts a new node holding the given mealticket into the current
+        version. Returns True upon success and False upon failure.
+        '''
+        if not isinstance(ticket, MealTicket):
+            print("This tree is only meant to handle mealTickets")
+            return False
+        inserted = self._newNode(ticket)
+        self.size += 1
+        if self._root is None:
+            inserted.color = 'black'
+            self._root = inserted
+            return True
+        # Copy the search path as we walk it; everything hanging off of it
+        # stays shared with older versions.
+        currentNode = self._own(self._root)
+        self._root = currentNode
+        path = [currentNode]
+        while True:
+            currentNode.subtreeSize += 1
+            currentNode.subtreeCost += ticket.totalCost
+            if currentNode.key > ticket.ticketID:
+                if currentNode.leftChild.isSentinal():
+                    currentNode.leftChild = inserted
+                    break
+                child = self._own(currentNode.leftChild)
+                currentNode.leftChild = child
+            else:
+                if currentNode.rightChild.isSentinal():
+                    currentNode.rightChild = inserted
+                    break
+                child = self._own(currentNode.rightChild)
+                currentNode.rightChild = child
+            path.append(child)
+            currentNode = child
+        path.append(inserted)
+        self.insertFixup(path)
+        return True
+
+    def delete(self, ticketID):
+        '''
+        If a node holding a ticket with the specified ticketID exists in the
+        current version, it is deleted while the tree's properties are
+        maintained. Returns True upon success and False upon failure.
+        '''
+        if not isinstance(ticketID, int) or not self.findNode(ticketID):
+            return False
+        self.size -= 1
+        currentNode = self._own(self._root)
+        self._root = currentNode
+        path = [currentNode]
+        while currentNode.key != ticketID:
+            if currentNode.key > ticketID:
+                child = self._own(currentNode.leftChild)
+                currentNode.leftChild = child
+            else:
+                child = self._own(currentNode.rightChild)
+                currentNode.rightChild = child
+            path.append(child)
+            currentNode = child
+        # Like RedBlackTree.delete, a node with two children takes over its
+        # successor's ticket, and the successor (which has no left child) is
+        # the node that actually leaves the tree.
+        if (not currentNode.leftChild.isSentinal() and
+                not currentNode.rightChild.isSentinal()):
+            target = currentNode
+            currentNode = self._own(currentNode.rightChild)
+            target.rightChild = currentNode
+            path.append(currentNode)
+            while not currentNode.leftChild.isSentinal():
+                child = self._own(currentNode.leftChild)
+                currentNode.leftChild = child
+                path.append(child)
+                currentNode = child
+            target.key = currentNode.key
+            target.value = currentNode.value
+        removed = path.pop()
+        if removed.leftChild.isSentinal():
+            x = removed.rightChild
+        else:
+            x = removed.leftChild
+        if not path:
+            # The root itself is going; its only possible child is red
+            if x.isSentinal():
+                self._root = None
+            else:
+                x = self._own(x)
+                x.color = 'black'
+                self._root = x
+            return True
+        parent = path[-1]
+        xIsLeft = parent.leftChild is removed
+        # Taking out a black node leaves its side one black short. A red
+        # child can simply absorb that; otherwise deleteFixup has to.
+        needsFixup = removed.color == 'black'
+        if needsFixup and x.color == 'red':
+            x = self._own(x)
+            x.color = 'black'
+            needsFixup = False
+        if xIsLeft:
+            parent.leftChild = x
+        else:
+            parent.rightChild = x
+        for node in reversed(path):
+            node.updateAugment()
+        if needsFixup:
+            self.deleteFixup(path, x, xIsLeft)
+        return True
+
+    def _leftRotate(self, currentNode, above):
+        '''
+        Perform a left rotation from a given node. above is currentNode's
+        parent (None for the root); all three must belong to this version.
+        '''
+        if self.stats is not None:
+            self.stats.rotations += 1
+        y = currentNode.rightChild
+        currentNode.rightChild = y.leftChild
+        y.leftChild = currentNode
+        self._replaceChild(above, currentNode, y)
+        y.subtreeSize = currentNode.subtreeSize
+        y.subtreeCost = currentNode.subtreeCost
+        currentNode.updateAugment()
+
+    def _rightRotate(self, currentNode, above):
+        '''
+        Perform a right rotation from a given node
+        '''
+        if self.stats is not None:
+            self.stats.rotations += 1
+        y = currentNode.leftChild
+        currentNode.leftChild = y.rightChild
+        y.rightChild = currentNode
+        self._replaceChild(above, currentNode, y)
+        y.subtreeSize = currentNode.subtreeSize
+        y.subtreeCost = currentNode.subtreeCost
+        currentNode.updateAugment()
+
+    def _replaceChild(self, above, old, new):
+        '''
+        Points whichever link led to old (from above, or the root) at new
+        '''
+        if above is None:
+            self._root = new
+        elif above.leftChild is old:
+            above.leftChild = new
+        else:
+            above.rightChild = new
+
+    def insertFixup(self, path):
+        '''
+        Restores the red-black properties after an insert. path runs from
+        the root down to the new node and is all owned by this version.
+        '''
+        i = len(path) - 1
+        stats = self.stats
+        while i >= 2 and path[i - 1].color == 'red':
+            if stats is not None:
+                stats.insertFixups += 1
+            currentNode = path[i]
+            parent = path[i - 1]
+            grandparent = path[i - 2]
+            above = path[i - 3] if i >= 3 else None
+            if parent is grandparent.leftChild:
+                y = grandparent.rightChild
+                # Case: currentNode has a red uncle.
+                if y.color == 'red':
+                    y = self._own(y)
+                    grandparent.rightChild = y
+                    parent.color = 'black'
+                    y.color = 'black'
+                    grandparent.color = 'red'
+                    i -= 2
+                    continue
+                # Case: currentNode has a black uncle and is a right child.
+                if currentNode is parent.rightChild:
+                    self._leftRotate(parent, grandparent)
+                    parent = currentNode
+                # Case: currentNode has a black uncle and is a left child.
+                parent.color = 'black'
+                grandparent.color = 'red'
+                self._rightRotate(grandparent, above)
+            else:
+                # The mirror images of the cases above.
+                y = grandparent.leftChild
+                if y.color == 'red':
+                    y = self._own(y)
+                    grandparent.leftChild = y
+                    parent.color = 'black'
+                    y.color = 'black'
+                    grandparent.color = 'red'
+                    i -= 2
+                    continue
+                if currentNode is parent.leftChild:
+                    self._rightRotate(parent, grandparent)
+                    parent = currentNode
+                parent.color = 'black'
+                grandparent.color = 'red'
+                self._leftRotate(grandparent, above)
+            break
+        self._root.color = 'black'
+
+    def deleteFixup(self, path, currentNode, isLeft):
+        '''
+        Restores the red-black properties after a black node was removed.
+        currentNode (possibly the sentinel) carries the extra black, path
+        holds its ancestors from the root down and isLeft says which side of
+        path[-1] it hangs on.
+        '''
+        stats = self.stats
+        while path and currentNode.color == 'black':
+            if stats is not None:
+                stats.deleteFixups += 1
+            parent = path[-1]
+            above = path[-2] if len(path) >= 2 else None
+            if isLeft:
+                w = self._own(parent.rightChild)
+                parent.rightChild = w
+                # Case: currentNode has a red sibling
+                if w.color == 'red':
+                    w.color = 'black'
+                    parent.color = 'red'
+                    self._leftRotate(parent, above)
+                    path.insert(len(path) - 1, w)
+                    above = w
+                    w = self._own(parent.rightChild)
+                    parent.rightChild = w
+                if (w.leftChild.color == 'black' and
+                        w.rightChild.color == 'black'):
+                    # Case: currentNode has a black sibling with black
+                    # children
+                    w.color = 'red'
+                    currentNode = path.pop()
+                    isLeft = bool(path) and path[-1].leftChild is currentNode
+                    continue
+                if w.rightChild.color == 'black':
+                    # Case: currentNode has a black sibling with different
+                    # colored children.
+                    nephew = self._own(w.leftChild)
+                    w.leftChild = nephew
+                    nephew.color = 'black'
+                    w.color = 'red'
+                    self._rightRotate(w, parent)
+                    w = nephew
+                # Case: currentNode has a black sibling with red children
+                nephew = self._own(w.rightChild)
+                w.rightChild = nephew
+                w.color = parent.color
+                parent.color = 'black'
+                nephew.color = 'black'
+                self._leftRotate(parent, above)
+            else:
+                # The mirror images of the cases above.
+                w = self._own(parent.leftChild)
+                parent.leftChild = w
+                if w.color == 'red':
+                    w.color = 'black'
+                    parent.color = 'red'
+                    self._rightRotate(parent, above)
+                    path.insert(len(path) - 1, w)
+                    above = w
+                    w = self._own(parent.leftChild)
+                    parent.leftChild = w
+                if (w.leftChild.color == 'black' and
+                        w.rightChild.color == 'black'):
+                    w.color = 'red'
+                    currentNode = path.pop()
+                    isLeft = bool(path) and path[-1].leftChild is currentNode
+                    continue
+                if w.leftChild.color == 'black':
+                    nephew = self._own(w.rightChild)
+                    w.rightChild = nephew
+                    nephew.color = 'black'
+                    w.color = 'red'
+                    self._leftRotate(w, parent)
+                    w = nephew
+                nephew = self._own(w.leftChild)
+                w.leftChild = nephew
+                w.color = parent.color
+                parent.color = 'black'
+                nephew.color = 'black'
+                self._rightRotate(parent, above)
+            return
+        # currentNode is either the sentinel, already black, or a red node
+        # taken off of the path, which this version owns.
+        currentNode.color = 'black'
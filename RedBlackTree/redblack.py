@@ -3,25 +3,43 @@ Author: Noah Mancino
 Date: 03/6/2020
 Description: An implementation of a Red-Black tree.
 '''
+from collections import OrderedDict
 from mealticket import *
 
 class RBNode(object):
     '''
     Description: This is the node class for the Red-Black Tree.
     '''
+    # Nodes are the bulk of the tree's memory, so we drop the per-instance
+    # __dict__ and keep only these six pointers. The color strings are
+    # interned, so storing 'red'/'black' costs the same single pointer a
+    # color bit would in a slotted object.
+    # subtreeSize and subtreeCost count the nodes and sum the totalCosts of
+    # the subtree rooted here, which is what rank/select and the range
+    # queries are built on. A ticket's totalCost is read when it enters the
+    # tree, so finish adding items before inserting it.
+    __slots__ = ('key', 'value', 'color', 'parent', 'leftChild', 'rightChild',
+                 'subtreeSize', 'subtreeCost')
 
-    def __init__(self, ticket, color='red'):
+    def __init__(self, ticket, color='red', sentinel=None):
         '''
-        Constructor for the RBNode class
+        Constructor for the RBNode class. Nodes built by a tree share the
+        tree's sentinel; a standalone node gets fresh sentinals of its own.
         '''
         self.key = ticket.ticketID
         self.value = ticket
         self.color = color
+        self.subtreeSize = 1
+        self.subtreeCost = ticket.totalCost
 
-        # Build sentinal nodes and set the initial parent
+        # Point the children at the sentinal and set the initial parent
         self.parent = None
-        self.leftChild = Sentinal()
-        self.rightChild = Sentinal()
+        if sentinel is None:
+            self.leftChild = Sentinal()
+            self.rightChild = Sentinal()
+        else:
+            self.leftChild = sentinel
+            self.rightChild = sentinel
 
     def __str__(self):
         ''' 
@@ -111,11 +129,20 @@ class RBNode(object):
         if node and not node.isSentinal():
             node.parent = self
 
+    def updateAugment(self):
+        '''
+        Recomputes subtreeSize and subtreeCost from the node's children
+        '''
+        self.subtreeSize = (self.leftChild.subtreeSize +
+                            self.rightChild.subtreeSize + 1)
+        self.subtreeCost = (self.leftChild.subtreeCost +
+                            self.rightChild.subtreeCost + self.value.totalCost)
 
 class Sentinal(RBNode):
     '''
     This class builds the sentinal nodes and includes some nifty methods
     '''
+    __slots__ = ()
 
     def __init__(self, color='black'):
         '''
@@ -127,6 +154,8 @@ class Sentinal(RBNode):
         self.rightChild = None
         self.parent = None
         self.color = 'black'
+        self.subtreeSize = 0
+        self.subtreeCost = 0
 
     def isSentinal(self):
         '''
@@ -135,69 +164,297 @@ class Sentinal(RBNode):
         return True
 
 
+class TreeStats(object):
+    '''
+    Counters filled in by an instrumented RedBlackTree: rotations, trips
+    around the insert and delete fixup loops, and how many node keys
+    findNode compared against over how many lookups.
+    '''
+    __slots__ = ('rotations', 'insertFixups', 'deleteFixups', 'finds',
+                 'comparisons')
+
+    def __init__(self):
+        '''
+        Constructor for the TreeStats class
+        '''
+        self.reset()
+
+    def reset(self):
+        '''
+        Sets every counter back to zero
+        '''
+        self.rotations = 0
+        self.insertFixups = 0
+        self.deleteFixups = 0
+        self.finds = 0
+        self.comparisons = 0
+
+    def asDict(self):
+        '''
+        Returns the counters, plus the average comparisons per findNode
+        '''
+        return {
+            'rotations': self.rotations,
+            'insertFixups': self.insertFixups,
+            'deleteFixups': self.deleteFixups,
+            'finds': self.finds,
+            'comparisons': self.comparisons,
+            'comparisonsPerFind': (self.comparisons / self.finds
+                                   if self.finds else 0.0),
+        }
+
 class RedBlackTree:
     ''' 
     Skeleton code for the red-black tree
     '''
+    # Trees whose nodes keep parent pointers; validate() checks them only
+    # when this is set.
+    _parentLinks = True
 
-    def __init__(self):
+    def __init__(self, cacheSize=0):
         '''
-        The constructor for the red-black tree
+        The constructor for the red-black tree. A positive cacheSize keeps
+        that many recently found nodes in an LRU cache in front of findNode.
         '''
         self._root = None
         self.size = 0
-        self.output = ''
+
+        # ticketID -> node for the most recent lookups, oldest first
+        self.cacheSize = cacheSize
+        self._cache = OrderedDict() if cacheSize > 0 else None
+        self.cacheHits = 0
+        self.cacheMisses = 0
+        # The node findNear last landed on
+        self._finger = None
+        # A TreeStats while instrumented, None otherwise. The hot paths only
+        # ever test this for None when it is off.
+        self.stats = None
 
         # All leaf nodes point to self.sentinel, rather than 'None'
-        # Parent of root should also be self.sentinel
+        # Parent of root should also be self.sentinel. There is exactly one
+        # sentinel per tree, no matter how many nodes we hold.
         self.sentinel = Sentinal()
         self.sentinel.parent = self.sentinel
         self.sentinel.leftChild = self.sentinel
         self.sentinel.rightChild = self.sentinel
 
+    @classmethod
+    def from_tickets(cls, tickets):
+        '''
+        Builds a new tree holding every mealticket in tickets. Sorted input
+        is loaded in linear time; anything else is sorted first.
+        '''
+        tree = cls()
+        tree.bulk_insert(tickets)
+        return tree
+
+    def bulk_insert(self, tickets):
+        '''
+        Inserts a batch of mealtickets at once. Returns True upon success and
+        False upon failure, in which case the tree is left untouched.
+        '''
+        batch = list(tickets)
+        for ticket in batch:
+            if not isinstance(ticket, MealTicket):
+                print("This tree is only meant to handle mealTickets")
+                return False
+        if not batch:
+            return True
+        # Most nightly batches come out of generateMealTickets already in
+        # ticketID order, so it is worth a linear check before paying for a
+        # sort.
+        for i in range(1, len(batch)):
+            if batch[i - 1].ticketID > batch[i].ticketID:
+                batch.sort(key=lambda ticket: ticket.ticketID)
+                break
+        # A batch that is small next to the tree is cheaper to insert one by
+        # one than to rebuild n nodes, so only merge when the batch is big
+        # enough to pay for the rebuild.
+        if self.size and self._isSmallBatch(len(batch)):
+            for ticket in batch:
+                self.insert(ticket)
+            return True
+        if self.size:
+            batch = self._mergeSorted(list(self), batch)
+        self._rebuild(batch)
+        return True
+
+    def _rebuild(self, tickets):
+        '''
+        Replaces every node in the tree with a balanced tree built from
+        tickets, which must be sorted by ticketID.
+        '''
+        self._forgetAll()
+        self._setRoot(self._buildBalanced(tickets, 0, len(tickets) - 1, 0,
+                                          len(tickets).bit_length() - 1))
+
+    def _newNode(self, ticket, color='red'):
+        '''
+        Builds a node for ticket that shares this tree's sentinel
+        '''
+        return RBNode(ticket, color, self.sentinel)
+
+    def _mergeSorted(self, first, second):
+        '''
+        Merges two lists of mealtickets sorted by ticketID into one.
+        '''
+        merged = []
+        i = j = 0
+        while i < len(first) and j < len(second):
+            if first[i].ticketID <= second[j].ticketID:
+                merged.append(first[i])
+                i += 1
+            else:
+                merged.append(second[j])
+                j += 1
+        merged.extend(first[i:])
+        merged.extend(second[j:])
+        return merged
+
+    def _buildBalanced(self, tickets, left, right, depth, redDepth):
+        '''
+        Builds a subtree out of tickets[left:right + 1], which must be sorted,
+        and returns its root.
+        '''
+        if left > right:
+            return self.sentinel
+        # Splitting on the middle keeps every path to a sentinel within one
+        # node of every other. Painting the deepest level red (when there is
+        # more than one level) then gives every path the same black height.
+        middle = (left + right) // 2
+        color = 'red' if depth == redDepth and depth > 0 else 'black'
+        node = self._newNode(tickets[middle], color)
+        node.setLeft(self._buildBalanced(tickets, left, middle - 1,
+                                         depth + 1, redDepth))
+        node.setRight(self._buildBalanced(tickets, middle + 1, right,
+                                          depth + 1, redDepth))
+        node.updateAugment()
+        return node
+
     def traverse(self, mode):
         '''
         The traverse method returns a string rep of the tree according to
         the specified mode
         '''
-        self.output = ''
-        if(isinstance(mode, str)) and self.size:
-            if(mode == 'in-order'):
-                self.inorder(self._root)
-            elif(mode == 'pre-order'):
-                self.preorder(self._root)
-            elif(mode == 'post-order'):
-                self.postorder(self._root)
+        if(mode == 'in-order'):
+            nodes = self.inorder(self._root)
+        elif(mode == 'pre-order'):
+            nodes = self.preorder(self._root)
+        elif(mode == 'post-order'):
+            nodes = self.postorder(self._root)
         else:
-            self.output = '  '
-        return self.output[:-2]
+            return ''
+        return ', '.join(str(node.key) for node in nodes)
+
+    def __iter__(self):
+        '''
+        Yields the mealtickets in the tree in ticketID order
+        '''
+        for node in self.inorder(self._root):
+            yield node.value
+
+    def __reversed__(self):
+        '''
+        Yields the mealtickets in the tree from the largest ticketID down
+        '''
+        for node in self.inorder(self._root, reverse=True):
+            yield node.value
+
+    def items(self):
+        '''
+        Yields (ticketID, mealticket) pairs in ticketID order
+        '''
+        for node in self.inorder(self._root):
+            yield node.key, node.value
+
+    def iter_range(self, lo, hi, reverse=False):
+        '''
+        Yields the mealtickets with lo <= ticketID <= hi in ticketID order,
+        or from hi down to lo if reverse is set.
+        '''
+        # Seed the stack with the path to the first ticket in range, skipping
+        # every subtree that lies entirely outside it. From there it is a
+        # plain in-order walk that stops at the far end of the range.
+        stack = []
+        currentNode = self._root
+        while currentNode is not None and not currentNode.isSentinal():
+            if reverse:
+                if currentNode.key <= hi:
+                    stack.append(currentNode)
+                    currentNode = currentNode.rightChild
+                else:
+                    currentNode = currentNode.leftChild
+            elif currentNode.key >= lo:
+                stack.append(currentNode)
+                currentNode = currentNode.leftChild
+            else:
+                currentNode = currentNode.rightChild
+        for node in self._walk(stack, reverse):
+            if (node.key < lo) if reverse else (node.key > hi):
+                return
+            yield node.value
+
+    def inorder(self, node, reverse=False):
+        '''
+        Yields the nodes of the subtree rooted at node in in-order (or
+        reversed in-order)
+        '''
+        stack = []
+        while node is not None and not node.isSentinal():
+            stack.append(node)
+            node = node.rightChild if reverse else node.leftChild
+        return self._walk(stack, reverse)
 
-    def inorder(self, node):
+    def _walk(self, stack, reverse):
         '''
-        Computes the preorder traversal 
+        Continues an in-order walk from a stack holding the path of nodes
+        still to be visited. Each step is O(1) amortized and the stack never
+        grows past the height of the tree.
         '''
-        if(node.key is not None):
-            self.inorder(node.leftChild)
-            self.output += str(node.key) + ', '
-            self.inorder(node.rightChild)
+        while stack:
+            node = stack.pop()
+            yield node
+            child = node.leftChild if reverse else node.rightChild
+            while not child.isSentinal():
+                stack.append(child)
+                child = child.rightChild if reverse else child.leftChild
 
     def preorder(self, node):
         '''
-        Computes the pre-order traversal
+        Yields the nodes of the subtree rooted at node in pre-order
         '''
-        if(node.key is not None):
-            self.output += str(node.key) + ', '
-            self.inorder(node.leftChild)
-            self.inorder(node.rightChild)
+        stack = []
+        if node is not None and not node.isSentinal():
+            stack.append(node)
+        while stack:
+            node = stack.pop()
+            yield node
+            # Push right first so the left subtree comes off the stack first
+            if not node.rightChild.isSentinal():
+                stack.append(node.rightChild)
+            if not node.leftChild.isSentinal():
+                stack.append(node.leftChild)
 
     def postorder(self, node):
         '''
-        Compute postorder traversal
+        Yields the nodes of the subtree rooted at node in post-order
         '''
-        if(node.key is not None):
-            self.inorder(node.leftChild)
-            self.inorder(node.rightChild)
-            self.output += str(node.key) + ', '
+        stack = []
+        lastVisited = None
+        while stack or (node is not None and not node.isSentinal()):
+            if node is not None and not node.isSentinal():
+                stack.append(node)
+                node = node.leftChild
+                continue
+            top = stack[-1]
+            # Only visit a node once its right subtree is done
+            if (not top.rightChild.isSentinal() and
+                    top.rightChild is not lastVisited):
+                node = top.rightChild
+            else:
+                lastVisited = stack.pop()
+                yield lastVisited
+                node = None
 
     def findSuccessor(self, node):
         '''
@@ -242,6 +499,14 @@ class RedBlackTree:
         if ticket:
             self.size -= 1
             originalColor = ticket.color
+            # Nodes are about to be unlinked or take over other keys, so
+            # drop anything the lookup cache or the finger says about them.
+            self._forget(ticketID)
+            self._finger = None
+            # The lowest node whose subtree lost a node (or had a ticket
+            # copied into it); every node from here to the root needs its
+            # subtree size and cost recomputed.
+            changed = ticket.parent
             if ticket.isLeaf():
                 x = self.sentinel 
                 # Case: ticket is a leaf less than its parent
@@ -259,6 +524,7 @@ class RedBlackTree:
             elif ticket.hasOnlyOneChild():
                 # Case: the node to be deleted only has a right child
                 if ticket.leftChild.isSentinal():
+                    self._forget(ticket.rightChild.key)
                     ticket.value = ticket.rightChild.value
                     ticket.key = ticket.rightChild.key
                     ticket.color = ticket.rightChild.color
@@ -266,31 +532,40 @@ class RedBlackTree:
                     ticket.setRight(ticket.rightChild.leftChild)
                 # Case: the node to be deleted only has a left child
                 else:
+                    self._forget(ticket.leftChild.key)
                     ticket.value = ticket.leftChild.value
                     ticket.key = ticket.leftChild.key
                     ticket.color = ticket.leftChild.color
                     ticket.setRight(ticket.leftChild.rightChild)
                     ticket.setLeft(ticket.leftChild.leftChild)
                 x = ticket
+                changed = ticket
             else:
                 replacement = self.findSuccessor(ticket)
+                self._forget(replacement.key)
                 x = replacement.rightChild
                 originalColor = replacement.color
                 # Case: the node has two children, one is its successor
-                if replacement.parent.key == ticket.key:
+                if replacement.parent is ticket:
                     ticket.value = replacement.value
                     ticket.key = replacement.key
                     ticket.rightChild = x
                     replacement.parent = None
                     x.parent = ticket
+                    changed = ticket
                 # Case: the node has two children, neither are its successor
                 else:
                     ticket.value = replacement.value
                     ticket.key = replacement.key
                     replacement.parent.leftChild = x
                     x.parent = replacement.parent
+                    changed = replacement.parent
                     replacement.parent = None
-            
+
+            while not changed.isSentinal():
+                changed.updateAugment()
+                changed = changed.parent
+
             if originalColor == 'black' and self._root is not None:
                 self.deleteFixup(x)
 
@@ -301,18 +576,19 @@ class RedBlackTree:
         Inserts a new node holding the given mealticket into the tree. Returns
         True upon success and False upon failure.
         '''
-        currentNode = self._root
-        inserted = RBNode(ticket)
-        ticket.leftChild = self.sentinel
-        ticket.rightChild = self.sentinel
         if not isinstance(ticket, MealTicket):
             print("This tree is only meant to handle mealTickets")
             return False
+        currentNode = self._root
+        inserted = self._newNode(ticket)
         # We travel down the tree according to the search property until
         # we reach a leaf, at which point we create a new node and add it
         # to whichever side the search property dictates.
         self.size += 1
         while currentNode is not None and not currentNode.isSentinal():
+            # Every node on the way down gains the new ticket in its subtree
+            currentNode.subtreeSize += 1
+            currentNode.subtreeCost += ticket.totalCost
             # travel down the tree
             if currentNode.key > ticket.ticketID:
                 newNode = currentNode.leftChild
@@ -351,6 +627,8 @@ class RedBlackTree:
         y = currentNode.rightChild
         if y.isSentinal():
             return
+        if self.stats is not None:
+            self.stats.rotations += 1
         currentNode.rightChild = y.leftChild
         # If y has a left branch we need to move it to the right of currentNode
         if not y.leftChild.isSentinal():
@@ -368,6 +646,11 @@ class RedBlackTree:
         # Now, we plant currentNode to the left of y.
         y.leftChild = currentNode
         currentNode.parent = y
+        # y takes over currentNode's whole subtree, and currentNode is left
+        # with its old left branch plus y's old left branch.
+        y.subtreeSize = currentNode.subtreeSize
+        y.subtreeCost = currentNode.subtreeCost
+        currentNode.updateAugment()
 
     def _rightRotate(self, currentNode):
         ''' 
@@ -379,6 +662,8 @@ class RedBlackTree:
         y = currentNode.leftChild
         if y.isSentinal():
             return
+        if self.stats is not None:
+            self.stats.rotations += 1
         currentNode.leftChild = y.rightChild
         # If y has a right branch we need to move it to the left of currentNode.
         if not y.rightChild.isSentinal():
@@ -395,16 +680,33 @@ class RedBlackTree:
         # Now, we plant currentNode to the right of y.
         y.rightChild = currentNode
         currentNode.parent = y
+        y.subtreeSize = currentNode.subtreeSize
+        y.subtreeCost = currentNode.subtreeCost
+        currentNode.updateAugment()
 
     def findNode(self, ticketID):
         '''
         Returns node specified by ticketID if it exists, and False otherwise.
         '''
+        cache = self._cache
+        if cache is not None:
+            found = cache.get(ticketID)
+            if found is not None:
+                cache.move_to_end(ticketID)
+                self.cacheHits += 1
+                return found
+            self.cacheMisses += 1
         found = False
         currentNode = self._root
+        # Every node in the tree shares self.sentinel, so an identity check
+        # stands in for calling isSentinal() at each level.
+        sentinel = self.sentinel
+        if self.stats is not None:
+            found = self._countedFindNode(ticketID)
+            currentNode = None
         # Go where the search property tells you to until you find a maching
         # node or a leaf.
-        while currentNode is not None and not currentNode.isSentinal():
+        while currentNode is not None and currentNode is not sentinel:
             if currentNode.key == ticketID:
                 found = currentNode
                 break
@@ -412,14 +714,585 @@ class RedBlackTree:
                 currentNode = currentNode.leftChild
             else:
                 currentNode = currentNode.rightChild
+        if found and cache is not None:
+            cache[ticketID] = found
+            if len(cache) > self.cacheSize:
+                cache.popitem(last=False)
         return found
 
+    def _countedFindNode(self, ticketID):
+        '''
+        The walk findNode does, counting every node it compares ticketID
+        against. It is kept apart so uninstrumented lookups do not pay for
+        the counting.
+        '''
+        stats = self.stats
+        stats.finds += 1
+        currentNode = self._root
+        sentinel = self.sentinel
+        while currentNode is not None and currentNode is not sentinel:
+            stats.comparisons += 1
+            if currentNode.key == ticketID:
+                return currentNode
+            if currentNode.key > ticketID:
+                currentNode = currentNode.leftChild
+            else:
+                currentNode = currentNode.rightChild
+        return False
+
+    def findNear(self, ticketID):
+        '''
+        Like find, but starts from the node the previous findNear landed on.
+        Looking up an ID d positions away from the last one climbs and then
+        descends O(log d) levels, so sequential and clustered lookups skip
+        most of the walk down from the root.
+        '''
+        if not isinstance(ticketID, int) or self._root is None:
+            return False
+        currentNode = self._finger
+        if currentNode is None:
+            currentNode = self._root
+        # Climb until ticketID has to be in currentNode's subtree: that is
+        # once we step up out of a left subtree whose parent is above
+        # ticketID (or out of a right subtree whose parent is below it).
+        sentinel = self.sentinel
+        if ticketID > currentNode.key:
+            while currentNode.parent is not sentinel:
+                parent = currentNode.parent
+                if parent.leftChild is currentNode and ticketID < parent.key:
+                    break
+                currentNode = parent
+        elif ticketID < currentNode.key:
+            while currentNode.parent is not sentinel:
+                parent = currentNode.parent
+                if parent.rightChild is currentNode and ticketID > parent.key:
+                    break
+                currentNode = parent
+        # Then search down as usual, remembering where we stop either way.
+        while True:
+            if currentNode.key == ticketID:
+                self._finger = currentNode
+                return currentNode.value
+            if currentNode.key > ticketID:
+                child = currentNode.leftChild
+            else:
+                child = currentNode.rightChild
+            if child is sentinel:
+                self._finger = currentNode
+                return False
+            currentNode = child
+
+    def _forget(self, ticketID):
+        '''
+        Drops ticketID from the lookup cache
+        '''
+        if self._cache is not None:
+            self._cache.pop(ticketID, None)
+
+    def _forgetAll(self):
+        '''
+        Empties the lookup cache and the finger
+        '''
+        if self._cache is not None:
+            self._cache.clear()
+        self._finger = None
+
+    def cacheStats(self):
+        '''
+        Returns the lookup cache's hits, misses and hit rate
+        '''
+        lookups = self.cacheHits + self.cacheMisses
+        return {
+            'hits': self.cacheHits,
+            'misses': self.cacheMisses,
+            'hitRate': self.cacheHits / lookups if lookups else 0.0,
+        }
+
+    def instrument(self, enabled=True):
+        '''
+        Starts counting rotations, fixup loop iterations and findNode
+        comparisons into a fresh TreeStats, which is returned, or stops
+        counting when enabled is false
+        '''
+        self.stats = TreeStats() if enabled else None
+        return self.stats
+
+    def heightReport(self):
+        '''
+        Returns the tree's size, height (in nodes, root to deepest leaf),
+        the depth of its shallowest leaf, its black height, the average
+        node depth, and the 2 * log2(n + 1) bound the height must respect
+        (log2(n + 1) rounded up is just the bit length of n)
+        '''
+        report = {'size': self.size, 'height': 0, 'minLeafDepth': 0,
+                  'blackHeight': 0, 'averageDepth': 0.0,
+                  'heightBound': 2 * self.size.bit_length()}
+        if self._root is None:
+            return report
+        sentinel = self.sentinel
+        height = 0
+        minLeafDepth = None
+        totalDepth = 0
+        count = 0
+        stack = [(self._root, 1)]
+        while stack:
+            node, depth = stack.pop()
+            count += 1
+            totalDepth += depth
+            height = max(height, depth)
+            if node.leftChild is sentinel or node.rightChild is sentinel:
+                if minLeafDepth is None or depth < minLeafDepth:
+                    minLeafDepth = depth
+            for child in (node.leftChild, node.rightChild):
+                if child is not sentinel:
+                    stack.append((child, depth + 1))
+        report['height'] = height
+        report['minLeafDepth'] = minLeafDepth
+        report['blackHeight'] = self._blackHeight(self._root)
+        report['averageDepth'] = totalDepth / count
+        return report
+
+    def validate(self):
+        '''
+        Checks in O(n) that the tree is a valid red-black tree: keys in
+        search order (equal keys, which insert allows, may sit on either
+        side once rotations have moved them) and matching their tickets, a
+        black root, no red node with a red child, the same black height down
+        every path, parent pointers that agree with the child links, correct
+        subtree sizes and costs, and a size that matches the node count.
+        Returns True if so; otherwise prints the first problem found and
+        returns False.
+        '''
+        sentinel = self.sentinel
+        if self._root is None:
+            if self.size != 0:
+                print("Invalid tree: empty, but size is", self.size)
+                return False
+            return True
+        if sentinel.color != 'black':
+            print("Invalid tree: the sentinel is not black")
+            return False
+        if self._root.color != 'black':
+            print("Invalid tree: the root is not black")
+            return False
+        if self._parentLinks and self._root.parent is not sentinel:
+            print("Invalid tree: the root's parent is not the sentinel")
+            return False
+        # Walk the tree post-order without recursion. Each frame carries the
+        # closed interval its keys must fall in; once both children are done
+        # their (black height, size, cost) results are on top of results.
+        results = []
+        stack = [(self._root, None, None, False)]
+        while stack:
+            node, lo, hi, childrenDone = stack.pop()
+            if node is sentinel:
+                results.append((0, 0, 0))
+                continue
+            if childrenDone:
+                right = results.pop()
+                left = results.pop()
+                if left[0] != right[0]:
+                    print("Invalid tree: black heights differ below", node.key)
+                    return False
+                size = left[1] + right[1] + 1
+                cost = left[2] + right[2] + node.value.totalCost
+                if node.subtreeSize != size:
+                    print("Invalid tree: wrong subtree size at", node.key)
+                    return False
+                if abs(node.subtreeCost - cost) > 1e-6:
+                    print("Invalid tree: wrong subtree cost at", node.key)
+                    return False
+                black = left[0] + (node.color == 'black')
+                results.append((black, size, cost))
+                continue
+            if node.color not in ('red', 'black'):
+                print("Invalid tree: node", node.key, "has color", node.color)
+                return False
+            if node.key != node.value.ticketID:
+                print("Invalid tree: node", node.key, "holds ticket",
+                      node.value.ticketID)
+                return False
+            if (lo is not None and node.key < lo) or (
+                    hi is not None and node.key > hi):
+                print("Invalid tree: node", node.key, "is out of order")
+                return False
+            for child in (node.leftChild, node.rightChild):
+                if child is None:
+                    print("Invalid tree: node", node.key, "has a None child")
+                    return False
+                if child is sentinel:
+                    continue
+                if node.color == 'red' and child.color == 'red':
+                    print("Invalid tree: red node", node.key,
+                          "has a red child")
+                    return False
+                if self._parentLinks and child.parent is not node:
+                    print("Invalid tree: node", child.key,
+                          "does not point back at its parent", node.key)
+                    return False
+            stack.append((node, lo, hi, True))
+            stack.append((node.rightChild, node.key, hi, False))
+            stack.append((node.leftChild, lo, node.key, False))
+        if results[0][1] != self.size:
+            print("Invalid tree: holds", results[0][1], "nodes but size is",
+                  self.size)
+            return False
+        return True
+
+    def _prefix(self, ticketID, inclusive):
+        '''
+        Returns the number of tickets and their summed totalCost for every
+        ticket with an ID below ticketID (or at most ticketID if inclusive).
+        '''
+        count = 0
+        cost = 0
+        currentNode = self._root
+        # Whenever we step right, the node and its whole left subtree fall
+        # below ticketID, so we can take them in one go.
+        while currentNode is not None and not currentNode.isSentinal():
+            if (currentNode.key < ticketID or
+                    (inclusive and currentNode.key == ticketID)):
+                count += currentNode.leftChild.subtreeSize + 1
+                cost += (currentNode.leftChild.subtreeCost +
+                         currentNode.value.totalCost)
+                currentNode = currentNode.rightChild
+            else:
+                currentNode = currentNode.leftChild
+        return count, cost
+
+    def rank(self, ticketID):
+        '''
+        Returns the number of tickets with an ID less than or equal to
+        ticketID. For a ticket in the tree this is its 1-based position in
+        ticketID order.
+        '''
+        return self._prefix(ticketID, True)[0]
+
+    def select(self, k):
+        '''
+        Returns the mealticket with the k-th smallest ticketID (counting from
+        1) if it exists, otherwise returns false.
+        '''
+        if not isinstance(k, int) or k < 1 or k > self.size:
+            return False
+        currentNode = self._root
+        while True:
+            leftSize = currentNode.leftChild.subtreeSize
+            if k == leftSize + 1:
+                return currentNode.value
+            if k <= leftSize:
+                currentNode = currentNode.leftChild
+            else:
+                k -= leftSize + 1
+                currentNode = currentNode.rightChild
+
+    def count_range(self, lo, hi):
+        '''
+        Returns the number of tickets with lo <= ticketID <= hi.
+        '''
+        if lo > hi:
+            return 0
+        return self._prefix(hi, True)[0] - self._prefix(lo, False)[0]
+
+    def sum_cost_range(self, lo, hi):
+        '''
+        Returns the summed totalCost of the tickets with lo <= ticketID <= hi.
+        '''
+        if lo > hi:
+            return 0
+        total = self._prefix(hi, True)[1] - self._prefix(lo, False)[1]
+        return round(total, 2)
+
+    def split(self, ticketID):
+        '''
+        Splits the tree in two: one tree with the tickets whose ID is below
+        ticketID and one with the rest. Both new trees reuse this tree's
+        nodes and sentinel, and this tree is left empty. O(log^2 n).
+        '''
+        self._forgetAll()
+        less, more = self._splitNodes(self._rootOrSentinel(), ticketID, False)
+        self._setRoot(self.sentinel)
+        return self._wrap(less), self._wrap(more)
+
+    def join(self, other):
+        '''
+        Moves every ticket of other onto the end of this tree. Every ticketID
+        in this tree must be at most every ticketID in other. Returns True
+        upon success and False upon failure; other is left empty.
+        '''
+        if other is self:
+            return False
+        if (self.size and other.size and
+                next(reversed(self)).ticketID > next(iter(other)).ticketID):
+            print("Every ticketID in the joined tree must come after ours")
+            return False
+        self._forgetAll()
+        other._forgetAll()
+        self._adopt(other)
+        self._setRoot(self._joinTwo(self._rootOrSentinel(),
+                                    other._rootOrSentinel()))
+        other._setRoot(other.sentinel)
+        return True
+
+    def delete_range(self, lo, hi):
+        '''
+        Deletes every ticket with lo <= ticketID <= hi and returns how many
+        went. Rather than k separate deletes this splits out the range and
+        joins what is left, which takes O(log^2 n) no matter how big the
+        range is.
+        '''
+        if self.count_range(lo, hi) == 0:
+            return 0
+        self._forgetAll()
+        less, rest = self._splitNodes(self._root, lo, False)
+        inside, more = self._splitNodes(rest, hi, True)
+        self._setRoot(self._joinTwo(less, more))
+        return inside.subtreeSize
+
+    def union(self, other):
+        '''
+        Moves every ticket of other into this tree. Where both trees hold a
+        ticket with the same ID, the one from other replaces ours. other is
+        left empty.
+        '''
+        if other is self:
+            return True
+        if self._isSmallBatch(other.size):
+            replaced = set()
+            for ticket in other:
+                if ticket.ticketID not in replaced:
+                    replaced.add(ticket.ticketID)
+                    while self.delete(ticket.ticketID):
+                        pass
+                self.insert(ticket)
+        else:
+            # Against a big batch, merging both in order and rebuilding is
+            # O(n + m)
+            mine = list(self)
+            theirs = list(other)
+            merged = []
+            i = j = 0
+            while i < len(mine) and j < len(theirs):
+                if mine[i].ticketID < theirs[j].ticketID:
+                    merged.append(mine[i])
+                    i += 1
+                elif mine[i].ticketID > theirs[j].ticketID:
+                    merged.append(theirs[j])
+                    j += 1
+                else:
+                    # Ours is replaced by theirs
+                    i += 1
+            merged.extend(mine[i:])
+            merged.extend(theirs[j:])
+            self._rebuild(merged)
+        other._forgetAll()
+        other._setRoot(other.sentinel)
+        return True
+
+    def difference(self, other):
+        '''
+        Deletes every ticket whose ID is also in other, which is not changed.
+        Returns the number of tickets deleted.
+        '''
+        before = self.size
+        self._forgetAll()
+        if other is self:
+            self._setRoot(self.sentinel)
+        elif self._isSmallBatch(other.size):
+            for ticket in other:
+                while self.delete(ticket.ticketID):
+                    pass
+        else:
+            doomed = set(ticket.ticketID for ticket in other)
+            self._rebuild([ticket for ticket in self
+                           if ticket.ticketID not in doomed])
+        return before - self.size
+
+    def _isSmallBatch(self, count):
+        '''
+        Returns True if count tickets are few enough that working them into
+        the tree one at a time (about count * log n steps) beats rebuilding
+        all n nodes
+        '''
+        # Building a node costs about as much as walking 16 levels, so the
+        # break-even batch is around 16n / log n (see benchmark.py ranges).
+        return count * self.size.bit_length() < 16 * self.size
+
+    def _rootOrSentinel(self):
+        '''
+        Returns the root, or the sentinel when the tree is empty
+        '''
+        return self._root if self._root is not None else self.sentinel
+
+    def _setRoot(self, root):
+        '''
+        Makes root (a subtree built from our nodes, or the sentinel) the
+        whole tree
+        '''
+        if root is self.sentinel:
+            self._root = None
+            self.size = 0
+        else:
+            root.parent = self.sentinel
+            root.color = 'black'
+            self._root = root
+            self.size = root.subtreeSize
+
+    def _wrap(self, root):
+        '''
+        Returns a new tree made of the subtree at root, sharing our sentinel
+        '''
+        tree = type(self)(self.cacheSize)
+        tree.sentinel = self.sentinel
+        tree._setRoot(root)
+        return tree
+
+    def _adopt(self, other):
+        '''
+        Points the leaves of other's nodes at our sentinel so its subtrees
+        can be joined with ours. O(size of other) unless the trees already
+        share a sentinel, as the halves of a split do.
+        '''
+        if other.sentinel is self.sentinel:
+            return
+        for node in other.inorder(other._root):
+            if node.leftChild is other.sentinel:
+                node.leftChild = self.sentinel
+            if node.rightChild is other.sentinel:
+                node.rightChild = self.sentinel
+        if other._root is not None:
+            other._root.parent = self.sentinel
+        other.sentinel = self.sentinel
+
+    def _detach(self, node):
+        '''
+        Cuts node off from its children and returns them as two free
+        subtrees
+        '''
+        left = node.leftChild
+        right = node.rightChild
+        if left is not self.sentinel:
+            left.parent = self.sentinel
+        if right is not self.sentinel:
+            right.parent = self.sentinel
+        node.leftChild = self.sentinel
+        node.rightChild = self.sentinel
+        return left, right
+
+    def _blackHeight(self, node):
+        '''
+        Returns the number of black nodes on any path from node down to
+        (but not counting) the sentinel
+        '''
+        height = 0
+        while node is not self.sentinel:
+            if node.color == 'black':
+                height += 1
+            node = node.leftChild
+        return height
+
+    def _joinNodes(self, left, middle, right):
+        '''
+        Joins the free subtrees left and right with the detached node middle
+        in between, and returns the root of the result. Every key in left
+        must be at most middle.key and every key in right at least that.
+        '''
+        sentinel = self.sentinel
+        # Both sides need black roots so that middle can come in red.
+        for root in (left, right):
+            if root is not sentinel:
+                root.parent = sentinel
+                root.color = 'black'
+        leftHeight = self._blackHeight(left)
+        rightHeight = self._blackHeight(right)
+        middle.parent = sentinel
+        if leftHeight == rightHeight:
+            middle.color = 'black'
+            middle.setLeft(left)
+            middle.setRight(right)
+            middle.updateAugment()
+            return middle
+        # Walk down the facing spine of the taller side to the first black
+        # node with the shorter side's black height, and hang middle there
+        # with that node and the shorter side as its children.
+        middle.color = 'red'
+        if leftHeight > rightHeight:
+            root = parent = left
+            node = left.rightChild
+            height = leftHeight - 1
+            while node.color == 'red' or height > rightHeight:
+                if node.color == 'black':
+                    height -= 1
+                parent = node
+                node = node.rightChild
+            middle.setLeft(node)
+            middle.setRight(right)
+            parent.setRight(middle)
+        else:
+            root = parent = right
+            node = right.leftChild
+            height = rightHeight - 1
+            while node.color == 'red' or height > leftHeight:
+                if node.color == 'black':
+                    height -= 1
+                parent = node
+                node = node.leftChild
+            middle.setLeft(left)
+            middle.setRight(node)
+            parent.setLeft(middle)
+        middle.updateAugment()
+        while parent is not sentinel:
+            parent.updateAugment()
+            parent = parent.parent
+        # middle may now be a red child of a red node, which is exactly what
+        # insertFixup repairs. Let it treat root's subtree as the whole tree
+        # for a moment.
+        savedRoot = self._root
+        self._root = root
+        self.insertFixup(middle)
+        root = self._root
+        self._root = savedRoot
+        return root
+
+    def _joinTwo(self, left, right):
+        '''
+        Joins two free subtrees, every key in left at most every key in
+        right, and returns the root of the result
+        '''
+        if left is self.sentinel:
+            return right
+        if right is self.sentinel:
+            return left
+        # Borrow left's root as the middle node for the join
+        leftLeft, leftRight = self._detach(left)
+        return self._joinNodes(leftLeft, left,
+                               self._joinTwo(leftRight, right))
+
+    def _splitNodes(self, node, ticketID, equalGoesLeft):
+        '''
+        Splits the free subtree at node into two free subtrees: keys below
+        ticketID (or at most ticketID if equalGoesLeft) and the rest.
+        Returns both roots.
+        '''
+        if node is self.sentinel:
+            return self.sentinel, self.sentinel
+        left, right = self._detach(node)
+        if node.key < ticketID or (equalGoesLeft and node.key == ticketID):
+            # node and everything left of it belong on the left
+            less, more = self._splitNodes(right, ticketID, equalGoesLeft)
+            return self._joinNodes(left, node, less), more
+        less, more = self._splitNodes(left, ticketID, equalGoesLeft)
+        return less, self._joinNodes(more, node, right)
+
     def insertFixup(self, currentNode):
         '''
         An internal method to maintain red-black properties after insertions
         are preformed
         '''
+        stats = self.stats
         while currentNode.parent is not None and currentNode.parent.color == 'red':
+            if stats is not None:
+                stats.insertFixups += 1
             if currentNode.parent.isLeftChild():
                 # Case: currentNode has a red uncle.
                 y = currentNode.parent.parent.rightChild
@@ -463,7 +1336,10 @@ class RedBlackTree:
         This method restores red black tree properties that may be violated
         during node deletions.
         '''
+        stats = self.stats
         while currentNode != self._root and currentNode.color == 'black':
+            if stats is not None:
+                stats.deleteFixups += 1
             if currentNode.isLeftChild():
                 # Case: currentNode has a red sibling
                 w = currentNode.parent.rightChild
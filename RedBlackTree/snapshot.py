@@ -0,0 +1,375 @@
+'''
+A compact on-disk snapshot of a tree of meal tickets, meant to be opened
+with mmap so a restarted worker can answer lookups straight away instead of
+rebuilding every ticket first.
+
+The file is a short header followed by one or more segments. Every segment
+holds a batch of tickets sorted by ticketID, stored column by column:
+
+    header   b'RBSNAP' + byte order + version
+    segment  b'SEGM', ticket count, item count, name bytes, item name bytes
+             ticket IDs          int64   * count
+             total costs         float64 * count
+             name offsets        uint64  * (count + 1)
+             item offsets        uint64  * (count + 1)
+             item costs          float64 * item count
+             item name offsets   uint64  * (item count + 1)
+             ticket names        utf-8 blob
+             item names          utf-8 blob
+
+Every section is padded to 8 bytes so the numeric columns can be read in
+place through memoryview casts. Appending new tickets writes a new segment
+at the end of the file, so nothing already on disk is rewritten. A ticket
+saved again in a later segment replaces the earlier copy.
+'''
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import sys
+from array import array
+from redblack import *
+
+MAGIC = b'RBSNAP'
+VERSION = 1
+BYTEORDER = b'<' if sys.byteorder == 'little' else b'>'
+FILE_HEADER = struct.Struct('=6scB')
+SEGMENT_HEADER = struct.Struct('=4s4xQQQQ')
+
+
+def _padded(length):
+    '''
+    Rounds a section length up to the next multiple of 8
+    '''
+    return (length + 7) & ~7
+
+
+def _sectionLengths(count, itemCount, nameBytes, itemNameBytes):
+    '''
+    Returns the unpadded byte length of every section of a segment, in the
+    order they are written, paired with the array typecode to read it with
+    '''
+    return ((count * 8, 'q'), (count * 8, 'd'),
+            ((count + 1) * 8, 'Q'), ((count + 1) * 8, 'Q'),
+            (itemCount * 8, 'd'), ((itemCount + 1) * 8, 'Q'),
+            (nameBytes, None), (itemNameBytes, None))
+
+
+def _newest(entries):
+    '''
+    Yields the last of every run of entries with the same ticketID, from
+    entries sorted by (ticketID, age) so the newest copy comes last
+    '''
+    previous = None
+    for entry in entries:
+        if previous is not None and previous[0] != entry[0]:
+            yield previous
+        previous = entry
+    if previous is not None:
+        yield previous
+
+
+def _encodeSegment(tickets):
+    '''
+    Returns the bytes of one segment holding tickets, sorted by ticketID.
+    If a ticketID turns up more than once the last ticket given wins.
+    '''
+    tickets = list({ticket.ticketID: ticket for ticket in tickets}.values())
+    tickets.sort(key=lambda ticket: ticket.ticketID)
+    ids = array('q')
+    costs = array('d')
+    nameOffsets = array('Q', [0])
+    itemOffsets = array('Q', [0])
+    itemCosts = array('d')
+    itemNameOffsets = array('Q', [0])
+    names = bytearray()
+    itemNames = bytearray()
+    for ticket in tickets:
+        ids.append(ticket.ticketID)
+        costs.append(ticket.totalCost)
+        names += ticket.TicketName.encode('utf-8')
+        nameOffsets.append(len(names))
+        for itemName, itemCost in ticket.items:
+            itemCosts.append(itemCost)
+            itemNames += itemName.encode('utf-8')
+            itemNameOffsets.append(len(itemNames))
+        itemOffsets.append(len(itemCosts))
+    parts = [SEGMENT_HEADER.pack(b'SEGM', len(ids), len(itemCosts),
+                                 len(names), len(itemNames))]
+    for section in (ids, costs, nameOffsets, itemOffsets, itemCosts,
+                    itemNameOffsets, names, itemNames):
+        data = bytes(section)
+        parts.append(data + b'\0' * (_padded(len(data)) - len(data)))
+    return b''.join(parts)
+
+
+def writeSnapshot(tickets, path):
+    '''
+    Writes a snapshot holding tickets (a RedBlackTree or any iterable of
+    mealtickets) to path, replacing whatever was there.
+    '''
+    segment = _encodeSegment(tickets)
+    # Write next to the target and rename over it so a crash never leaves a
+    # half written snapshot behind.
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(FILE_HEADER.pack(MAGIC, BYTEORDER, VERSION))
+        f.write(segment)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return True
+
+
+def _readableLength(f):
+    '''
+    Returns how many bytes of the snapshot open as f make up its header and
+    complete segments, the same ones TicketSnapshot would read. Anything
+    after that is the tail of an append that was cut short.
+    '''
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise ValueError('{} is not a ticket snapshot'.format(f.name))
+    magic, byteorder, version = FILE_HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{} is not a ticket snapshot'.format(f.name))
+    if byteorder != BYTEORDER:
+        raise ValueError('snapshot was written with the other byte order')
+    offset = FILE_HEADER.size
+    while offset + SEGMENT_HEADER.size <= size:
+        f.seek(offset)
+        tag, *counts = SEGMENT_HEADER.unpack(f.read(SEGMENT_HEADER.size))
+        if tag != b'SEGM':
+            break
+        end = offset + SEGMENT_HEADER.size + sum(
+            _padded(length) for length, code in _sectionLengths(*counts))
+        if end > size:
+            break
+        offset = end
+    return offset
+
+
+def appendSnapshot(tickets, path):
+    '''
+    Appends new tickets to an existing snapshot as a fresh segment. Open
+    TicketSnapshots only see the new tickets once they are reopened. A
+    segment left half written by an earlier crash is cut off first, since
+    readers stop at it and would never see anything written after it.
+    '''
+    tickets = list(tickets)
+    if not tickets:
+        return True
+    segment = _encodeSegment(tickets)
+    with open(path, 'r+b') as f:
+        f.truncate(_readableLength(f))
+        f.seek(0, os.SEEK_END)
+        f.write(segment)
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+
+class SnapshotSegment(object):
+    '''
+    Read-only views onto the columns of one segment in a mapped file.
+    '''
+
+    def __init__(self, view, offset):
+        '''
+        Builds the column views for the segment starting at offset
+        '''
+        if offset + SEGMENT_HEADER.size > len(view):
+            raise ValueError('truncated snapshot segment')
+        (tag, count, itemCount, nameBytes,
+         itemNameBytes) = SEGMENT_HEADER.unpack_from(view, offset)
+        if tag != b'SEGM':
+            raise ValueError('corrupt snapshot segment at {}'.format(offset))
+        self.count = count
+        offset += SEGMENT_HEADER.size
+        columns = []
+        for length, code in _sectionLengths(count, itemCount, nameBytes,
+                                            itemNameBytes):
+            # The padding counts too, or the next segment would be misread
+            if offset + _padded(length) > len(view):
+                raise ValueError('truncated snapshot segment')
+            section = view[offset:offset + length]
+            columns.append(section.cast(code) if code else section)
+            offset += _padded(length)
+        (self.ids, self.costs, self.nameOffsets, self.itemOffsets,
+         self.itemCosts, self.itemNameOffsets, self.names,
+         self.itemNames) = columns
+        self.end = offset
+
+    def release(self):
+        '''
+        Drops the views so the underlying map can be closed
+        '''
+        for column in (self.ids, self.costs, self.nameOffsets,
+                       self.itemOffsets, self.itemCosts, self.itemNameOffsets,
+                       self.names, self.itemNames):
+            column.release()
+
+    def position(self, ticketID):
+        '''
+        Returns the index of ticketID in this segment, or -1
+        '''
+        index = bisect.bisect_left(self.ids, ticketID)
+        if index < self.count and self.ids[index] == ticketID:
+            return index
+        return -1
+
+    def scan(self, lo, hi, number):
+        '''
+        Yields (ticketID, number, index) for every ticket in this segment
+        with lo <= ticketID <= hi, where number identifies the segment
+        '''
+        start = bisect.bisect_left(self.ids, lo)
+        stop = bisect.bisect_right(self.ids, hi)
+        for index in range(start, stop):
+            yield self.ids[index], number, index
+
+    def ticket(self, index):
+        '''
+        Builds the mealticket stored at index
+        '''
+        name = str(self.names[self.nameOffsets[index]:
+                              self.nameOffsets[index + 1]], 'utf-8')
+        items = []
+        for item in range(self.itemOffsets[index], self.itemOffsets[index + 1]):
+            itemName = str(self.itemNames[self.itemNameOffsets[item]:
+                                          self.itemNameOffsets[item + 1]],
+                           'utf-8')
+            items.append((itemName, self.itemCosts[item]))
+        return MealTicket.fromFields(self.ids[index], name, items,
+                                     self.costs[index])
+
+
+class TicketSnapshot(object):
+    '''
+    A snapshot file opened through mmap. find and the scans read the mapped
+    columns directly and only build MealTicket objects for the tickets they
+    hand back. Where a ticketID is in more than one segment only the copy in
+    the newest segment is seen, by find, the scans and len alike.
+    '''
+
+    def __init__(self, path):
+        '''
+        Maps the snapshot at path and indexes its segments
+        '''
+        self._file = open(path, 'rb')
+        self._map = None
+        self._view = None
+        self.segments = []
+        self._length = None
+        try:
+            # mmap refuses an empty file, and a short one has no header
+            if os.fstat(self._file.fileno()).st_size < FILE_HEADER.size:
+                raise ValueError('{} is not a ticket snapshot'.format(path))
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+            magic, byteorder, version = FILE_HEADER.unpack_from(self._view, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('{} is not a ticket snapshot'.format(path))
+            if byteorder != BYTEORDER:
+                raise ValueError(
+                    'snapshot was written with the other byte order')
+            offset = FILE_HEADER.size
+            while offset < len(self._view):
+                try:
+                    segment = SnapshotSegment(self._view, offset)
+                except ValueError:
+                    # A segment cut short by a crash mid-append is simply
+                    # ignored
+                    break
+                self.segments.append(segment)
+                offset = segment.end
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        '''
+        Unmaps the file
+        '''
+        for segment in self.segments:
+            segment.release()
+        self.segments = []
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __len__(self):
+        '''
+        Returns the number of distinct tickets. With more than one segment
+        this walks the ID columns once, and is then remembered.
+        '''
+        if self._length is None:
+            if len(self.segments) == 1:
+                self._length = self.segments[0].count
+            else:
+                self._length = sum(1 for ticketID in self.ticketIDs())
+        return self._length
+
+    def find(self, ticketID):
+        '''
+        Returns the mealticket with the specified ticketID if it exists,
+        otherwise returns false.
+        '''
+        if not isinstance(ticketID, int):
+            return False
+        # Newer segments win, in case a ticket was appended twice
+        for segment in reversed(self.segments):
+            index = segment.position(ticketID)
+            if index >= 0:
+                return segment.ticket(index)
+        return False
+
+    def ticketIDs(self):
+        '''
+        Yields every ticketID in order without building any tickets
+        '''
+        merged = heapq.merge(*(segment.ids for segment in self.segments))
+        previous = None
+        for ticketID in merged:
+            if ticketID != previous:
+                yield ticketID
+            previous = ticketID
+
+    def iter_range(self, lo, hi):
+        '''
+        Yields the mealtickets with lo <= ticketID <= hi in ticketID order
+        '''
+        scans = [segment.scan(lo, hi, number)
+                 for number, segment in enumerate(self.segments)]
+        # Each scan is a lazy walk over a mapped ID column, so only the
+        # tickets actually yielded are ever built. Copies of one ticketID
+        # come out oldest segment first, and only the last is kept.
+        for ticketID, number, index in _newest(heapq.merge(*scans)):
+            yield self.segments[number].ticket(index)
+
+    def __iter__(self):
+        '''
+        Yields every mealticket in ticketID order
+        '''
+        return self.iter_range(-2 ** 63, 2 ** 63 - 1)
+
+    def toTree(self):
+        '''
+        Builds a RedBlackTree holding every ticket in the snapshot. The scan
+        is already sorted, so this is a linear bulk load.
+        '''
+        return RedBlackTree.from_tickets(self)
@@ -0,0 +1,52 @@
+'''
+Tests for btree.py. Run with pytest from this directory.
+'''
+import random
+from btree import *
+
+
+def ticket(ticketID):
+    '''
+    Returns a one item mealticket with the given ID
+    '''
+    return MealTicket.fromFields(ticketID, 'Meal', [("Item 1", 1.0)], 1.0)
+
+
+def test_insert_delete_and_scans():
+    rng = random.Random(0)
+    ticketIDs = rng.sample(range(10000), 2000)
+    tree = BPlusTree(fanout=4)
+    for ticketID in ticketIDs:
+        assert tree.insert(ticket(ticketID))
+    assert not tree.insert(ticket(ticketIDs[0]))
+    assert tree.size == 2000
+    assert tree.height() > 2
+    for ticketID in ticketIDs[::2]:
+        assert tree.delete(ticketID)
+    assert not tree.delete(ticketIDs[0])
+    left = sorted(ticketIDs[1::2])
+    assert tree.size == len(left)
+    assert [t.ticketID for t in tree] == left
+    assert [t.ticketID for t in reversed(tree)] == left[::-1]
+    assert [ticketID for ticketID, t in tree.items()] == left
+    assert tree.find(left[5]).ticketID == left[5]
+    assert not tree.find(ticketIDs[0])
+    inside = [i for i in left if 2500 <= i <= 7500]
+    assert [t.ticketID for t in tree.iter_range(2500, 7500)] == inside
+    assert ([t.ticketID for t in tree.iter_range(2500, 7500, reverse=True)]
+            == inside[::-1])
+    assert tree.count_range(2500, 7500) == len(inside)
+    assert tree.traverse('in-order') == ', '.join(str(i) for i in left)
+
+
+def test_bulk_insert_is_all_or_nothing():
+    tree = BPlusTree.from_tickets([ticket(i) for i in range(0, 100, 2)],
+                                  fanout=8)
+    assert [t.ticketID for t in tree] == list(range(0, 100, 2))
+    assert not BPlusTree.from_tickets([ticket(1), ticket(1)]).size
+    # One ticketID already in the tree fails the whole batch
+    assert not tree.bulk_insert([ticket(1), ticket(3), ticket(4)])
+    assert not tree.bulk_insert([ticket(1), ticket(3), ticket(1)])
+    assert tree.size == 50
+    assert tree.bulk_insert([ticket(i) for i in range(1, 100, 2)])
+    assert [t.ticketID for t in tree] == list(range(100))
@@ -0,0 +1,21 @@
+'''
+Tests for concurrenttree.py. Run with pytest from this directory.
+'''
+import threading
+from concurrenttree import *
+
+
+def test_abandoned_iterator_does_not_block_writers():
+    tree = ConcurrentRedBlackTree()
+    tree.bulk_insert(generateMealTickets(100, seed=0))
+    tickets = iter(tree)
+    next(tickets)
+    writer = threading.Thread(
+        target=tree.insert, args=(generateMealTickets(1, seed=1)[0],),
+        daemon=True)
+    writer.start()
+    writer.join(5)
+    assert not writer.is_alive()
+    assert tree.size == 101
+    # The iterator still sees the tree as it was when it was made
+    assert len(list(tickets)) == 99
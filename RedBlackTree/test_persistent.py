@@ -0,0 +1,58 @@
+'''
+Tests for persistent.py. Run with pytest from this directory.
+'''
+import random
+from persistent import *
+
+
+def ticket(ticketID, name='Meal'):
+    '''
+    Returns a one item mealticket with the given ID
+    '''
+    return MealTicket.fromFields(ticketID, name, [("Item 1", 1.0)], 1.0)
+
+
+def test_snapshots_keep_their_version():
+    tree = PersistentRedBlackTree()
+    rng = random.Random(0)
+    ticketIDs = [rng.randrange(200) for i in range(300)]
+    versions = []
+    for i, ticketID in enumerate(ticketIDs):
+        if i % 3 == 2:
+            tree.delete(ticketIDs[i // 2])
+        else:
+            tree.insert(ticket(ticketID))
+        versions.append((tree.snapshot(), [t.ticketID for t in tree]))
+    for version, ticketIDs in versions:
+        assert version.validate()
+        assert version.size == len(ticketIDs)
+        assert [t.ticketID for t in version] == ticketIDs
+    # Writing to a snapshot leaves the tree it came from alone
+    version, ticketIDs = versions[100]
+    version.insert(ticket(-1))
+    assert [t.ticketID for t in tree] == versions[-1][1]
+    assert [t.ticketID for t in version] == sorted(ticketIDs + [-1])
+
+
+def test_union_matches_redblacktree():
+    mine = [5] * 20 + [3, 7] * 10 + [5] * 20 + list(range(10, 60))
+    theirs = [5, 5, 7, 11, 11, 70]
+    expected = RedBlackTree()
+    persistent = PersistentRedBlackTree()
+    for ticketID in mine:
+        expected.insert(ticket(ticketID, 'mine'))
+        persistent.insert(ticket(ticketID, 'mine'))
+    before = persistent.snapshot()
+    expectedOther = RedBlackTree()
+    persistentOther = PersistentRedBlackTree()
+    for ticketID in theirs:
+        expectedOther.insert(ticket(ticketID, 'theirs'))
+        persistentOther.insert(ticket(ticketID, 'theirs'))
+    assert expected.union(expectedOther)
+    assert persistent.union(persistentOther)
+    assert persistent.validate()
+    assert persistentOther.size == 0
+    assert persistent.size == expected.size
+    assert ([(t.ticketID, t.TicketName) for t in persistent] ==
+            [(t.ticketID, t.TicketName) for t in expected])
+    assert [t.ticketID for t in before] == sorted(mine)
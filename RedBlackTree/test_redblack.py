@@ -0,0 +1,225 @@
+'''
+Tests for redblack.py. Run with pytest from this directory.
+'''
+import random
+from redblack import *
+
+
+def ticket(ticketID):
+    '''
+    Returns a one item mealticket with the given ID
+    '''
+    return MealTicket.fromFields(ticketID, 'Meal', [("Item 1", 1.0)], 1.0)
+
+
+def test_validate():
+    tree = RedBlackTree.from_tickets(generateMealTickets(500, seed=0))
+    assert tree.validate()
+    for k in range(100):
+        tree.delete(tree.select(1).ticketID)
+    assert tree.validate()
+    tree._root.key, tree._root.value = -1, ticket(-1)
+    assert not tree.validate()
+
+
+def test_validate_with_duplicate_keys():
+    tree = RedBlackTree()
+    # Runs of equal keys force rotations that move some of them left
+    for ticketID in [5] * 20 + [3, 7] * 10 + [5] * 20:
+        assert tree.insert(ticket(ticketID))
+    assert tree.validate()
+    tree.bulk_insert(ticket(ticketID) for ticketID in [1, 5, 5, 9, 9])
+    assert tree.validate()
+    assert tree.size == 65
+    assert tree.count_range(5, 5) == 42
+
+
+def test_delete_duplicate_keys():
+    tree = RedBlackTree()
+    ticketIDs = [5] * 20 + [3, 7] * 10 + [5] * 20
+    for ticketID in ticketIDs:
+        tree.insert(ticket(ticketID))
+    for left in range(len(ticketIDs) - 1, -1, -1):
+        assert tree.delete(5 if tree.find(5) else tree.select(1).ticketID)
+        assert tree.validate()
+        assert tree.size == left
+        assert sum(1 for t in tree) == left
+
+
+def tree_of(ticketIDs):
+    '''
+    Returns a tree holding one ticket per entry of ticketIDs
+    '''
+    tree = RedBlackTree()
+    for ticketID in ticketIDs:
+        tree.insert(ticket(ticketID))
+    return tree
+
+
+def test_split_join_delete_range():
+    tree = tree_of(range(1, 101))
+    less, more = tree.split(40)
+    assert tree.size == 0
+    assert less.validate() and more.validate()
+    assert [t.ticketID for t in less] == list(range(1, 40))
+    assert [t.ticketID for t in more] == list(range(40, 101))
+    assert not more.join(less)
+    assert less.join(more)
+    assert more.size == 0
+    assert less.validate()
+    assert [t.ticketID for t in less] == list(range(1, 101))
+    assert less.delete_range(20, 79) == 60
+    assert less.delete_range(20, 79) == 0
+    assert less.validate()
+    assert [t.ticketID for t in less] == (list(range(1, 20)) +
+                                          list(range(80, 101)))
+
+
+def test_union_and_difference_with_duplicate_keys():
+    mine = [5] * 20 + [3, 7] * 10 + [5] * 20 + list(range(10, 60))
+    # A few tickets are worked in one at a time, many force a rebuild
+    for theirs in ([5, 5, 7, 11, 11],
+                   [5] * 30 + [7, 8] * 20 + list(range(30, 230))):
+        tree, other = tree_of(mine), tree_of(theirs)
+        assert tree.union(other)
+        expected = sorted([i for i in mine if i not in theirs] + theirs)
+        assert tree.validate()
+        assert other.size == 0
+        assert tree.size == len(expected)
+        assert [t.ticketID for t in tree] == expected
+
+        tree, other = tree_of(mine), tree_of(theirs)
+        expected = [i for i in sorted(mine) if i not in theirs]
+        assert tree.difference(other) == len(mine) - len(expected)
+        assert tree.validate()
+        assert other.size == len(theirs)
+        assert tree.size == len(expected)
+        assert [t.ticketID for t in tree] == expected
+
+
+def test_from_tickets_and_bulk_insert():
+    rng = random.Random(0)
+    ticketIDs = list(range(1, 1001))
+    for batch in (ticketIDs, rng.sample(ticketIDs, len(ticketIDs))):
+        tree = RedBlackTree.from_tickets(ticket(i) for i in batch)
+        assert tree.validate()
+        assert tree.size == 1000
+        assert [t.ticketID for t in tree] == ticketIDs
+    # A few tickets are inserted one by one, a big batch is merged in
+    for extra in ([0, 500, 2000], list(range(1500, 3500))):
+        tree = RedBlackTree.from_tickets(ticket(i) for i in ticketIDs)
+        assert tree.bulk_insert(ticket(i) for i in reversed(extra))
+        assert tree.validate()
+        assert tree.size == 1000 + len(extra)
+        assert [t.ticketID for t in tree] == sorted(ticketIDs + extra)
+    assert not tree.bulk_insert([ticket(1), 'not a ticket'])
+    assert tree.size == 3000
+
+
+def test_order_statistics_and_range_totals():
+    rng = random.Random(1)
+    tree = RedBlackTree()
+    tickets = {}
+    for i in range(600):
+        ticketID = rng.randrange(1000)
+        if ticketID in tickets and i % 2:
+            assert tree.delete(ticketID)
+            del tickets[ticketID]
+        elif ticketID not in tickets:
+            cost = rng.randrange(1, 2000) / 100
+            tickets[ticketID] = cost
+            tree.insert(MealTicket.fromFields(ticketID, 'Meal',
+                                              [("Item 1", cost)], cost))
+    assert tree.validate()
+    ticketIDs = sorted(tickets)
+    for k, ticketID in enumerate(ticketIDs, 1):
+        assert tree.select(k).ticketID == ticketID
+        assert tree.rank(ticketID) == k
+    assert not tree.select(0) and not tree.select(len(ticketIDs) + 1)
+    for i in range(200):
+        lo, hi = sorted(rng.randrange(-10, 1010) for j in range(2))
+        inside = [t for t in ticketIDs if lo <= t <= hi]
+        assert tree.rank(hi) - tree.rank(lo - 1) == len(inside)
+        assert tree.count_range(lo, hi) == len(inside)
+        assert tree.sum_cost_range(lo, hi) == round(
+            sum(tickets[t] for t in inside), 2)
+    assert tree.count_range(10, 5) == 0
+
+
+def test_iteration_and_range_scans():
+    ticketIDs = list(range(0, 400, 2))
+    tree = RedBlackTree.from_tickets(ticket(i) for i in ticketIDs)
+    assert [t.ticketID for t in tree] == ticketIDs
+    assert [t.ticketID for t in reversed(tree)] == ticketIDs[::-1]
+    assert [ticketID for ticketID, t in tree.items()] == ticketIDs
+    # Two walks over the same tree do not get in each other's way
+    pairs = [(a.ticketID, b.ticketID) for a, b in zip(tree, reversed(tree))]
+    assert pairs == list(zip(ticketIDs, ticketIDs[::-1]))
+    for lo, hi in ((-5, 3), (11, 11), (10, 10), (101, 250), (390, 500),
+                   (30, 20)):
+        inside = [i for i in ticketIDs if lo <= i <= hi]
+        assert [t.ticketID for t in tree.iter_range(lo, hi)] == inside
+        assert ([t.ticketID for t in tree.iter_range(lo, hi, reverse=True)]
+                == inside[::-1])
+    assert tree.traverse('in-order') == ', '.join(str(i) for i in ticketIDs)
+    assert tree.traverse('sideways') == ''
+
+    def preorder(node):
+        if node.isSentinal():
+            return []
+        return ([node.key] + preorder(node.leftChild) +
+                preorder(node.rightChild))
+
+    def postorder(node):
+        if node.isSentinal():
+            return []
+        return (postorder(node.leftChild) + postorder(node.rightChild) +
+                [node.key])
+
+    assert tree.traverse('pre-order') == ', '.join(
+        str(i) for i in preorder(tree._root))
+    assert tree.traverse('post-order') == ', '.join(
+        str(i) for i in postorder(tree._root))
+    assert list(RedBlackTree()) == []
+    assert RedBlackTree().traverse('in-order') == ''
+
+
+def test_cache_stays_coherent():
+    rng = random.Random(2)
+    tree = RedBlackTree(cacheSize=16)
+    alive = set()
+    for i in range(2000):
+        ticketID = rng.randrange(100)
+        action = rng.random()
+        if action < 0.4:
+            tree.insert(ticket(ticketID))
+            alive.add(ticketID)
+        elif action < 0.6:
+            while tree.delete(ticketID):
+                pass
+            alive.discard(ticketID)
+        else:
+            found = tree.find(ticketID)
+            assert (found.ticketID if found else None) == (
+                ticketID if ticketID in alive else None)
+    assert len(tree._cache) <= 16
+    stats = tree.cacheStats()
+    assert stats['hits'] and stats['misses']
+    assert stats['hitRate'] == stats['hits'] / (stats['hits'] +
+                                                stats['misses'])
+
+
+def test_find_near():
+    tree = RedBlackTree.from_tickets(ticket(i) for i in range(0, 2000, 3))
+    for ticketID in list(range(0, 2000)) + list(range(1999, -5, -7)):
+        found = tree.findNear(ticketID)
+        if ticketID % 3 == 0 and ticketID >= 0:
+            assert found.ticketID == ticketID
+        else:
+            assert not found
+    # Deleting the node under the finger must not leave it dangling
+    tree.findNear(999)
+    assert tree.delete(999)
+    assert not tree.findNear(999)
+    assert tree.findNear(1002).ticketID == 1002
+    assert not RedBlackTree().findNear(1)
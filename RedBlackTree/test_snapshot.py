@@ -0,0 +1,62 @@
+'''
+Tests for snapshot.py. Run with pytest from this directory.
+'''
+import gc
+import os
+import warnings
+import pytest
+from snapshot import *
+
+
+def ticket(ticketID, name, cost):
+    '''
+    Returns a one item mealticket with the given ID
+    '''
+    return MealTicket.fromFields(ticketID, name, [("Item 1", cost)], cost)
+
+
+def test_append_replaces_older_copy(tmp_path):
+    path = str(tmp_path / 'tickets.snap')
+    writeSnapshot([ticket(i, 'old', 1.0) for i in range(1, 6)], path)
+    appendSnapshot([ticket(3, 'new', 2.5), ticket(9, 'new', 4.0)], path)
+    with TicketSnapshot(path) as snapshot:
+        assert len(snapshot) == 6
+        assert list(snapshot.ticketIDs()) == [1, 2, 3, 4, 5, 9]
+        tickets = list(snapshot)
+        assert [t.ticketID for t in tickets] == [1, 2, 3, 4, 5, 9]
+        assert tickets[2].TicketName == 'new'
+        assert tickets[2].totalCost == 2.5
+        assert [t.ticketID for t in snapshot.iter_range(3, 3)] == [3]
+        assert snapshot.find(3).TicketName == 'new'
+        tree = snapshot.toTree()
+        assert tree.validate()
+        assert [t.ticketID for t in tree] == [1, 2, 3, 4, 5, 9]
+        assert tree.find(3).TicketName == 'new'
+
+
+def test_append_after_torn_segment(tmp_path):
+    path = str(tmp_path / 'tickets.snap')
+    writeSnapshot([ticket(i, 'first', 1.0) for i in range(1, 4)], path)
+    appendSnapshot([ticket(4, 'second', 1.0)], path)
+    # Cut the second segment short, as a crash mid-append would
+    os.truncate(path, os.path.getsize(path) - 5)
+    appendSnapshot([ticket(5, 'third', 1.0)], path)
+    with TicketSnapshot(path) as snapshot:
+        assert list(snapshot.ticketIDs()) == [1, 2, 3, 5]
+        assert snapshot.find(5).TicketName == 'third'
+
+
+def test_files_too_short_for_a_header(tmp_path):
+    path = tmp_path / 'tickets.snap'
+    writeSnapshot([ticket(1, 'only', 1.0)], str(path))
+    whole = path.read_bytes()
+    for contents in (b'', whole[:3], b'x' * len(whole)):
+        path.write_bytes(contents)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            with pytest.raises(ValueError, match='not a ticket snapshot'):
+                TicketSnapshot(str(path))
+            gc.collect()
+        # A file left open would warn when it was collected
+        assert not [w for w in caught
+                    if issubclass(w.category, ResourceWarning)]
@@ -0,0 +1,26 @@
+'''
+Tests for ticketstore.py. Run with pytest from this directory.
+'''
+import pytest
+# ticketstore.py is built on NumPy
+pytest.importorskip("numpy")
+from ticketstore import *
+
+
+def test_totals_follow_appends():
+    tickets = generateMealTickets(50, seed=0)
+    store = MealTicketStore(capacity=4, itemCapacity=4)
+    for ticket in tickets:
+        view = store.add(ticket.TicketName, ticket.items)
+        assert view.totalCost == round(sum(c for n, c in ticket.items), 2)
+    assert store.total_cost().tolist() == [
+        round(sum(c for n, c in ticket.items), 2) for ticket in tickets]
+    assert store.total_cost().tolist() == store._computeTotals(0, 50).tolist()
+    chosen = store.filter(store.total_cost() > store.mean_cost())
+    assert chosen.total_cost().tolist() == [
+        view.totalCost for view in store if view.totalCost > store.mean_cost()]
+
+
+def test_views_have_no_dict():
+    store = MealTicketStore.from_tickets(generateMealTickets(3, seed=0))
+    assert not hasattr(store[0], '__dict__')
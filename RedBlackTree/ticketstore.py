@@ -0,0 +1,326 @@
+'''
+A columnar home for large numbers of meal tickets. Rather than one
+MealTicket object (with its own list of item tuples) per ticket, the store
+keeps every field in NumPy arrays, so totals, averages, histograms and
+filters over millions of tickets run as vectorized array operations. Code
+that needs ticket objects gets lightweight views instead, which can go
+straight into a RedBlackTree.
+
+Columns:
+    ids         int64, one per ticket
+    offsets     int64, one per ticket plus one; ticket i owns the items
+                offsets[i]:offsets[i + 1]
+    itemCosts   float64, one per item
+    itemCodes   int32, one per item, indexing into the itemNames vocabulary
+    totals      float64, one per ticket, its item costs summed to cents
+'''
+import numpy as np
+from mealticket import *
+
+
+class MealTicketView(MealTicket):
+    '''
+    A MealTicket that reads its fields out of a MealTicketStore instead of
+    holding them itself. It is just a store and an index (MealTicket's own
+    slots go unused and there is no __dict__), so a view costs a few dozen
+    bytes no matter how many items the ticket has.
+    '''
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        '''
+        Constructor for the MealTicketView class. Unlike MealTicket this
+        does not take an ID from the counter; the store already has one.
+        '''
+        self.store = store
+        self.index = index
+
+    @property
+    def ticketID(self):
+        return int(self.store._ids[self.index])
+
+    @property
+    def TicketName(self):
+        return self.store.names[self.index]
+
+    @property
+    def totalCost(self):
+        return float(self.store._totals[self.index])
+
+    @property
+    def items(self):
+        store = self.store
+        start = store._offsets[self.index]
+        stop = store._offsets[self.index + 1]
+        return [(store.itemNames[code], float(cost)) for code, cost in
+                zip(store.itemCodes[start:stop], store.itemCosts[start:stop])]
+
+    def addItem(self, item):
+        ''' Views are read-only: a ticket's items sit in one run of the
+        store's columns, which cannot grow in the middle. '''
+        print("Add items through the MealTicketStore, not a view")
+        return False
+
+
+class MealTicketStore(object):
+    '''
+    Columnar storage for meal tickets. Tickets are appended with add or
+    extend (which reserve IDs from MealTicket's counter in one step) or
+    copied in with from_tickets. Every ticket's total is worked out as it is
+    appended and kept in a column of its own, so reading totals never means
+    going back over the whole store.
+    '''
+
+    def __init__(self, capacity=1024, itemCapacity=4096):
+        '''
+        Builds an empty store with room for capacity tickets and
+        itemCapacity items before it has to grow
+        '''
+        self.count = 0
+        self.itemCount = 0
+        self.names = []
+        self.itemNames = []
+        self._itemCodeOf = {}
+        self._ids = np.empty(capacity, np.int64)
+        self._offsets = np.zeros(capacity + 1, np.int64)
+        self._itemCosts = np.empty(itemCapacity, np.float64)
+        self._itemCodes = np.empty(itemCapacity, np.int32)
+        self._totals = np.empty(capacity, np.float64)
+        self._sorted = True
+
+    @classmethod
+    def from_tickets(cls, tickets):
+        '''
+        Copies MealTickets into a new store, keeping their IDs
+        '''
+        tickets = list(tickets)
+        store = cls(max(len(tickets), 1))
+        itemCosts = []
+        itemNames = []
+        itemCounts = []
+        for ticket in tickets:
+            itemCounts.append(len(ticket.items))
+            for itemName, itemCost in ticket.items:
+                itemNames.append(itemName)
+                itemCosts.append(itemCost)
+        store.extend([ticket.TicketName for ticket in tickets], itemCounts,
+                     itemCosts, itemNames,
+                     [ticket.ticketID for ticket in tickets])
+        return store
+
+    @property
+    def ids(self):
+        return self._ids[:self.count]
+
+    @property
+    def offsets(self):
+        return self._offsets[:self.count + 1]
+
+    @property
+    def itemCosts(self):
+        return self._itemCosts[:self.itemCount]
+
+    @property
+    def itemCodes(self):
+        return self._itemCodes[:self.itemCount]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        '''
+        Returns a view of the ticket at position index
+        '''
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('ticket index out of range')
+        return MealTicketView(self, index)
+
+    def __iter__(self):
+        '''
+        Yields a view of every ticket in the order they were added
+        '''
+        for index in range(self.count):
+            yield MealTicketView(self, index)
+
+    def _reserve(self, tickets, items):
+        '''
+        Makes room for tickets more tickets and items more items, doubling
+        the columns as needed so appends stay amortized O(1)
+        '''
+        needed = self.count + tickets
+        if needed > len(self._ids):
+            size = max(needed, 2 * len(self._ids))
+            self._ids = np.resize(self._ids, size)
+            self._offsets = np.resize(self._offsets, size + 1)
+            self._totals = np.resize(self._totals, size)
+        needed = self.itemCount + items
+        if needed > len(self._itemCosts):
+            size = max(needed, 2 * len(self._itemCosts))
+            self._itemCosts = np.resize(self._itemCosts, size)
+            self._itemCodes = np.resize(self._itemCodes, size)
+
+    def _encode(self, itemNames):
+        '''
+        Returns the vocabulary codes of itemNames, adding new names
+        '''
+        codes = np.empty(len(itemNames), np.int32)
+        codeOf = self._itemCodeOf
+        for position, itemName in enumerate(itemNames):
+            code = codeOf.get(itemName)
+            if code is None:
+                code = codeOf[itemName] = len(self.itemNames)
+                self.itemNames.append(itemName)
+            codes[position] = code
+        return codes
+
+    def add(self, ticketName, items=()):
+        '''
+        Appends one ticket with the given (name, cost) items and returns a
+        view of it
+        '''
+        items = list(items)
+        self.extend([ticketName], [len(items)], [item[1] for item in items],
+                    [item[0] for item in items])
+        return MealTicketView(self, self.count - 1)
+
+    def extend(self, ticketNames, itemCounts, itemCosts, itemNames,
+               ticketIDs=None):
+        '''
+        Appends a batch of tickets. itemCounts says how many of the flat
+        itemCosts/itemNames belong to each ticket. Without ticketIDs a block
+        of IDs is reserved from MealTicket's counter.
+        '''
+        ticketCount = len(ticketNames)
+        itemCounts = np.asarray(itemCounts, np.int64)
+        itemCosts = np.asarray(itemCosts, np.float64)
+        if len(itemCounts) != ticketCount or itemCounts.sum() != len(itemCosts):
+            raise ValueError('itemCounts does not match the batch')
+        if ticketIDs is None:
+            ticketIDs = np.arange(MealTicket.ID, MealTicket.ID + ticketCount,
+                                  dtype=np.int64)
+        else:
+            ticketIDs = np.asarray(ticketIDs, np.int64)
+        if ticketCount:
+            MealTicket.ID = max(MealTicket.ID, int(ticketIDs.max()) + 1)
+        self._reserve(ticketCount, len(itemCosts))
+        start = self.count
+        stop = start + ticketCount
+        itemStart = self.itemCount
+        itemStop = itemStart + len(itemCosts)
+        if ticketCount and (np.any(ticketIDs[1:] < ticketIDs[:-1]) or
+                            (start and ticketIDs[0] < self._ids[start - 1])):
+            self._sorted = False
+        self._ids[start:stop] = ticketIDs
+        self._offsets[start + 1:stop + 1] = itemStart + np.cumsum(itemCounts)
+        self._itemCosts[itemStart:itemStop] = itemCosts
+        self._itemCodes[itemStart:itemStop] = self._encode(itemNames)
+        self._totals[start:stop] = self._computeTotals(start, stop)
+        self.names.extend(ticketNames)
+        self.count = stop
+        self.itemCount = itemStop
+        return True
+
+    def indexOf(self, ticketID):
+        '''
+        Returns the position of the ticket with ticketID, or -1
+        '''
+        if self._sorted:
+            index = int(np.searchsorted(self.ids, ticketID))
+            if index < self.count and self._ids[index] == ticketID:
+                return index
+            return -1
+        matches = np.flatnonzero(self.ids == ticketID)
+        return int(matches[0]) if len(matches) else -1
+
+    def find(self, ticketID):
+        '''
+        Returns a view of the ticket with ticketID if it exists, otherwise
+        returns false
+        '''
+        index = self.indexOf(ticketID)
+        return MealTicketView(self, index) if index >= 0 else False
+
+    def _computeTotals(self, start, stop):
+        '''
+        Sums the item costs of the tickets at positions start:stop, rounded
+        to cents like MealTicket.addItem does, touching only their items
+        '''
+        offsets = self._offsets[start:stop + 1]
+        owners = np.repeat(np.arange(stop - start), np.diff(offsets))
+        totals = np.bincount(owners,
+                             weights=self._itemCosts[offsets[0]:offsets[-1]],
+                             minlength=stop - start)
+        return np.round(totals, 2)
+
+    def total_cost(self):
+        '''
+        Returns every ticket's total cost, rounded to cents like
+        MealTicket.addItem does
+        '''
+        return self._totals[:self.count]
+
+    def sum_cost(self):
+        '''
+        Returns the summed cost of every ticket
+        '''
+        return round(float(self.total_cost().sum()), 2)
+
+    def mean_cost(self):
+        '''
+        Returns the average ticket cost, or 0 for an empty store
+        '''
+        return float(self.total_cost().mean()) if self.count else 0.0
+
+    def cost_histogram(self, bins=10, range=None):
+        '''
+        Returns (counts, edges) of ticket totals, as numpy.histogram does
+        '''
+        return np.histogram(self.total_cost(), bins=bins, range=range)
+
+    def group_items(self, how='sum'):
+        '''
+        Aggregates item costs by item name. how is 'sum', 'mean' or 'count'.
+        Returns a dict of item name to value.
+        '''
+        width = len(self.itemNames)
+        counts = np.bincount(self.itemCodes, minlength=width)
+        if how == 'count':
+            values = counts
+        else:
+            values = np.bincount(self.itemCodes, weights=self.itemCosts,
+                                 minlength=width)
+            if how == 'mean':
+                values = values / np.maximum(counts, 1)
+            elif how != 'sum':
+                raise ValueError("how must be 'sum', 'mean' or 'count'")
+        return {name: values[code].item()
+                for code, name in enumerate(self.itemNames) if counts[code]}
+
+    def filter(self, mask):
+        '''
+        Returns a new store holding the tickets where mask (a boolean array
+        with one entry per ticket) is true, e.g.
+
+            store.filter(store.total_cost() > 50)
+        '''
+        mask = np.asarray(mask, bool)
+        chosen = np.flatnonzero(mask)
+        itemCounts = np.diff(self.offsets)[chosen]
+        itemMask = np.repeat(mask, np.diff(self.offsets))
+        store = MealTicketStore(max(len(chosen), 1),
+                                max(int(itemCounts.sum()), 1))
+        # Share the vocabulary so item codes can be copied as they are
+        store.itemNames = list(self.itemNames)
+        store._itemCodeOf = dict(self._itemCodeOf)
+        store.count = len(chosen)
+        store.itemCount = int(itemCounts.sum())
+        store._ids[:store.count] = self.ids[chosen]
+        store._offsets[1:store.count + 1] = np.cumsum(itemCounts)
+        store._itemCosts[:store.itemCount] = self.itemCosts[itemMask]
+        store._itemCodes[:store.itemCount] = self.itemCodes[itemMask]
+        store._totals[:store.count] = self.total_cost()[chosen]
+        store.names = [self.names[index] for index in chosen]
+        store._sorted = self._sorted
+        return store
@@ -0,0 +1,200 @@
+'''
+Sorting files that do not fit in memory. The input is read a chunk at a
+time, each chunk is sorted in memory with quick_sort and written out as a
+sorted run, and the runs are then streamed through a k-way heap merge into
+the output. With more runs than the fan-in allows, runs are merged into
+longer runs first, so no more than fan_in files are ever open at once.
+
+Two kinds of input are understood:
+    'binary'   fixed-size numbers, as written by array.tofile (typecode
+               says which kind)
+    'lines'    newline separated records, compared as bytes (or by key)
+
+Like quick_sort the output is in descending order unless reverse is set.
+'''
+import heapq
+import mmap
+import os
+import tempfile
+from array import array
+from quick_sort import *
+
+# Roughly what a line costs in memory beyond its own bytes: the bytes
+# object header, its slot in the list and its share of the sort.
+LINE_OVERHEAD = 80
+
+
+def external_sort(input_path, output_path, mode='binary', typecode='d',
+                  memory_budget=64 * 2 ** 20, fan_in=16, key=None,
+                  reverse=False, use_mmap=False, temp_dir=None):
+    '''
+    Sorts the records in input_path into output_path, holding about
+    memory_budget bytes of records at a time. Runs are read back through
+    buffered reads, or through mmap if use_mmap is set. Returns the number
+    of records sorted.
+    '''
+    if mode not in ('binary', 'lines'):
+        raise ValueError("mode must be 'binary' or 'lines'")
+    if fan_in < 2:
+        raise ValueError('fan_in must be at least 2')
+    itemsize = array(typecode).itemsize
+    with tempfile.TemporaryDirectory(dir=temp_dir) as directory:
+        if mode == 'binary':
+            # quick_sort's NumPy backend needs about three more copies of
+            # a chunk while partitioning it.
+            chunks = _binary_chunks(input_path, typecode,
+                                    max(memory_budget // (4 * itemsize), 1))
+        else:
+            chunks = _line_chunks(input_path, max(memory_budget // 2, 1))
+        runs = []
+        count = 0
+        for chunk in chunks:
+            quick_sort(chunk, key=key, reverse=reverse)
+            count += len(chunk)
+            path = os.path.join(directory, 'run{}'.format(len(runs)))
+            _write_run(path, chunk, mode)
+            runs.append(path)
+            del chunk
+        # Half the budget is spread over the read buffers of the runs being
+        # merged and the output's write buffer.
+        buffer_bytes = max(memory_budget // (2 * (fan_in + 1)), 4096)
+        passes = 0
+        while len(runs) > fan_in:
+            merged = []
+            for start in range(0, len(runs), fan_in):
+                group = runs[start:start + fan_in]
+                path = os.path.join(directory, 'pass{}-{}'.format(
+                    passes, len(merged)))
+                _merge(group, path, mode, typecode, buffer_bytes, key,
+                       reverse, use_mmap)
+                for run in group:
+                    os.remove(run)
+                merged.append(path)
+            runs = merged
+            passes += 1
+        _merge(runs, output_path, mode, typecode, buffer_bytes, key, reverse,
+               use_mmap)
+    return count
+
+
+def _binary_chunks(path, typecode, items):
+    '''
+    Yields the numbers in path as arrays of up to items numbers
+    '''
+    itemsize = array(typecode).itemsize
+    if os.path.getsize(path) % itemsize:
+        raise ValueError('{} is not a whole number of {!r} records'.format(
+            path, typecode))
+    with open(path, 'rb') as f:
+        while True:
+            chunk = array(typecode)
+            try:
+                chunk.fromfile(f, items)
+            except EOFError:
+                # fromfile still keeps whatever was left
+                pass
+            if not chunk:
+                return
+            yield chunk
+
+
+def _line_chunks(path, budget):
+    '''
+    Yields the lines of path as lists holding about budget bytes each. A
+    last line without a newline gets one, so the runs stay line aligned.
+    '''
+    with open(path, 'rb') as f:
+        chunk = []
+        used = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                line += b'\n'
+            chunk.append(line)
+            used += len(line) + LINE_OVERHEAD
+            if used >= budget:
+                yield chunk
+                chunk = []
+                used = 0
+        if chunk:
+            yield chunk
+
+
+def _write_run(path, chunk, mode):
+    '''
+    Writes one sorted chunk to path
+    '''
+    with open(path, 'wb') as f:
+        if mode == 'binary':
+            chunk.tofile(f)
+        else:
+            f.writelines(chunk)
+
+
+def _read_binary(path, typecode, buffer_bytes, use_mmap):
+    '''
+    Yields the numbers stored in path, buffer_bytes worth at a time
+    '''
+    if use_mmap:
+        if not os.path.getsize(path):
+            return
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped).cast(typecode)
+            try:
+                for value in view:
+                    yield value
+            finally:
+                view.release()
+                mapped.close()
+        return
+    items = max(buffer_bytes // array(typecode).itemsize, 1)
+    for chunk in _binary_chunks(path, typecode, items):
+        for value in chunk:
+            yield value
+
+
+def _read_lines(path, buffer_bytes, use_mmap):
+    '''
+    Yields the lines stored in path
+    '''
+    if use_mmap:
+        if not os.path.getsize(path):
+            return
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for line in iter(mapped.readline, b''):
+                    yield line
+            finally:
+                mapped.close()
+        return
+    with open(path, 'rb', buffering=buffer_bytes) as f:
+        for line in f:
+            yield line
+
+
+def _merge(runs, output_path, mode, typecode, buffer_bytes, key, reverse,
+           use_mmap):
+    '''
+    Streams the sorted runs into output_path with a k-way heap merge
+    '''
+    if mode == 'binary':
+        readers = [_read_binary(run, typecode, buffer_bytes, use_mmap)
+                   for run in runs]
+    else:
+        readers = [_read_lines(run, buffer_bytes, use_mmap) for run in runs]
+    # heapq.merge's reverse means the inputs are in descending order, which
+    # is what ours are unless we were asked for ascending.
+    merged = heapq.merge(*readers, key=key, reverse=not reverse)
+    with open(output_path, 'wb', buffering=buffer_bytes) as f:
+        if mode == 'lines':
+            f.writelines(merged)
+            return
+        items = max(buffer_bytes // array(typecode).itemsize, 1)
+        pending = array(typecode)
+        for value in merged:
+            pending.append(value)
+            if len(pending) >= items:
+                pending.tofile(f)
+                pending = array(typecode)
+        pending.tofile(f)
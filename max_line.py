@@ -1,22 +1,468 @@
 """
 You can characterize each line by the m and b in y = mx + b. Do this for each
 pair of lines, and see which ones pops up the most.
+
+Floating point slopes and intercepts do not make good keys though: a
+vertical line has no slope at all, and rounding can split one line into two
+or merge two into one. Instead we take each point in turn as an anchor and
+only count the lines through it, keyed by the direction to every later
+point as a reduced integer fraction. Any two points on a line through the
+anchor reduce to the same fraction, so that key is exact, and since the
+anchor is fixed there is no intercept to compare at all.
+
+For big point clouds best_line does the same thing with NumPy, a whole
+anchor at a time, and spreads the anchors over a pool of processes.
+LineCounter keeps the answer up to date as points arrive one by one, and
+approximate_best_line samples lines at random (RANSAC) when a line only
+has to be found if it holds some fraction of the points.
 """
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from fractions import Fraction
+from math import ceil, gcd, lcm, log, log1p
+from multiprocessing import shared_memory
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Below this many points it is not worth starting a pool at all
+PARALLEL_THRESHOLD = 2000
+# Anchors with fewer later points than this are faster in plain Python
+# than through a dozen NumPy calls
+NUMPY_MIN_POINTS = 64
+# Aim for a few batches of anchors per worker. The early anchors have the
+# most points after them, so equal batches are not equal work.
+TASKS_PER_WORKER = 8
+# Coordinates have to stay this small for their differences to fit NumPy's
+# int64, otherwise best_line falls back on Python ints
+INT64_LIMIT = 2 ** 62
+# Anchor indexes take the low bits of a shared score (see _score)
+ANCHOR_BITS = 32
 
 def max_points(points):
-    lines = set()
-    lines_frequency = {}
-    for index, point in enumerate(points):
-        other_points = points[index + 1:]
-        print(other_points)
-        for other_point in other_points:
-            slope = (point[1] - other_point[1])/(point[0] - other_point[0])
-            y_intercept = point[1] - (slope * point[0])
-            if (slope, y_intercept) in lines:
-                lines_frequency[(slope, y_intercept)] += 1
-            else:
-                lines_frequency[(slope, y_intercept)] = 1
-            lines.add((slope, y_intercept))
-    return max(lines_frequency.values())
-
-print(max_points([[1,1],[2,2],[3,3],[7,2]]))
+    """
+    Returns the largest number of the given points that lie on one straight
+    line. Points are (x, y) pairs of ints, or of anything Fraction accepts
+    (floats, Fractions, Decimals), and repeated points all count.
+    """
+    points = _integer_points(points)
+    return _scan(points, 0, len(points), min(len(points), 1))[0]
+
+def _scan(points, start, stop, best):
+    """
+    Counts the lines through each anchor points[start:stop] and the points
+    after it. Returns the most points found on one line, if more than best,
+    along with the anchor it goes through (otherwise best and None).
+    """
+    count = len(points)
+    anchor = None
+    for index in range(start, stop):
+        # Any line through this anchor and an earlier point was already
+        # counted from that earlier point, so only later points matter,
+        # and once there are too few of them left to beat best we are done.
+        if count - index <= best:
+            break
+        on_line = _count_through(points, index)[0]
+        if on_line > best:
+            best = on_line
+            anchor = index
+    return best, anchor
+
+def _count_through(points, index):
+    """
+    Returns the most points on one line through points[index] and the
+    points after it, and that line's direction (None if every one of them
+    is a duplicate of the anchor)
+    """
+    x, y = points[index]
+    duplicates = 1
+    slopes = {}
+    for other_x, other_y in points[index + 1:]:
+        dx = other_x - x
+        dy = other_y - y
+        if dx == 0:
+            if dy == 0:
+                duplicates += 1
+                continue
+            # Every vertical direction reduces to the same key
+            slope = (0, 1)
+        else:
+            divisor = gcd(dx, dy)
+            if dx < 0:
+                divisor = -divisor
+            slope = (dx // divisor, dy // divisor)
+        slopes[slope] = slopes.get(slope, 0) + 1
+    if not slopes:
+        return duplicates, None
+    # Duplicates of the anchor lie on every line through it
+    slope = max(slopes, key=slopes.get)
+    return duplicates + slopes[slope], slope
+
+def _integer_points(points):
+    """
+    Returns points as a list of (x, y) tuples of ints. Anything else is
+    converted to an exact Fraction and every coordinate scaled by the lowest
+    common denominator, which moves points but keeps straight lines straight.
+    """
+    points = [(x, y) for x, y in points]
+    if all(type(x) is int and type(y) is int for x, y in points):
+        return points
+    exact = [(Fraction(x), Fraction(y)) for x, y in points]
+    scale = 1
+    for x, y in exact:
+        scale = lcm(scale, x.denominator, y.denominator)
+    return [(int(x * scale), int(y * scale)) for x, y in exact]
+
+def best_line(points, workers=None):
+    """
+    Returns the largest number of the given points that lie on one straight
+    line, like max_points, along with those points themselves in the order
+    they were given. With NumPy installed each anchor is counted in a
+    handful of array operations, and with more than one worker (by default
+    one per core) the anchors are shared out over a pool of processes.
+    """
+    given = list(points)
+    points = _integer_points(given)
+    count = len(points)
+    if count == 0:
+        return 0, []
+    workers = workers or os.cpu_count() or 1
+    usable = numpy is not None and all(
+        -INT64_LIMIT < x < INT64_LIMIT and -INT64_LIMIT < y < INT64_LIMIT
+        for x, y in points)
+    if not usable:
+        best, anchor = _scan(points, 0, count, 0)
+    elif workers == 1 or count < PARALLEL_THRESHOLD:
+        best, anchor = _scan_numpy(numpy.array(points, dtype=numpy.int64),
+                                   0, count, 0)
+    else:
+        best, anchor = _scan_parallel(points, workers)
+    # Only the anchor comes back from the scan; going over its points once
+    # more in Python tells us which line it was.
+    x, y = points[anchor]
+    slope = _count_through(points, anchor)[1]
+    on_line = [given[anchor]]
+    for index in range(anchor + 1, count):
+        dx = points[index][0] - x
+        dy = points[index][1] - y
+        if (dx == 0 and dy == 0) or (
+                slope is not None and dx * slope[1] == dy * slope[0]):
+            on_line.append(given[index])
+    return best, on_line
+
+def _score(count, anchor):
+    """
+    Packs a count and the anchor it was found at into one int that is
+    bigger for more points and, between equal counts, for the earlier
+    anchor, which is the one _scan keeps. Being a single int64 it can be
+    shared between workers without the two halves getting out of step.
+    """
+    return (count << ANCHOR_BITS) | ((1 << ANCHOR_BITS) - 1 - anchor)
+
+def _scan_numpy(coordinates, start, stop, best, shared=None):
+    """
+    _scan over an (n, 2) int64 array of points, counting each anchor's
+    directions as whole arrays. If shared is given, its first slot holds
+    the _score of the best line any worker has found so far, which lets
+    every worker skip anchors nobody needs any more. An anchor that only
+    ties it is still counted if it comes earlier, so the answer is the
+    same however the anchors were shared out.
+    """
+    count = len(coordinates)
+    xs = coordinates[:, 0]
+    ys = coordinates[:, 1]
+    width = int(xs.max() - xs.min())
+    height = int(ys.max() - ys.min())
+    # Directions this short can be compared by cross product without
+    # overflowing an int64
+    crossable = max(width, height) < 2 ** 31
+    # top scores the best line so far, which other workers' finds may
+    # raise; found and anchor are only ever our own
+    found = best
+    anchor = None
+    top = _score(best, count)
+    for index in range(start, stop):
+        if shared is not None and shared[0] > top:
+            top = int(shared[0])
+        # Later anchors have fewer points after them, so none can win now
+        if _score(count - index, index) <= top:
+            break
+        if count - index - 1 < NUMPY_MIN_POINTS:
+            on_line = _count_through(coordinates[index:].tolist(), 0)[0]
+        else:
+            dx = xs[index + 1:] - xs[index]
+            dy = ys[index + 1:] - ys[index]
+            duplicate = (dx == 0) & (dy == 0)
+            duplicates = int(duplicate.sum())
+            if duplicates:
+                dx = dx[~duplicate]
+                dy = dy[~duplicate]
+            on_line = duplicates + 1
+            if len(dx):
+                on_line += (crossable and _count_quotients(dx, dy)) or \
+                    _count_reduced(dx, dy, width, height)
+        if _score(on_line, index) > top:
+            found = on_line
+            anchor = index
+            top = _score(on_line, index)
+            # Another worker may raise it between our read and write; that
+            # only costs some skipping, the answer comes from the results.
+            if shared is not None and shared[0] < top:
+                shared[0] = top
+    return found, anchor
+
+def _count_quotients(dx, dy):
+    """
+    Returns how many of the directions (dx, dy) share the most common
+    slope, keyed by the float dy / dx, which is about ten times quicker
+    than reducing them by their gcd. Equal slopes always divide out to the
+    same float, but different ones can round to it too, so the winning
+    group is checked exactly; if it turns out to be mixed this returns 0.
+    """
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        quotients = dy / dx
+    quotients[dx == 0] = numpy.inf
+    values, counts = numpy.unique(quotients, return_counts=True)
+    winner = counts.argmax()
+    members = quotients == values[winner]
+    group_dx = dx[members]
+    group_dy = dy[members]
+    # Every slope's own count is at most its float's, so if the biggest
+    # float group is all one slope, no slope has more
+    if (group_dx * group_dy[0] == group_dy * group_dx[0]).all():
+        return int(counts[winner])
+    return 0
+
+def _count_reduced(dx, dy, width, height):
+    """
+    Returns how many of the directions (dx, dy) share the most common
+    slope, keyed by the directions reduced by their gcd
+    """
+    divisor = numpy.gcd(dx, dy)
+    divisor[(dx < 0) | ((dx == 0) & (dy < 0))] *= -1
+    dx = dx // divisor
+    dy = dy // divisor
+    # dx is never negative once normalised and dy is within the height, so
+    # each direction packs into one int64, as long as that fits
+    if (width + 1) * (2 * height + 1) < 2 ** 63:
+        counts = numpy.unique(dx * (2 * height + 1) + dy + height,
+                              return_counts=True)[1]
+    else:
+        counts = numpy.unique(numpy.stack((dx, dy), axis=1), axis=0,
+                              return_counts=True)[1]
+    return int(counts.max())
+
+def _scan_shared(name, count, start, stop):
+    """
+    Worker: runs _scan_numpy over anchors start..stop - 1 of the points in
+    the shared memory block name
+    """
+    memory = shared_memory.SharedMemory(name=name)
+    block = numpy.ndarray((2 * count + 1,), dtype=numpy.int64,
+                          buffer=memory.buf)
+    try:
+        return _scan_numpy(block[1:].reshape(count, 2), start, stop, 0,
+                           block)
+    finally:
+        # The buffer cannot be closed while an array still points into it
+        del block
+        memory.close()
+
+def _scan_parallel(points, workers):
+    """
+    Copies the points into shared memory and scans batches of anchors on a
+    pool of workers, largest batches of work first. Batches that start too
+    late to beat the best line so far are never handed out.
+    """
+    count = len(points)
+    memory = shared_memory.SharedMemory(create=True, size=(2 * count + 1) * 8)
+    block = None
+    try:
+        block = numpy.ndarray((2 * count + 1,), dtype=numpy.int64,
+                              buffer=memory.buf)
+        block[0] = _score(1, 0)
+        block[1:] = numpy.array(points, dtype=numpy.int64).ravel()
+        batch = max(count // (workers * TASKS_PER_WORKER), 1)
+        best, anchor = 1, 0
+        with ProcessPoolExecutor(workers) as pool:
+            pending = set()
+            for start in range(0, count, batch):
+                if _score(count - start, start) <= int(block[0]):
+                    break
+                # Keep the queue short so later batches see a fresh best
+                while len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    best, anchor = _better(done, best, anchor)
+                pending.add(pool.submit(_scan_shared, memory.name, count,
+                                        start, min(start + batch, count)))
+            best, anchor = _better(wait(pending).done, best, anchor)
+    finally:
+        # The view has to go before close(), or close() raises BufferError
+        # over whatever error got us here
+        del block
+        memory.close()
+        memory.unlink()
+    return best, anchor
+
+def _better(futures, best, anchor):
+    """
+    Returns the best (count, anchor) out of finished scans and the current
+    one, preferring the earlier anchor on a tie
+    """
+    for future in futures:
+        found, found_anchor = future.result()
+        if found_anchor is not None and (found > best or (
+                found == best and found_anchor < anchor)):
+            best, anchor = found, found_anchor
+    return best, anchor
+
+class LineCounter(object):
+    """
+    Keeps count of the points on every line through two or more of the
+    points added so far, and of the most points on any one line. Adding a
+    point is O(n) in the points already added, though all those lines take
+    O(n^2) memory.
+    """
+
+    def __init__(self, points=()):
+        # How many times each distinct point was added
+        self.points = {}
+        # Points on each line, keyed as by _line_key
+        self.lines = {}
+        self.best = 0
+        # The line holding best points, or None while every point added so
+        # far is the same one
+        self.line = None
+        for point in points:
+            self.add_point(point)
+
+    def add_point(self, point):
+        """
+        Adds a point, an (x, y) pair as for max_points, and returns the new
+        most points on one line
+        """
+        point = tuple(value if type(value) is int else Fraction(value)
+                      for value in point)
+        copies = self.points.get(point, 0)
+        touched = set()
+        for other, other_copies in self.points.items():
+            if other == point:
+                continue
+            line = _line_key(point, other)
+            # Any further points on this line were counted the first time
+            if line in touched:
+                continue
+            touched.add(line)
+            # A line through just the new point and this one is not in
+            # lines yet; one through any other points already is
+            on_line = self.lines.get(line, other_copies + copies) + 1
+            self.lines[line] = on_line
+            if on_line > self.best:
+                self.best = on_line
+                self.line = line
+        self.points[point] = copies + 1
+        if copies + 1 > self.best:
+            self.best = copies + 1
+            self.line = None
+        return self.best
+
+    def __len__(self):
+        return sum(self.points.values())
+
+def _line_key(first, second):
+    """
+    Returns the line through two different points as the integers (a, b, c)
+    with a*x + b*y = c that have no common factor, a positive (or a zero and
+    b positive)
+    """
+    (x1, y1), (x2, y2) = first, second
+    a = y2 - y1
+    b = x1 - x2
+    c = a * x1 + b * y1
+    if not (type(a) is int and type(b) is int and type(c) is int):
+        a, b, c = Fraction(a), Fraction(b), Fraction(c)
+        scale = lcm(a.denominator, b.denominator, c.denominator)
+        a, b, c = int(a * scale), int(b * scale), int(c * scale)
+    divisor = gcd(a, b, c)
+    if a < 0 or (a == 0 and b < 0):
+        divisor = -divisor
+    return (a // divisor, b // divisor, c // divisor)
+
+def approximate_best_line(points, epsilon, failure=0.01, seed=None):
+    """
+    Looks for the line through the most points by RANSAC: again and again,
+    take the line through two points picked at random and count the points
+    on it. A line holding at least an epsilon fraction of the points is
+    found unless we are unlucky, which happens with probability at most
+    failure, in about log(1 / failure) / epsilon**2 tries of O(n) each.
+    Returns the count and points like best_line does. The count can fall
+    short of the true best when no line is that big, and a try that picks
+    two copies of one point only counts the copies.
+    """
+    if not 0 < epsilon <= 1:
+        raise ValueError('epsilon must be in (0, 1]')
+    if not 0 < failure < 1:
+        raise ValueError('failure must be in (0, 1)')
+    given = list(points)
+    points = _integer_points(given)
+    count = len(points)
+    if count < 3:
+        return best_line(given, 1)
+    # The chance that both points of one try land on a line holding
+    # epsilon of them, and how many tries make missing it that unlikely
+    needed = max(ceil(epsilon * count), 2)
+    chance = needed * (needed - 1) / (count * (count - 1))
+    tries = ceil(log(failure) / log1p(-chance)) if chance < 1 else 1
+    # Past that many tries the exact scan, n / 2 points an anchor on
+    # average, does no more work
+    if tries >= count // 2:
+        return best_line(given, 1)
+    on_line = _on_line_counter(points)
+    rng = random.Random(seed)
+    best, pair = 0, None
+    for attempt in range(tries):
+        first, second = rng.sample(range(count), 2)
+        found = on_line(first, second)
+        if found > best:
+            best, pair = found, (first, second)
+    (x1, y1), (x2, y2) = points[pair[0]], points[pair[1]]
+    if (x1, y1) == (x2, y2):
+        return best, [given[index] for index in range(count)
+                      if points[index] == (x1, y1)]
+    return best, [given[index] for index, (x, y) in enumerate(points)
+                  if (x - x1) * (y2 - y1) == (y - y1) * (x2 - x1)]
+
+def _on_line_counter(points):
+    """
+    Returns a function that counts the points on the line through
+    points[first] and points[second], or the copies of that point if the
+    two are the same. It uses NumPy when the cross products fit an int64.
+    """
+    xs = [x for x, y in points]
+    ys = [y for x, y in points]
+    if numpy is None or max(max(xs) - min(xs), max(ys) - min(ys)) >= 2 ** 31:
+        def count_on_line(first, second):
+            (x1, y1), (x2, y2) = points[first], points[second]
+            if (x1, y1) == (x2, y2):
+                return points.count((x1, y1))
+            dx = x2 - x1
+            dy = y2 - y1
+            return sum(1 for x, y in points if (x - x1) * dy == (y - y1) * dx)
+        return count_on_line
+    xs = numpy.array(xs, dtype=numpy.int64)
+    ys = numpy.array(ys, dtype=numpy.int64)
+
+    def count_on_line(first, second):
+        x1, y1, x2, y2 = xs[first], ys[first], xs[second], ys[second]
+        if x1 == x2 and y1 == y2:
+            return int(numpy.count_nonzero((xs == x1) & (ys == y1)))
+        return int(numpy.count_nonzero(
+            (xs - x1) * (y2 - y1) == (ys - y1) * (x2 - x1)))
+    return count_on_line
+
+
+if __name__ == '__main__':
+    print(max_points([[1,1],[2,2],[3,3],[7,2]]))
+    print(best_line([[1,1],[2,2],[3,3],[7,2]]))
@@ -0,0 +1,146 @@
+'''
+Benchmarks for max_line.py. Run with the name of a benchmark and an
+optional number of points, e.g.
+
+    python max_line_benchmark.py exact 10000
+'''
+import os
+import random
+import sys
+import time
+from max_line import *
+
+
+def timed(function, *args):
+    '''
+    Returns how many seconds function(*args) took to run.
+    '''
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def legacyMaxPoints(points):
+    '''
+    The float (slope, intercept) version max_points replaced, without its
+    print. It counts pairs rather than points and divides by zero on a
+    vertical line, so it only gets inputs with distinct x coordinates.
+    '''
+    lines_frequency = {}
+    for index, point in enumerate(points):
+        for other_point in points[index + 1:]:
+            slope = (point[1] - other_point[1])/(point[0] - other_point[0])
+            y_intercept = point[1] - (slope * point[0])
+            lines_frequency[(slope, y_intercept)] = lines_frequency.get(
+                (slope, y_intercept), 0) + 1
+    return max(lines_frequency.values())
+
+
+def plantedLine(size, rng, share=0.1):
+    '''
+    Returns size random integer points, a share of which lie on one line
+    '''
+    onLine = int(size * share)
+    points = [(x, 3 * x + 7) for x in rng.sample(range(-10 ** 6, 10 ** 6),
+                                                 onLine)]
+    points += [(rng.randrange(-10 ** 6, 10 ** 6),
+                rng.randrange(-10 ** 6, 10 ** 6))
+               for i in range(size - onLine)]
+    rng.shuffle(points)
+    return points
+
+
+def benchmarkExact(size):
+    '''
+    Times max_points on random points, on points with a planted line, on
+    points with many duplicates and vertical lines, and on float points,
+    against the old float keyed version where it can run at all.
+    '''
+    rng = random.Random(0)
+    scattered = [(x, rng.randrange(-10 ** 6, 10 ** 6))
+                 for x in rng.sample(range(-10 ** 6, 10 ** 6), size)]
+    planted = plantedLine(size, rng)
+    crowded = [(rng.randrange(10), rng.randrange(size // 10 + 1))
+               for i in range(size)]
+    floats = [(x / 8, y / 4) for x, y in planted]
+    print("=== max_points on {} points ===".format(size))
+    print("random, float keys:       {:.3f}s".format(
+        timed(legacyMaxPoints, scattered)))
+    print("random:                   {:.3f}s".format(
+        timed(max_points, scattered)))
+    print("planted line:             {:.3f}s".format(
+        timed(max_points, planted)))
+    print("duplicates and verticals: {:.3f}s".format(
+        timed(max_points, crowded)))
+    print("planted line, floats:     {:.3f}s".format(
+        timed(max_points, floats)))
+
+
+def benchmarkParallel(size):
+    '''
+    Compares max_points with best_line on a point cloud with a planted line,
+    doubling best_line's workers from 1 up to the number of cores (at least
+    4). Meant to be run at sizes from 10**4 to 10**5.
+    '''
+    points = plantedLine(size, random.Random(0), share=0.01)
+    print("=== Best line through {} points ===".format(size))
+    if size <= 20000:
+        print("max_points:                 {:.3f}s".format(
+            timed(max_points, points)))
+    serial = None
+    workers = 1
+    while workers <= max(os.cpu_count() or 1, 4):
+        elapsed = timed(best_line, points, workers)
+        serial = serial or elapsed
+        print("best_line, {:>3} workers:    {:.3f}s  ({:.2f}x)".format(
+            workers, elapsed, serial / elapsed))
+        workers *= 2
+
+
+def benchmarkStream(size):
+    '''
+    Feeds size points to a LineCounter one at a time, against rerunning
+    max_points after every hundredth point.
+    '''
+    points = plantedLine(size, random.Random(0))
+    counter = LineCounter()
+
+    def rerun():
+        for end in range(100, size + 1, 100):
+            max_points(points[:end])
+
+    print("=== Streaming {} points ===".format(size))
+    elapsed = timed(lambda: [counter.add_point(point) for point in points])
+    print("LineCounter.add_point, every point: {:.3f}s ({:.1f}us a point)".format(
+        elapsed, elapsed / size * 10 ** 6))
+    print("max_points, every 100th point:      {:.3f}s".format(timed(rerun)))
+
+
+def benchmarkRansac(size):
+    '''
+    Compares approximate_best_line with the exact best_line on points with
+    lines planted through 1%, 5% and 20% of them.
+    '''
+    print("=== Sampling lines among {} points ===".format(size))
+    if size <= 20000:
+        print("best_line:                    {:.3f}s".format(timed(
+            best_line, plantedLine(size, random.Random(0)), 1)))
+    for share in (0.01, 0.05, 0.2):
+        points = plantedLine(size, random.Random(0), share)
+        start = time.perf_counter()
+        found = approximate_best_line(points, share, 0.01, 0)[0]
+        print("epsilon {:<4}: found {:>6} of {:>6} in {:.3f}s".format(
+            share, found, int(size * share), time.perf_counter() - start))
+
+
+BENCHMARKS = {
+    'exact': benchmarkExact,
+    'parallel': benchmarkParallel,
+    'stream': benchmarkStream,
+    'ransac': benchmarkRansac,
+}
+
+if __name__ == '__main__':
+    name = sys.argv[1] if len(sys.argv) > 1 else 'exact'
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    BENCHMARKS[name](size)
@@ -0,0 +1,160 @@
+'''
+quick_sort spread over several processes. The top few partitions run in
+this process, which leaves independent slices that can be sorted anywhere;
+the big ones go to a process pool and the small ones are sorted right here
+while the pool works. Numeric arrays are copied once into shared memory so
+the workers sort them in place; anything else travels to the workers as
+pickled slices.
+'''
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from quick_sort import *
+
+# Below this many elements it is not worth starting a pool at all
+PARALLEL_THRESHOLD = 100000
+# Slices smaller than this are sorted in this process instead of being
+# shipped off, since the task overhead would eat the gain
+INLINE_THRESHOLD = 20000
+# Aim for a few slices per worker so an unlucky pivot does not leave one
+# worker with most of the array while the others sit idle
+TASKS_PER_WORKER = 4
+
+
+def _numeric_typecode(Array):
+    '''
+    Returns the array typecode that can hold every element of Array
+    exactly, or None if it has to be treated as a list of objects
+    '''
+    if isinstance(Array, array):
+        # memoryview can only cast to the native numeric formats
+        return Array.typecode if Array.typecode in 'bBhHiIlLqQfd' else None
+    if all(type(item) is float for item in Array):
+        return 'd'
+    if all(type(item) is int for item in Array):
+        if Array and -2 ** 63 <= min(Array) and max(Array) < 2 ** 63:
+            return 'q'
+    return None
+
+
+def _sort_shared(name, typecode, left, right):
+    '''
+    Worker: sorts one slice of a shared numeric array in place
+    '''
+    # Attaching registers the block with the resource tracker the pool
+    # shares with us, where it already is; the parent unlinks it when done.
+    memory = shared_memory.SharedMemory(name=name)
+    view = memory.buf.cast(typecode)
+    try:
+        # Indexing the buffer boxes a new number on every read, which makes
+        # sorting it directly about 1.5x slower than sorting a list, so the
+        # slice is copied out, sorted and copied back in.
+        chunk = view[left:right + 1].tolist()
+        quick_sort(chunk)
+        view[left:right + 1] = array(typecode, chunk)
+    finally:
+        view.release()
+        memory.close()
+    return left, right
+
+
+def _sort_slice(chunk, left):
+    '''
+    Worker: sorts a pickled slice of objects and sends it back
+    '''
+    quick_sort(chunk)
+    return left, chunk
+
+
+def _plan(Array, left, right, tasks):
+    '''
+    Partitions Array[left..right] in this process until it falls into about
+    tasks independent slices, and returns them as (left, right) pairs,
+    largest first
+    '''
+    slices = [(left, right)]
+    while slices and len(slices) < tasks:
+        slices.sort(key=lambda bounds: bounds[1] - bounds[0])
+        left, right = slices[-1]
+        if right - left + 1 <= INLINE_THRESHOLD:
+            break
+        slices.pop()
+        first_equal, last_equal = partition(
+            Array, left, right, choose_pivot(Array, left, right))
+        # The run equal to the pivot is already in place
+        for bounds in ((left, first_equal - 1), (last_equal + 1, right)):
+            if bounds[1] > bounds[0]:
+                slices.append(bounds)
+    slices.sort(key=lambda bounds: bounds[0] - bounds[1])
+    return slices
+
+
+def parallel_quick_sort(Array, workers=None):
+    '''
+    Sorts Array (a list or array.array) in descending order in place, like
+    quick_sort, using a pool of workers processes (by default one per
+    core). Short arrays, or a single worker, just use quick_sort.
+    '''
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(Array) < PARALLEL_THRESHOLD:
+        quick_sort(Array)
+        return
+    typecode = _numeric_typecode(Array)
+    if typecode is None:
+        _sort_objects(Array, workers)
+    else:
+        _sort_numeric(Array, typecode, workers)
+
+
+def _sort_numeric(Array, typecode, workers):
+    '''
+    Plans the slices on a plain list, copies it into shared memory for the
+    pool to sort the big slices in place, and copies those back
+    '''
+    work = Array.tolist() if isinstance(Array, array) else Array
+    slices = _plan(work, 0, len(work) - 1, workers * TASKS_PER_WORKER)
+    shipped = [(left, right) for left, right in slices
+               if right - left + 1 > INLINE_THRESHOLD]
+    packed = array(typecode, work)
+    memory = shared_memory.SharedMemory(
+        create=True, size=max(len(packed), 1) * packed.itemsize)
+    view = memory.buf.cast(typecode)
+    try:
+        view[:len(packed)] = packed
+        del packed
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(_sort_shared, memory.name, typecode,
+                                   left, right)
+                       for left, right in shipped]
+            for left, right in slices:
+                if right - left + 1 <= INLINE_THRESHOLD:
+                    quick_sort(work, left, right)
+            for future in wait(futures).done:
+                future.result()
+        for left, right in shipped:
+            work[left:right + 1] = view[left:right + 1].tolist()
+    finally:
+        view.release()
+        memory.close()
+        memory.unlink()
+    if work is not Array:
+        Array[:] = array(typecode, work)
+
+
+def _sort_objects(Array, workers):
+    '''
+    Sorts a list of arbitrary objects with the pool, shipping each slice
+    out and back pickled
+    '''
+    slices = _plan(Array, 0, len(Array) - 1, workers * TASKS_PER_WORKER)
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(_sort_slice, Array[left:right + 1], left)
+                   for left, right in slices
+                   if right - left + 1 > INLINE_THRESHOLD]
+        for left, right in slices:
+            if right - left + 1 <= INLINE_THRESHOLD:
+                quick_sort(Array, left, right)
+        for future in wait(futures).done:
+            left, chunk = future.result()
+            Array[left:left + len(chunk)] = chunk
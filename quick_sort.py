@@ -1,4 +1,21 @@
+import heapq
 import random
+from array import array
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Below this many elements insertion sort beats partitioning: it has no
+# pivot to pick and no bookkeeping, and small slices are nearly free to scan.
+INSERTION_SORT_THRESHOLD = 16
+# Above this many elements the pivot is the median of three medians (Tukey's
+# ninther) rather than the median of three, which is worth the extra
+# comparisons once the slice is big enough.
+NINTHER_THRESHOLD = 128
+# The NumPy backend stops partitioning and hands slices this short to
+# numpy.sort, once the fixed cost of each vectorized step outweighs it.
+NUMPY_LEAF_SIZE = 8192
 
 def swap(Array, first_item_index, second_item_index):
     '''
@@ -9,66 +26,430 @@ def swap(Array, first_item_index, second_item_index):
     Array[first_item_index] = Array[second_item_index]
     Array[second_item_index] = temp
 
-def partition(Array, left, right):
+def partition(Array, left, right, pivot_index=None):
     '''
     Given an array and two boundries in the array, it partitions those
-    elements such that for some (randomly chosen) element in the array,
-    every element to the left of the pivot is less than the pivot, and every
-    element to the right of the pivot is greater than or equal to the pivot.
+    elements such that for some (randomly chosen, unless pivot_index is
+    given) element in the array, every element to the left of the pivot is
+    greater than the pivot, every element to the right of the pivot is less
+    than the pivot, and the elements equal to the pivot sit in between.
+    Returns the first and last index of that run of equal elements.
     '''
     # The algorithm would work the same for any choice of pivot, and it is
     # simplest to write when you choose 'right' as your pivot, but choosing
     # a random element is recommeded since it reduces the likelihood of worst
     # case performance when the distrubtion of input arrays is not random.
     # If we were to pick 'right' as the pivot, we would have worst case
-    # performance when the list was already sorted. 
-    pivot_index = random.randrange(left, right + 1)
+    # performance when the list was already sorted.
+    if pivot_index is None:
+        pivot_index = random.randrange(left, right + 1)
     pivot = Array[pivot_index]
     # We need to keep the pivot out of the way until the end, and our loop
     # only ranges to right - 1
-    swap(Array, pivot_index, right)
-    # For every element in the loop x s.t left <= x.index <= less_than_pivot, 
-    # x < pivot
+    Array[pivot_index] = Array[right]
+    Array[right] = pivot
+    # For every element in the loop x s.t left <= x.index <= less_than_pivot,
+    # x > pivot
     less_than_pivot = left - 1
-    # For every element in the loop x s.t 
+    # For every element in the loop x s.t
     # less_than_element < x.index <= equal_to_pivot, x = pivot
 
     # We can ignore equal elments (i.e pick to treat them as less than or
     # greater than) but that leads to bad performance when an array has
-    # lots of equal elements, because we end up doing lots of useless 
-    # 'sorting' on unequal sub problems in our recursive calls.  
+    # lots of equal elements, because we end up doing lots of useless
+    # 'sorting' on unequal sub problems in our recursive calls.
     equal_to_pivot = left - 1
+    # The swaps are written out by hand: this loop is the whole cost of the
+    # sort, and a call to swap() per move roughly doubles it.
     for i in range(left, right):
-        if Array[i] == pivot:
+        item = Array[i]
+        if item == pivot:
             equal_to_pivot += 1
-            swap(Array, equal_to_pivot, i)
-        elif Array[i] > pivot:
+            Array[i] = Array[equal_to_pivot]
+            Array[equal_to_pivot] = item
+        elif item > pivot:
             less_than_pivot += 1
             equal_to_pivot += 1
-            # Every time we expand the subarray of elements less than the 
+            # Every time we expand the subarray of elements greater than the
             # pivot, we need to push the elements equal to the pivot up the
-            # array as well. 
-            swap(Array, less_than_pivot, equal_to_pivot)
-            if equal_to_pivot != i:
-                swap(Array, less_than_pivot, i)
-    swap(Array, equal_to_pivot + 1, right)
+            # array as well. The first equal element moves to the end of the
+            # equal run, and whatever was just past the run moves to i.
+            Array[i] = Array[equal_to_pivot]
+            Array[equal_to_pivot] = Array[less_than_pivot]
+            Array[less_than_pivot] = item
+    Array[right] = Array[equal_to_pivot + 1]
+    Array[equal_to_pivot + 1] = pivot
     return (less_than_pivot + 1, equal_to_pivot + 1)
 
-def quick_sort(Array, left, right):
+def median_of_three(Array, first, second, third):
+    '''
+    Returns whichever of the three indicies holds the median of their values
+    '''
+    a = Array[first]
+    b = Array[second]
+    c = Array[third]
+    if a < b:
+        if b < c:
+            return second
+        return third if a < c else first
+    if a < c:
+        return first
+    return third if b < c else second
+
+def choose_pivot(Array, left, right):
+    '''
+    Picks a pivot index for Array[left..right]: the median of the first,
+    middle and last elements, or for big slices the ninther, the median of
+    three such medians taken from evenly spaced spots.
+    '''
+    middle = (left + right) // 2
+    if right - left + 1 < NINTHER_THRESHOLD:
+        return median_of_three(Array, left, middle, right)
+    step = (right - left + 1) // 8
+    return median_of_three(
+        Array,
+        median_of_three(Array, left, left + step, left + 2 * step),
+        median_of_three(Array, middle - step, middle, middle + step),
+        median_of_three(Array, right - 2 * step, right - step, right))
+
+def insertion_sort(Array, left, right):
+    '''
+    Sorts Array[left..right] in descending order by insertion, which is the
+    fastest way to finish off the short slices quick_sort leaves behind.
+    '''
+    for i in range(left + 1, right + 1):
+        item = Array[i]
+        j = i - 1
+        while j >= left and Array[j] < item:
+            Array[j + 1] = Array[j]
+            j -= 1
+        Array[j + 1] = item
+
+def heap_sort(Array, left, right):
+    '''
+    Sorts Array[left..right] in descending order in O(n log n) no matter
+    what the input looks like. quick_sort falls back on it for slices where
+    partitioning keeps going badly.
+    '''
+    count = right - left + 1
+    # Build a min-heap over the slice, then repeatedly swap its smallest
+    # element out to the end of the shrinking heap.
+    for start in range(count // 2 - 1, -1, -1):
+        _sift_down(Array, left, start, count)
+    for end in range(count - 1, 0, -1):
+        smallest = Array[left]
+        Array[left] = Array[left + end]
+        Array[left + end] = smallest
+        _sift_down(Array, left, 0, end)
+
+def _sift_down(Array, offset, root, count):
+    '''
+    Moves Array[offset + root] down the min-heap of count elements stored
+    from offset until both of its children are no smaller than it
+    '''
+    item = Array[offset + root]
+    while True:
+        child = 2 * root + 1
+        if child >= count:
+            break
+        if child + 1 < count and Array[offset + child + 1] < Array[offset + child]:
+            child += 1
+        if not Array[offset + child] < item:
+            break
+        Array[offset + root] = Array[offset + child]
+        root = child
+    Array[offset + root] = item
+
+def quick_sort(Array, left=0, right=None, key=None, reverse=False,
+               stable=False):
+    '''
+    Sorts an array in descending order in place, O(n log(n)) in the worst
+    case. This is an introsort: quicksort with a median-of-three (or
+    ninther) pivot, insertion sort for short slices, and heapsort for any
+    slice that has been partitioned more than 2 log(n) levels deep without
+    getting short, which only happens on adversarial input.
+
+    key works as it does for sorted(): elements are ordered by key(element),
+    which is called exactly once per element. reverse flips the order to
+    ascending. Sorts with a key are stable; set stable to get the same
+    guarantee without one (plain values are otherwise sorted in place,
+    which may reorder equal elements).
+
+    A 1-D numeric NumPy array, or a numeric array.array, is sorted in place
+    by a vectorized backend instead of the element by element loop. It
+    gives the same order, with any NaNs last whichever way it sorts.
+    '''
+    if right is None:
+        right = len(Array) - 1
+    if right <= left:
+        return
+    if key is None and not stable:
+        view = _numpy_view(Array)
+        if view is not None:
+            _numpy_quick_sort(view, left, right, reverse)
+            return
+    if key is not None or stable:
+        _sort_decorated(Array, left, right, key, reverse)
+        return
+    if reverse:
+        quick_sort(Array, left, right)
+        Array[left:right + 1] = Array[left:right + 1][::-1]
+        return
+    # Rather than recursing, we keep the slices still to be sorted on a
+    # stack. We always carry on with the smaller side of a partition and
+    # push the larger one, so the stack never holds more than log(n) slices.
+    stack = [(left, right, 2 * (right - left + 1).bit_length())]
+    while stack:
+        left, right, depth = stack.pop()
+        while right - left + 1 > INSERTION_SORT_THRESHOLD:
+            if depth == 0:
+                heap_sort(Array, left, right)
+                break
+            depth -= 1
+            less_right_boundry, greater_left_boundry = partition(
+                Array, left, right, choose_pivot(Array, left, right))
+            if less_right_boundry - left < right - greater_left_boundry:
+                stack.append((greater_left_boundry + 1, right, depth))
+                right = less_right_boundry - 1
+            else:
+                stack.append((left, less_right_boundry - 1, depth))
+                left = greater_left_boundry + 1
+        else:
+            insertion_sort(Array, left, right)
+
+def _numpy_view(Array):
+    '''
+    Returns a NumPy array sharing Array's memory if Array is a 1-D numeric
+    NumPy array or array.array (and NumPy is installed), otherwise None
+    '''
+    if numpy is None:
+        return None
+    if isinstance(Array, numpy.ndarray):
+        view = Array
+    elif isinstance(Array, array) and Array.typecode in 'bBhHiIlLqQfd':
+        view = numpy.frombuffer(Array, dtype=Array.typecode)
+    else:
+        return None
+    if view.ndim != 1 or view.dtype.kind not in 'biuf':
+        return None
+    return view
+
+def _numpy_quick_sort(view, left, right, reverse):
+    '''
+    Sorts view[left..right] in descending order (ascending with reverse)
+    with the same introsort as quick_sort, except that every partition is
+    three boolean masks and three bulk copies, every step works on a view
+    of the slice rather than a copy, and the short slices at the bottom go
+    to numpy.sort. NaNs end up last in either order.
+    '''
+    if view.dtype.kind == 'f':
+        # NaN is neither greater than, less than nor equal to a pivot, so
+        # they are moved to the back first and left out of the sort.
+        whole = view[left:right + 1]
+        missing = numpy.isnan(whole)
+        count = int(missing.sum())
+        if count:
+            whole[:] = numpy.concatenate((whole[~missing], whole[missing]))
+            right -= count
+    ordered = view[left:right + 1]
+    stack = [(left, right, 2 * (right - left + 1).bit_length())]
+    while stack:
+        left, right, depth = stack.pop()
+        while right - left + 1 > NUMPY_LEAF_SIZE:
+            segment = view[left:right + 1]
+            if depth == 0:
+                segment[:] = numpy.sort(segment, kind='heapsort')[::-1]
+                break
+            depth -= 1
+            pivot = segment[choose_pivot(segment, 0, right - left)]
+            greater = segment[segment > pivot]
+            equal = segment[segment == pivot]
+            less = segment[segment < pivot]
+            # Greater elements go left, as partition does it. Copying out
+            # the equal ones, rather than filling in the pivot, keeps -0.0
+            # and 0.0 apart.
+            first_equal = len(greater)
+            last_equal = first_equal + len(equal)
+            segment[:first_equal] = greater
+            segment[first_equal:last_equal] = equal
+            segment[last_equal:] = less
+            first_equal += left
+            last_equal += left - 1
+            if first_equal - left < right - last_equal:
+                stack.append((last_equal + 1, right, depth))
+                right = first_equal - 1
+            else:
+                stack.append((left, first_equal - 1, depth))
+                left = last_equal + 1
+        else:
+            segment = view[left:right + 1]
+            segment[:] = numpy.sort(segment)[::-1]
+    if reverse:
+        ordered[:] = ordered[::-1].copy()
+
+def _sort_decorated(Array, left, right, key, reverse):
+    '''
+    Sorts Array[left..right] by keys computed once each, keeping elements
+    with equal keys in their original order. The elements are dropped into
+    one bucket per distinct key, only the distinct keys are sorted (as
+    plain values, so the fast path applies), and the buckets are read back
+    in key order. Unhashable keys are decorated into (key, position) pairs
+    and sorted that way instead.
+    '''
+    items = Array[left:right + 1]
+    keys = items if key is None else [key(item) for item in items]
+    buckets = {}
+    try:
+        for item, item_key in zip(items, keys):
+            bucket = buckets.get(item_key)
+            if bucket is None:
+                buckets[item_key] = [item]
+            else:
+                bucket.append(item)
+    except TypeError:
+        _store(Array, left, right, _sort_pairs(items, keys, reverse))
+        return
+    distinct = list(buckets)
+    quick_sort(distinct, reverse=reverse)
+    _store(Array, left, right, [item for item_key in distinct
+                                for item in buckets[item_key]])
+
+def _store(Array, left, right, items):
+    '''
+    Writes the list items over Array[left..right], converting it first if
+    Array is an array.array, whose slices only take other arrays
+    '''
+    if isinstance(Array, array):
+        items = array(Array.typecode, items)
+    Array[left:right + 1] = items
+
+def _sort_pairs(items, keys, reverse):
+    '''
+    Returns items stably sorted by keys, by sorting (key, position) pairs.
+    The position breaks ties, so the items themselves are never compared.
+    '''
+    # A descending sort puts the larger of two tied positions first, so
+    # storing -position makes that the earlier element. An ascending sort
+    # is the descending one read backwards, so there plain positions come
+    # out earliest first.
+    if reverse:
+        decorated = list(zip(keys, range(len(items))))
+        quick_sort(decorated)
+        decorated.reverse()
+        return [items[position] for item_key, position in decorated]
+    decorated = list(zip(keys, range(0, -len(items), -1)))
+    quick_sort(decorated)
+    return [items[-position] for item_key, position in decorated]
+
+def nth_element(Array, k, left=0, right=None):
+    '''
+    Rearranges Array[left..right] so that Array[k] holds the element a
+    quick_sort would put there, everything before it is no smaller and
+    everything after it no greater. Returns Array[k]. Expected O(n), and
+    guaranteed O(n) thanks to the median-of-medians fallback.
+    '''
+    if right is None:
+        right = len(Array) - 1
+    if not left <= k <= right:
+        raise IndexError('k is outside the slice being searched')
+    # Every partition scans its whole slice. Good pivots shrink the slice
+    # geometrically, so the scans add up to about 2n; once they pass 4n the
+    # pivots have been going badly and we switch to median of medians.
+    return _select(Array, k, left, right, 4 * (right - left + 1))
+
+def _select(Array, k, left, right, budget):
+    '''
+    The quickselect loop behind nth_element. budget is how many more
+    elements may be partitioned around cheap pivots before every pivot
+    comes from median_of_medians instead.
+    '''
+    while right - left + 1 > INSERTION_SORT_THRESHOLD:
+        if budget > 0:
+            budget -= right - left + 1
+            pivot_index = choose_pivot(Array, left, right)
+        else:
+            pivot_index = median_of_medians(Array, left, right)
+        # Unlike a sort we only keep the side holding k, and can stop as
+        # soon as k lands among the elements equal to the pivot.
+        first_equal, last_equal = partition(Array, left, right, pivot_index)
+        if k < first_equal:
+            right = first_equal - 1
+        elif k > last_equal:
+            left = last_equal + 1
+        else:
+            return Array[k]
+    insertion_sort(Array, left, right)
+    return Array[k]
+
+def median_of_medians(Array, left, right):
+    '''
+    Returns the index of a pivot for Array[left..right] that is guaranteed
+    to have at least 3/10 of the slice on either side: the median of the
+    medians of groups of five. The medians are gathered at the front of
+    the slice along the way.
+    '''
+    medians_end = left - 1
+    for start in range(left, right + 1, 5):
+        end = min(start + 4, right)
+        insertion_sort(Array, start, end)
+        middle = (start + end) // 2
+        medians_end += 1
+        Array[medians_end], Array[middle] = Array[middle], Array[medians_end]
+    target = (left + medians_end) // 2
+    _select(Array, target, left, medians_end, 0)
+    return target
+
+def select(Array, k):
+    '''
+    Returns the k-th largest element of Array, counting from 1, without
+    changing Array.
+    '''
+    if not 1 <= k <= len(Array):
+        raise IndexError('k must be between 1 and len(Array)')
+    return nth_element(list(Array), k - 1)
+
+def top_k(Array, k):
+    '''
+    Returns the k largest elements of Array, largest first, without
+    changing it. Any iterable that is not a list is streamed through
+    stream_top_k, so it never has to fit in memory. For a list, a k
+    below about an eighth of its length also goes through the heap, which
+    then wins on speed; larger k are split off with nth_element and only
+    the k winners are sorted.
+    '''
+    if not isinstance(Array, list) or k * 8 < len(Array):
+        return stream_top_k(Array, k)
+    if k <= 0:
+        return []
+    work = list(Array)
+    if k < len(work):
+        nth_element(work, k - 1)
+        del work[k:]
+    quick_sort(work)
+    return work
+
+def stream_top_k(iterable, k):
     '''
-    Sorts an array, O(log(n)) in the average case and O(n^2) in the worst case.
-    The worst case should be quite rare for large arrays.
+    Returns the k largest items of iterable, largest first, holding only k
+    of them at a time in a min-heap whose root is the smallest winner so
+    far: O(n log k) time and O(k) memory.
     '''
-    less_right_boundry, greater_left_boundry = partition(Array, left, right)
-    if less_right_boundry - 1 > left:
-        quick_sort(Array, left, less_right_boundry - 1)
-    if greater_left_boundry + 1 < right:
-        quick_sort(Array, greater_left_boundry + 1, right)
+    if k <= 0:
+        return []
+    heap = []
+    for item in iterable:
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif heap[0] < item:
+            heapq.heapreplace(heap, item)
+    quick_sort(heap)
+    return heap
 
 
-test = [4234,6,6,3,7,9,3,7,2,2,5,6,7,0,9,9,3,8,3,6]
-sorted_test = sorted(test, reverse=True)
-print(test)
-quick_sort(test, 0, len(test) - 1)
-print(test)
-print(test == sorted_test)
+if __name__ == '__main__':
+    test = [4234,6,6,3,7,9,3,7,2,2,5,6,7,0,9,9,3,8,3,6]
+    sorted_test = sorted(test, reverse=True)
+    print(test)
+    quick_sort(test, 0, len(test) - 1)
+    print(test)
+    print(test == sorted_test)
@@ -0,0 +1,574 @@
+'''
+Benchmarks for quick_sort.py. Run with the name of a benchmark and an
+optional size, e.g.
+
+    python quick_sort_benchmark.py select 1000000
+
+The suite benchmark runs every engine in ENGINES on every input shape in
+DISTRIBUTIONS at sizes from 10**2 up by powers of ten to the size given,
+and times, counts and measures each run. It optionally takes a file to
+write the results to (.csv, otherwise JSON) and comma separated lists of
+engines and distributions, e.g.
+
+    python quick_sort_benchmark.py suite 1000000 results.csv quick_sort,numpy
+
+Each engine is run three times per input: on a plain list for the time
+(best of several runs for the small sizes), on counting wrappers for the
+comparisons and writes, and under tracemalloc for the peak memory, so the
+bookkeeping of one never shows up in the others.
+'''
+import csv
+import heapq
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from external_sort import external_sort
+from parallel_quick_sort import parallel_quick_sort
+from quick_sort import heap_sort, quick_sort, select, stream_top_k, top_k
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def timed(function, *args):
+    '''
+    Returns how many seconds function(*args) took to run.
+    '''
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def benchmarkSelect(size):
+    '''
+    Compares finding the median and the k largest values with select,
+    top_k and stream_top_k against a full quick_sort and heapq.nlargest.
+    '''
+    values = [random.random() for i in range(size)]
+
+    def sortedMedian(Array):
+        work = list(Array)
+        quick_sort(work)
+        return work[len(work) // 2]
+
+    def sortedTop(Array, k):
+        work = list(Array)
+        quick_sort(work)
+        return work[:k]
+
+    print("=== Selecting from {} random floats ===".format(size))
+    print("median, quick_sort:        {:.3f}s".format(
+        timed(sortedMedian, values)))
+    print("median, select:            {:.3f}s".format(
+        timed(select, values, size // 2 + 1)))
+    for k in (10, 1000, max(size // 10, 1)):
+        print("top {}:".format(k))
+        print("  quick_sort and slice:    {:.3f}s".format(
+            timed(sortedTop, values, k)))
+        print("  top_k:                   {:.3f}s".format(
+            timed(top_k, values, k)))
+        print("  stream_top_k:            {:.3f}s".format(
+            timed(stream_top_k, iter(values), k)))
+        print("  heapq.nlargest:          {:.3f}s".format(
+            timed(heapq.nlargest, k, values)))
+
+
+class Ticket(object):
+    '''
+    A stand-in for a MealTicket: just the fields a sort might key on.
+    '''
+    __slots__ = ('ticketID', 'totalCost')
+
+    def __init__(self, ticketID, totalCost):
+        self.ticketID = ticketID
+        self.totalCost = totalCost
+
+
+class ByCost(object):
+    '''
+    The wrapper we used to need: every comparison looks the cost up again.
+    '''
+    __slots__ = ('ticket',)
+
+    def __init__(self, ticket):
+        self.ticket = ticket
+
+    def __lt__(self, other):
+        return self.ticket.totalCost < other.ticket.totalCost
+
+    def __gt__(self, other):
+        return self.ticket.totalCost > other.ticket.totalCost
+
+    def __eq__(self, other):
+        return self.ticket.totalCost == other.ticket.totalCost
+
+
+def benchmarkKeys(size):
+    '''
+    Compares sorting tickets by cost through a comparison wrapper with
+    quick_sort's key= and the built in sorted(), and sorting by ticketID,
+    where no two keys are equal.
+    '''
+    tickets = [Ticket(i, round(random.uniform(0, 90), 2)) for i in range(size)]
+
+    def wrapped():
+        work = [ByCost(ticket) for ticket in tickets]
+        quick_sort(work)
+        return [wrapper.ticket for wrapper in work]
+
+    def keyed(key):
+        work = list(tickets)
+        quick_sort(work, key=key)
+
+    def byCost(ticket):
+        return ticket.totalCost
+
+    def byID(ticket):
+        return ticket.ticketID
+
+    print("=== Sorting {} tickets ===".format(size))
+    print("by cost, comparison wrapper:  {:.3f}s".format(timed(wrapped)))
+    print("by cost, key=:                {:.3f}s".format(timed(keyed, byCost)))
+    print("by cost, sorted(key=):        {:.3f}s".format(timed(
+        lambda: sorted(tickets, key=byCost))))
+    # Every ID is distinct, so this is the worst case for the buckets
+    print("by ID, key=:                  {:.3f}s".format(timed(keyed, byID)))
+    print("by ID, sorted(key=):          {:.3f}s".format(timed(
+        lambda: sorted(tickets, key=byID))))
+
+def benchmarkParallel(size):
+    '''
+    Compares quick_sort with parallel_quick_sort on random floats, doubling
+    the workers from 1 up to the number of cores (at least 4). Meant to be
+    run at sizes from 10**6 to 10**8.
+    '''
+    values = [random.random() for i in range(size)]
+
+    def sortCopy(sort, *args):
+        work = list(values)
+        sort(work, *args)
+
+    serial = timed(sortCopy, quick_sort)
+    print("=== Sorting {} random floats ===".format(size))
+    print("quick_sort:                   {:.3f}s".format(serial))
+    workers = 1
+    while workers <= max(os.cpu_count() or 1, 4):
+        elapsed = timed(sortCopy, parallel_quick_sort, workers)
+        print("parallel_quick_sort, {:>3} workers: {:.3f}s  ({:.2f}x)".format(
+            workers, elapsed, serial / elapsed))
+        workers *= 2
+
+
+def benchmarkNumpy(size):
+    '''
+    Compares the pure Python quick_sort on a list with the NumPy backend on
+    an ndarray and an array.array of the same random floats, with
+    numpy.sort as the floor.
+    '''
+    if numpy is None:
+        print("NumPy is not installed")
+        return
+    values = [random.random() for i in range(size)]
+
+    def sortList():
+        quick_sort(list(values))
+
+    def sortArray(kind):
+        quick_sort(numpy.array(values) if kind == 'ndarray'
+                   else array('d', values))
+
+    def numpySort():
+        work = numpy.array(values)
+        work[:] = numpy.sort(work)[::-1]
+
+    print("=== Sorting {} random floats ===".format(size))
+    print("list, pure Python:       {:.3f}s".format(timed(sortList)))
+    print("ndarray, NumPy backend:  {:.3f}s".format(timed(sortArray, 'ndarray')))
+    print("array.array, NumPy:      {:.3f}s".format(timed(sortArray, 'array')))
+    print("numpy.sort:              {:.3f}s".format(timed(numpySort)))
+
+
+def _externalRun(inputPath, outputPath, budget, useMmap):
+    '''
+    Runs one external sort and returns its time and how far it pushed the
+    process's peak RSS past where it started, in bytes
+    '''
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    elapsed = timed(lambda: external_sort(
+        inputPath, outputPath, memory_budget=budget, use_mmap=useMmap))
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux
+    return elapsed, (after - before) * 1024
+
+
+def benchmarkExternal(size):
+    '''
+    Sorts a file of size random doubles with external_sort under a few
+    memory budgets, each in a fresh process so its peak RSS can be read.
+    '''
+    directory = tempfile.mkdtemp()
+    inputPath = os.path.join(directory, 'input')
+    outputPath = os.path.join(directory, 'output')
+    with open(inputPath, 'wb') as f:
+        for start in range(0, size, 1000000):
+            array('d', (random.random() for i in range(
+                min(1000000, size - start)))).tofile(f)
+    print("=== External sort of {} doubles ({:.0f} MB) ===".format(
+        size, size * 8 / 2 ** 20))
+    try:
+        for budget in (4 * 2 ** 20, 16 * 2 ** 20, 64 * 2 ** 20):
+            for useMmap in (False, True):
+                with ProcessPoolExecutor(1) as pool:
+                    elapsed, grown = pool.submit(
+                        _externalRun, inputPath, outputPath, budget,
+                        useMmap).result()
+                print("budget {:>3} MB{}: {:.3f}s, peak RSS grew {:.1f} MB".format(
+                    budget // 2 ** 20, ', mmap' if useMmap else '      ',
+                    elapsed, grown / 2 ** 20))
+    finally:
+        for path in (inputPath, outputPath):
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(directory)
+
+
+# The small sizes are repeated until about this many elements have been
+# sorted, and the best run kept, so their times are not just timer noise
+REPEAT_ELEMENTS = 100000
+# How many distinct values the few-unique distribution draws from
+FEW_UNIQUE_VALUES = 16
+
+
+class Counted(object):
+    '''
+    Wraps a value and counts every comparison made on it, across all
+    instances, in Counted.comparisons.
+    '''
+    __slots__ = ('value',)
+    comparisons = 0
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        Counted.comparisons += 1
+        return self.value < other.value
+
+    def __gt__(self, other):
+        Counted.comparisons += 1
+        return self.value > other.value
+
+    def __eq__(self, other):
+        Counted.comparisons += 1
+        return self.value == other.value
+
+    __hash__ = None
+
+
+class CountingList(list):
+    '''
+    A list that counts how many elements are written into it, so a swap
+    shows up as two writes and an insertion sort shift as one.
+    '''
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.writes = 0
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = list(value)
+            self.writes += len(value)
+        else:
+            self.writes += 1
+        super().__setitem__(index, value)
+
+
+class Adversary(object):
+    '''
+    McIlroy's "killer adversary" for quicksort. Every element starts out as
+    gas, bigger than anything solid, and a comparison between two gas
+    elements freezes one of them into the next smallest solid value,
+    preferring the one that was last compared as gas, which is most likely
+    the pivot. The pivot so ends up among the smallest values of its slice
+    and the partition hardly shrinks it. Replaying the values the elements
+    froze to gives an input that does the same to any sort with the same
+    deterministic pivot rule.
+    '''
+    __slots__ = ('values', 'gas', 'solid', 'candidate')
+
+    def __init__(self, size):
+        self.gas = size
+        self.values = [size] * size
+        self.solid = 0
+        self.candidate = None
+
+    def compare(self, first, second):
+        '''
+        Returns the sign of values[first] - values[second], freezing gas as
+        needed to decide it
+        '''
+        values = self.values
+        gas = self.gas
+        if values[first] == gas and values[second] == gas:
+            self._freeze(first if first == self.candidate else second)
+        if values[first] == gas:
+            self.candidate = first
+        elif values[second] == gas:
+            self.candidate = second
+        return values[first] - values[second]
+
+    def _freeze(self, index):
+        '''
+        Turns values[index] from gas into the next solid value
+        '''
+        self.values[index] = self.solid
+        self.solid += 1
+
+
+class AdversaryItem(object):
+    '''
+    An element of the input the adversary is building: its comparisons are
+    decided by the adversary as they happen.
+    '''
+    __slots__ = ('adversary', 'index')
+
+    def __init__(self, adversary, index):
+        self.adversary = adversary
+        self.index = index
+
+    def __lt__(self, other):
+        return self.adversary.compare(self.index, other.index) < 0
+
+    def __gt__(self, other):
+        return self.adversary.compare(self.index, other.index) > 0
+
+    def __eq__(self, other):
+        return self.adversary.compare(self.index, other.index) == 0
+
+    __hash__ = None
+
+
+def adversarialInput(size, sort=quick_sort):
+    '''
+    Returns size integers laid out to make sort pick a bad pivot every time,
+    built by running sort once against the adversary. sort has to pick its
+    pivots deterministically; with random pivots no fixed input can be
+    reliably bad, which is exactly why this is worth checking for the
+    median-of-three and ninther rules.
+    '''
+    adversary = Adversary(size)
+    sort([AdversaryItem(adversary, index) for index in range(size)])
+    # Whatever is still gas was never told apart from the rest; any order
+    # among them is consistent with the comparisons the sort made.
+    for index in range(size):
+        if adversary.values[index] == adversary.gas:
+            adversary._freeze(index)
+    return adversary.values
+
+
+def organPipe(size):
+    '''
+    Returns 0, 1, ... up to the middle and back down again
+    '''
+    half = size // 2
+    return list(range(half)) + list(range(size - half - 1, -1, -1))
+
+
+# Every distribution takes a size and a random.Random and returns a list
+# of that many integers. "sorted" is already in quick_sort's descending
+# order and "reverse" is ascending.
+DISTRIBUTIONS = {
+    'random': lambda size, rng: [rng.randrange(size) for i in range(size)],
+    'sorted': lambda size, rng: list(range(size - 1, -1, -1)),
+    'reverse': lambda size, rng: list(range(size)),
+    'few_unique': lambda size, rng: [rng.randrange(FEW_UNIQUE_VALUES)
+                                     for i in range(size)],
+    'all_equal': lambda size, rng: [0] * size,
+    'organ_pipe': lambda size, rng: organPipe(size),
+    'adversarial': lambda size, rng: adversarialInput(size),
+}
+
+
+def sortedEngine(Array):
+    '''
+    The built in sort, descending, copied back into Array
+    '''
+    Array[:] = sorted(Array, reverse=True)
+
+
+def heapSortEngine(Array):
+    '''
+    quick_sort's heapsort fallback on its own
+    '''
+    heap_sort(Array, 0, len(Array) - 1)
+
+
+def numpyEngine(Array):
+    '''
+    quick_sort's NumPy backend, on an ndarray copy of Array that is copied
+    back when it is sorted
+    '''
+    work = numpy.array(Array)
+    quick_sort(work)
+    Array[:] = work.tolist()
+
+
+# Every engine sorts a list in place into descending order. The second
+# field says what can be counted for it. Writes only show up when they go
+# through the list's __setitem__; sorted() moves its elements around inside
+# C, where only the final copy back would be seen. parallel_quick_sort
+# compares in its workers and the NumPy backend inside NumPy, so neither
+# can be counted at all, and peak memory only covers this process. New
+# engines just need an entry here.
+ENGINES = {
+    'quick_sort': (quick_sort, ('comparisons', 'writes')),
+    'sorted': (sortedEngine, ('comparisons',)),
+    'heap_sort': (heapSortEngine, ('comparisons', 'writes')),
+    'parallel_quick_sort': (parallel_quick_sort, ()),
+}
+if numpy is not None:
+    ENGINES['numpy'] = (numpyEngine, ())
+
+
+def timeEngine(sort, values):
+    '''
+    Returns the best time of sorting a fresh copy of values, over enough
+    runs to cover about REPEAT_ELEMENTS elements
+    '''
+    best = None
+    for run in range(max(REPEAT_ELEMENTS // max(len(values), 1), 1)):
+        elapsed = timed(sort, list(values))
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def isDescending(values):
+    '''
+    Returns whether values is in descending order
+    '''
+    return all(values[i] >= values[i + 1] for i in range(len(values) - 1))
+
+
+def countEngine(sort, values):
+    '''
+    Returns the comparisons and element writes made sorting values, and
+    whether the result came out in descending order
+    '''
+    work = CountingList(Counted(value) for value in values)
+    Counted.comparisons = 0
+    sort(work)
+    comparisons = Counted.comparisons
+    return comparisons, work.writes, isDescending(
+        [item.value for item in work])
+
+
+def peakMemory(sort, values):
+    '''
+    Returns the most memory, in bytes, allocated on top of the input while
+    sorting a copy of values
+    '''
+    work = list(values)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sort(work)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - before
+
+
+def runSuite(maxSize, engines=None, distributions=None, seed=0, report=print):
+    '''
+    Runs every engine on every distribution at 10**2, 10**3, ... up to
+    maxSize and returns one dict of results per run. report is called with
+    a line of text as each run finishes.
+    '''
+    engines = engines or list(ENGINES)
+    distributions = distributions or list(DISTRIBUTIONS)
+    results = []
+    size = 100
+    while size <= maxSize:
+        for distribution in distributions:
+            values = DISTRIBUTIONS[distribution](size, random.Random(seed))
+            for engine in engines:
+                sort, counted = ENGINES[engine]
+                if counted:
+                    comparisons, writes, correct = countEngine(sort, values)
+                else:
+                    work = list(values)
+                    sort(work)
+                    correct = isDescending(work)
+                result = {
+                    'engine': engine,
+                    'distribution': distribution,
+                    'size': size,
+                    'seconds': timeEngine(sort, values),
+                    'comparisons': (comparisons if 'comparisons' in counted
+                                    else None),
+                    'writes': writes if 'writes' in counted else None,
+                    'peak_bytes': peakMemory(sort, values),
+                    'correct': correct,
+                }
+                results.append(result)
+                report("{engine:<19} {distribution:<12} {size:>9} "
+                       "{seconds:>9.4f}s {comparisons!s:>12} cmp "
+                       "{writes!s:>12} writes {peak_bytes:>11} B{flag}".format(
+                           flag='' if correct else '  WRONG', **result))
+        size *= 10
+    return results
+
+
+def writeResults(results, path):
+    '''
+    Writes results to path, as CSV if it ends in .csv and otherwise as JSON
+    along with the Python version and time they were taken at
+    '''
+    with open(path, 'w', newline='') as f:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+            return
+        json.dump({
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'taken': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results,
+        }, f, indent=1)
+
+
+def benchmarkSuite(size, path=None, engines=None, distributions=None):
+    '''
+    Runs the suite up to size elements, printing every run, and writes the
+    results to path if one is given. engines and distributions are comma
+    separated names from ENGINES and DISTRIBUTIONS, all of them by default.
+    '''
+    results = runSuite(size, engines and engines.split(','),
+                       distributions and distributions.split(','))
+    if path and results:
+        writeResults(results, path)
+
+
+BENCHMARKS = {
+    'select': benchmarkSelect,
+    'keys': benchmarkKeys,
+    'parallel': benchmarkParallel,
+    'numpy': benchmarkNumpy,
+    'external': benchmarkExternal,
+    'suite': benchmarkSuite,
+}
+
+if __name__ == '__main__':
+    name = sys.argv[1] if len(sys.argv) > 1 else 'select'
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    BENCHMARKS[name](size, *sys.argv[3:])
@@ -0,0 +1,65 @@
+'''
+Tests for external_sort.py. Run with pytest from this directory.
+'''
+import random
+from array import array
+import pytest
+from external_sort import *
+
+
+def test_binary_runs_and_merge_passes(tmp_path):
+    rng = random.Random(0)
+    values = array('d', [rng.random() for i in range(5000)])
+    source = str(tmp_path / 'values.bin')
+    with open(source, 'wb') as f:
+        values.tofile(f)
+    target = str(tmp_path / 'sorted.bin')
+    # About a hundred numbers per run, merged three at a time, takes
+    # several merge passes
+    for reverse in (False, True):
+        for use_mmap in (False, True):
+            assert external_sort(source, target, typecode='d',
+                                 memory_budget=3200, fan_in=3,
+                                 reverse=reverse, use_mmap=use_mmap,
+                                 temp_dir=str(tmp_path)) == len(values)
+            result = array('d')
+            with open(target, 'rb') as f:
+                result.fromfile(f, len(values))
+            assert list(result) == sorted(values, reverse=not reverse)
+    # Only the output is left behind
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        'sorted.bin', 'values.bin']
+
+
+def test_lines_by_key(tmp_path):
+    rng = random.Random(1)
+    lines = [b'%d,%d' % (rng.randrange(50), i) for i in range(2000)]
+    source = tmp_path / 'lines.txt'
+    # The last line has no newline of its own
+    source.write_bytes(b'\n'.join(lines))
+    target = tmp_path / 'sorted.txt'
+
+    def byFirst(line):
+        return int(line.split(b',')[0])
+
+    for use_mmap in (False, True):
+        assert external_sort(str(source), str(target), mode='lines',
+                             memory_budget=4000, fan_in=4, key=byFirst,
+                             reverse=True, use_mmap=use_mmap) == len(lines)
+        assert target.read_bytes().split(b'\n')[:-1] == sorted(
+            lines, key=byFirst)
+
+
+def test_empty_and_bad_input(tmp_path):
+    source = tmp_path / 'empty.bin'
+    source.write_bytes(b'')
+    target = tmp_path / 'sorted.bin'
+    assert external_sort(str(source), str(target)) == 0
+    assert target.read_bytes() == b''
+    source.write_bytes(b'1234567')
+    with pytest.raises(ValueError):
+        external_sort(str(source), str(target))
+    with pytest.raises(ValueError):
+        external_sort(str(source), str(target), mode='csv')
+    with pytest.raises(ValueError):
+        external_sort(str(source), str(target), fan_in=1)
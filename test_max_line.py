@@ -0,0 +1,110 @@
+'''
+Tests for max_line.py. Run with pytest from this directory.
+'''
+import random
+from decimal import Decimal
+from fractions import Fraction
+import pytest
+from max_line import *
+from max_line import _scan, _scan_numpy, _score
+
+
+def tiedLines(size, rng):
+    '''
+    Returns size points with two lines of 40 points each hidden in them,
+    shuffled so either line's first point may come first
+    '''
+    points = [(x, 2 * x + 1) for x in range(40)]
+    points += [(x, -3 * x + 10 ** 5) for x in range(1000, 1040)]
+    points += [(rng.randrange(10 ** 6), rng.randrange(10 ** 6))
+               for i in range(size - len(points))]
+    rng.shuffle(points)
+    return points
+
+
+def test_tie_goes_to_the_earlier_anchor_whatever_was_shared():
+    numpy = pytest.importorskip("numpy")
+    points = tiedLines(500, random.Random(1))
+    serial = _scan(points, 0, len(points), 0)
+    coordinates = numpy.array(points, dtype=numpy.int64)
+    # Another worker has already published the tied line through a later
+    # anchor; this batch still has to report its own earlier one.
+    later = max(index for index in range(len(points))
+                if _scan(points, index, index + 1, 0)[0] == serial[0])
+    shared = numpy.array([_score(serial[0], later)], dtype=numpy.int64)
+    assert later != serial[1]
+    assert _scan_numpy(coordinates, 0, serial[1] + 1, 0, shared) == serial
+
+
+def test_parallel_tie_matches_serial():
+    for seed in range(5):
+        points = tiedLines(PARALLEL_THRESHOLD + 500, random.Random(seed))
+        serial = best_line(points, 1)
+        assert serial[0] == 40
+        for workers in (2, 4):
+            assert best_line(points, workers) == serial
+
+
+def bruteMaxPoints(points):
+    '''
+    Counts the points on the line through every pair, the slow way
+    '''
+    points = [(Fraction(x), Fraction(y)) for x, y in points]
+    best = min(len(points), 1)
+    for i, (x1, y1) in enumerate(points):
+        best = max(best, points.count((x1, y1)))
+        for x2, y2 in points[i + 1:]:
+            if (x1, y1) != (x2, y2):
+                best = max(best, sum(
+                    1 for x, y in points
+                    if (x - x1) * (y2 - y1) == (y - y1) * (x2 - x1)))
+    return best
+
+
+def test_max_points_exact():
+    rng = random.Random(2)
+    for trial in range(200):
+        size = rng.randrange(12)
+        points = [(rng.randrange(-3, 4), rng.randrange(-3, 4))
+                  for i in range(size)]
+        assert max_points(points) == bruteMaxPoints(points)
+    # Vertical lines, duplicates, and Decimal and float coordinates
+    assert max_points([(2, 1), (2, 5), (2, -7), (1, 1)]) == 3
+    assert max_points([(1, 1)] * 4 + [(2, 2)]) == 5
+    assert max_points([(Decimal('0.1') * i, Decimal('0.3') * i)
+                       for i in range(10)]) == 10
+    assert max_points([(i / 4, 3 * i / 4) for i in range(10)]) == 10
+    assert max_points([]) == 0
+    assert max_points([(5, 5)]) == 1
+
+
+def test_line_counter_keeps_up():
+    rng = random.Random(3)
+    points = [(rng.randrange(-4, 5), rng.randrange(-4, 5)) for i in range(80)]
+    points += [(0.5, 0.5), (1.5, 1.5)]
+    counter = LineCounter()
+    for size, point in enumerate(points, 1):
+        assert counter.add_point(point) == max_points(points[:size])
+        assert counter.best == max_points(points[:size])
+    assert len(counter) == len(points)
+    assert LineCounter(points).best == counter.best
+    assert LineCounter([(1, 1), (1, 1)]).line is None
+
+
+def test_approximate_best_line_finds_a_big_line():
+    rng = random.Random(4)
+    line = [(x, 3 * x - 7) for x in range(300)]
+    points = line + [(rng.randrange(10 ** 6), rng.randrange(10 ** 6))
+                     for i in range(700)]
+    rng.shuffle(points)
+    for seed in range(5):
+        count, on_line = approximate_best_line(points, 0.25, 0.001, seed)
+        assert count == 300
+        assert sorted(on_line) == line
+    # Too few points to sample, so the exact answer comes back
+    pair = [(0, 0), (1, 1)]
+    assert approximate_best_line(pair, 0.5) == (2, pair)
+    with pytest.raises(ValueError):
+        approximate_best_line(points, 0)
+    with pytest.raises(ValueError):
+        approximate_best_line(points, 0.5, failure=1)
@@ -0,0 +1,49 @@
+'''
+Tests for parallel_quick_sort.py. Run with pytest from this directory.
+'''
+import random
+from array import array
+from parallel_quick_sort import *
+from parallel_quick_sort import _numeric_typecode, _plan
+
+
+def test_parallel_matches_serial():
+    rng = random.Random(0)
+    size = PARALLEL_THRESHOLD + 1000
+    floats = [rng.random() for i in range(size)]
+    inputs = [
+        floats,
+        array('d', floats),
+        [rng.randrange(-2 ** 40, 2 ** 40) for i in range(size)],
+        # Too big for int64, so they travel as pickled objects
+        [rng.randrange(2 ** 70) for i in range(size)],
+        [(rng.randrange(100), str(i)) for i in range(size)],
+        [rng.randrange(5) for i in range(size)],
+        floats[:1000],
+    ]
+    for values in inputs:
+        Array = values[:]
+        parallel_quick_sort(Array, workers=2)
+        assert list(Array) == sorted(values, reverse=True)
+
+
+def test_plan_leaves_independent_slices():
+    rng = random.Random(1)
+    Array = [rng.randrange(10 ** 6) for i in range(200000)]
+    slices = _plan(Array, 0, len(Array) - 1, 8)
+    sizes = [right - left + 1 for left, right in slices]
+    assert sizes == sorted(sizes, reverse=True)
+    slices.sort()
+    # Everything in a slice is smaller than everything in the one before
+    for (left, right), (next_left, next_right) in zip(slices, slices[1:]):
+        assert right < next_left
+        assert (min(Array[left:right + 1]) >
+                max(Array[next_left:next_right + 1]))
+
+
+def test_numeric_typecode():
+    assert _numeric_typecode([1.0, 2.5]) == 'd'
+    assert _numeric_typecode([1, -2]) == 'q'
+    assert _numeric_typecode([1, 2 ** 63]) is None
+    assert _numeric_typecode([1, 2.5]) is None
+    assert _numeric_typecode(array('i', [1])) == 'i'
@@ -0,0 +1,130 @@
+'''
+Tests for quick_sort.py. Run with pytest from this directory.
+'''
+import math
+import random
+from array import array
+import pytest
+from quick_sort import *
+
+
+def test_numpy_nans_last_in_both_orders():
+    numpy = pytest.importorskip("numpy")
+    values = [3.0, float('nan'), -1.0, 2.5, float('nan'), 0.0] * 3000
+    numbers = sorted(value for value in values if not math.isnan(value))
+    for reverse in (False, True):
+        expected = numbers if reverse else numbers[::-1]
+        for Array in (numpy.array(values), array('d', values)):
+            quick_sort(Array, reverse=reverse)
+            assert list(Array[:len(numbers)]) == expected
+            assert all(math.isnan(value) for value in Array[len(numbers):])
+
+
+def test_numpy_nans_last_in_a_slice():
+    numpy = pytest.importorskip("numpy")
+    Array = numpy.array([9.0, float('nan'), 1.0, 5.0, float('nan'), -9.0])
+    quick_sort(Array, 1, 4, reverse=True)
+    assert Array[0] == 9.0 and Array[-1] == -9.0
+    assert list(Array[1:3]) == [1.0, 5.0]
+    assert numpy.isnan(Array[3:5]).all()
+
+
+def shapes(size, rng):
+    '''
+    Returns inputs of size elements in the shapes that trip up a plain
+    quicksort: sorted both ways, organ pipe, few distinct values, random
+    '''
+    values = [rng.randrange(size) for i in range(size)]
+    return [sorted(values), sorted(values, reverse=True),
+            list(range(size // 2)) + list(range(size // 2, 0, -1)),
+            [rng.randrange(3) for i in range(size)], values, [7] * size]
+
+
+def test_quick_sort_shapes():
+    rng = random.Random(0)
+    for size in (0, 1, 2, 15, 16, 17, 127, 128, 1000):
+        for values in shapes(size, rng):
+            Array = list(values)
+            quick_sort(Array)
+            assert Array == sorted(values, reverse=True)
+    # Only the slice given is sorted
+    values = [rng.random() for i in range(500)]
+    Array = list(values)
+    quick_sort(Array, 100, 399)
+    assert Array[:100] == values[:100] and Array[400:] == values[400:]
+    assert Array[100:400] == sorted(values[100:400], reverse=True)
+
+
+def test_heap_sort_takes_over_from_bad_pivots(monkeypatch):
+    # Always pivoting on the largest element makes every partition peel
+    # off a single element, so the depth budget has to run out
+    def worst_pivot(Array, left, right):
+        return max(range(left, right + 1), key=Array.__getitem__)
+
+    heap_sorted = []
+
+    def counted_heap_sort(Array, left, right):
+        heap_sorted.append(right - left + 1)
+        heap_sort(Array, left, right)
+
+    monkeypatch.setitem(quick_sort.__globals__, 'choose_pivot', worst_pivot)
+    monkeypatch.setitem(quick_sort.__globals__, 'heap_sort',
+                        counted_heap_sort)
+    rng = random.Random(1)
+    values = [rng.random() for i in range(2000)]
+    Array = list(values)
+    quick_sort(Array)
+    assert heap_sorted
+    assert Array == sorted(values, reverse=True)
+
+
+def test_helpers_sort_descending():
+    rng = random.Random(2)
+    for helper in (insertion_sort, heap_sort):
+        values = [rng.randrange(50) for i in range(300)]
+        Array = list(values)
+        helper(Array, 10, 289)
+        assert Array[10:290] == sorted(values[10:290], reverse=True)
+        assert Array[:10] == values[:10] and Array[290:] == values[290:]
+    Array = [rng.random() for i in range(1000)]
+    pivot = Array[choose_pivot(Array, 0, 999)]
+    first, last = partition(Array, 0, 999, Array.index(pivot))
+    assert all(value > pivot for value in Array[:first])
+    assert Array[first:last + 1] == [pivot]
+    assert all(value < pivot for value in Array[last + 1:])
+
+
+def test_key_reverse_and_stable():
+    rng = random.Random(3)
+    records = [(rng.randrange(20), i) for i in range(3000)]
+    calls = []
+
+    def cost(record):
+        calls.append(record)
+        return record[0]
+
+    for reverse in (False, True):
+        del calls[:]
+        Array = list(records)
+        quick_sort(Array, key=cost, reverse=reverse)
+        # Each key is computed once, and equal keys keep their order
+        assert len(calls) == len(records)
+        assert Array == sorted(records, key=lambda r: r[0],
+                               reverse=not reverse)
+        # Unhashable keys take the decorated path, with the same result
+        unhashable = list(records)
+        quick_sort(unhashable, key=lambda r: [r[0]], reverse=reverse)
+        assert unhashable == Array
+    # 0.0 and -0.0 are equal, so a stable sort has to keep them in order
+    values = [0.0, 1.0, -0.0, 0.0, 2.0, -0.0]
+    for reverse in (False, True):
+        Array = list(values)
+        quick_sort(Array, reverse=reverse, stable=True)
+        expected = sorted(values, key=lambda v: v, reverse=not reverse)
+        assert [math.copysign(1, v) for v in Array] == [
+            math.copysign(1, v) for v in expected]
+    Array = array('i', [3, 5, 2, 1, 4])
+    quick_sort(Array, 1, 3, key=lambda v: -v)
+    assert list(Array) == [3, 1, 2, 5, 4]
+    quick_sort(Array, key=lambda v: -v, reverse=True)
+    assert list(Array) == [5, 4, 3, 2, 1]
@@ -0,0 +1,108 @@
+'''
+Benchmarks for valid_parens.py. Run with the name of a benchmark and an
+optional size in megabytes, e.g.
+
+    python benchmark.py file 4096
+'''
+import os
+import random
+import sys
+import tempfile
+import time
+from valid_parens import *
+
+
+def timed(function, *args):
+    '''
+    Returns how many seconds function(*args) took to run.
+    '''
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def randomParens(size, rng):
+    '''
+    Returns size bytes of parens, mostly balanced, with a stray close about
+    every few thousand bytes so the valid strings are of all lengths
+    '''
+    pieces = []
+    length = 0
+    while length < size:
+        depth = rng.randrange(1, 64)
+        piece = b'(' * depth + b'()' * rng.randrange(64) + b')' * depth
+        if rng.random() < 0.05:
+            piece += b')'
+        pieces.append(piece)
+        length += len(piece)
+    return b''.join(pieces)[:size]
+
+
+def benchmarkFile(size):
+    '''
+    Writes size megabytes of parens to a file and times longest_paren_file
+    on it read in chunks and through mmap, with the pure Python passes on
+    the first few megabytes for comparison.
+    '''
+    rng = random.Random(0)
+    block = randomParens(2 ** 24, rng)
+    path = os.path.join(tempfile.mkdtemp(), 'parens')
+    try:
+        with open(path, 'wb') as f:
+            for written in range(0, size * 2 ** 20, len(block)):
+                f.write(block[:size * 2 ** 20 - written])
+        sample = block[:min(size, 4) * 2 ** 20]
+        print("=== Longest valid parens in {} MB ===".format(size))
+        elapsed = timed(longest_paren, sample)
+        print("pure Python, {} MB in memory:  {:.3f}s ({:.1f} MB/s)".format(
+            len(sample) // 2 ** 20, elapsed, len(sample) / 2 ** 20 / elapsed))
+        for chunkSize in (2 ** 16, 2 ** 18, 2 ** 20):
+            for useMmap in (False, True):
+                elapsed = timed(longest_paren_file, path, chunkSize, useMmap)
+                print("{:>5} KB chunks{}:       {:.3f}s ({:.0f} MB/s)".format(
+                    chunkSize // 2 ** 10, ', mmap' if useMmap else '      ',
+                    elapsed, size / elapsed))
+    finally:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+
+def benchmarkParallel(size):
+    '''
+    Writes size megabytes of parens to a file and compares streaming it
+    with longest_paren_file against summarising ranges of it in parallel,
+    doubling the workers from 1 up to the number of cores (at least 4).
+    '''
+    block = randomParens(2 ** 24, random.Random(0))
+    path = os.path.join(tempfile.mkdtemp(), 'parens')
+    try:
+        with open(path, 'wb') as f:
+            for written in range(0, size * 2 ** 20, len(block)):
+                f.write(block[:size * 2 ** 20 - written])
+        print("=== Longest valid parens in {} MB ===".format(size))
+        serial = timed(longest_paren_file, path)
+        print("longest_paren_file:          {:.3f}s ({:.0f} MB/s)".format(
+            serial, size / serial))
+        elapsed = timed(lambda: summarize_file(path).longest())
+        print("summarize_file:              {:.3f}s ({:.0f} MB/s)".format(
+            elapsed, size / elapsed))
+        workers = 2
+        while workers <= max(os.cpu_count() or 1, 4):
+            elapsed = timed(longest_paren_parallel, path, workers)
+            print("parallel, {:>3} workers:      {:.3f}s ({:.2f}x)".format(
+                workers, elapsed, serial / elapsed))
+            workers *= 2
+    finally:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+
+BENCHMARKS = {
+    'file': benchmarkFile,
+    'parallel': benchmarkParallel,
+}
+
+if __name__ == '__main__':
+    name = sys.argv[1] if len(sys.argv) > 1 else 'file'
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    BENCHMARKS[name](size)
@@ -0,0 +1,96 @@
+'''
+Tests for valid_parens.py. Run with pytest from this directory.
+'''
+import random
+import time
+from valid_parens import *
+
+
+def test_summaries_merge_in_any_split():
+    rng = random.Random(0)
+    for trial in range(200):
+        parens = ''.join(rng.choice('(()) ') for i in range(rng.randrange(60)))
+        cuts = sorted(rng.sample(range(len(parens) + 1), min(4, len(parens))))
+        pieces = [summarize(parens[a:b], a)
+                  for a, b in zip([0] + cuts, cuts + [len(parens)])]
+        length, start, stop = merge_summaries(pieces).longest(offsets=True)
+        assert length == longest_paren(parens) == stop - start
+        assert longest_paren(parens[start:stop]) == length
+
+
+def test_merge_leaves_its_inputs_alone():
+    first = summarize('(()(')
+    second = summarize(')))(')
+    before = [(s.closers, s.head, s.tail, s.openers, s.best)
+              for s in (first, second)]
+    merged = first.merge(second)
+    assert merged.longest() == 6
+    assert before == [(s.closers, s.head, s.tail, s.openers, s.best)
+                      for s in (first, second)]
+
+
+def test_folding_unmatched_parens_is_linear(tmp_path):
+    # Every paren stays unmatched and keeps a block in the summary, so a
+    # fold that copied the summary so far at each chunk would be quadratic
+    # here: about 4 * 10**9 list entries copied rather than 4 * 10**6.
+    for paren in (b'(', b')'):
+        path = str(tmp_path / 'parens')
+        with open(path, 'wb') as f:
+            f.write(paren * 2 ** 22)
+        start = time.perf_counter()
+        summary = summarize_file(path, chunk_size=2 ** 11)
+        assert time.perf_counter() - start < 60
+        assert summary.longest() == 0
+        assert len(summary.openers) + len(summary.closers) == 2 ** 22
+
+
+def bruteLongest(parens):
+    '''
+    The longest valid string of parens, checking every substring
+    '''
+    best = 0
+    for start in range(len(parens)):
+        depth = 0
+        for stop in range(start, len(parens)):
+            if parens[stop] == '(':
+                depth += 1
+            elif parens[stop] == ')':
+                depth -= 1
+            if parens[stop] not in '()' or depth < 0:
+                break
+            if depth == 0:
+                best = max(best, stop - start + 1)
+    return best
+
+
+def test_longest_paren():
+    assert longest_paren('') == 0
+    assert longest_paren('(()') == 2
+    assert longest_paren('())') == 2
+    assert longest_paren('(()\n())') == 2
+    assert longest_paren(b')()())', offsets=True) == (4, 1, 5)
+    rng = random.Random(1)
+    for trial in range(300):
+        parens = ''.join(rng.choice('(()) ') for i in range(rng.randrange(40)))
+        length, start, stop = longest_paren(parens, offsets=True)
+        assert length == bruteLongest(parens) == stop - start
+        assert longest_paren(parens.encode()) == length
+        assert bruteLongest(parens[start:stop]) == length
+
+
+def test_longest_paren_file(tmp_path, monkeypatch):
+    rng = random.Random(2)
+    parens = ''.join(rng.choice('(((())))\n') for i in range(5000)).encode()
+    path = str(tmp_path / 'parens')
+    with open(path, 'wb') as f:
+        f.write(parens)
+    expected = longest_paren(parens, offsets=True)
+    for chunk_size in (1, 7, 4096, 2 ** 20):
+        for use_mmap in (False, True):
+            assert longest_paren_file(path, chunk_size, use_mmap,
+                                      offsets=True) == expected
+    # The same answer without NumPy counting the chunks
+    monkeypatch.setitem(longest_paren_file.__globals__, 'numpy', None)
+    assert longest_paren_file(path, 7, offsets=True) == expected
+    open(path, 'wb').close()
+    assert longest_paren_file(path, use_mmap=True) == 0
@@ -1,30 +1,455 @@
 #!/usr/bin/python
 """
 An unusually easy leetcode hard. The problem is to find the length of the
-longest valid string of parentheses. As soon as you see (or for many, 
+longest valid string of parentheses. As soon as you see (or for many,
 remember) the relationship between stacks and valid parens you essentially
-solved the problem. 
+solved the problem.
+
+It turns out you do not even need the stack. Walk forward counting opens
+and closes: whenever they are equal, everything since the last reset is a
+valid string, and whenever closes pull ahead, nothing before them can be
+part of one, so start again. That misses strings inside a run that never
+closes, like the "()" in "(()", so walk backwards as well with the roles
+swapped. Two counters, two passes, and no memory to speak of, which is
+what lets longest_paren_file stream files far bigger than memory. Any
+character other than a paren (a newline, say) breaks up the strings.
+
+To split the work up instead, summarize boils a stretch of parens down to
+a ParenSummary, which is all a neighbouring stretch needs to know about
+it. Summaries merge in order into the summary of the whole, so the pieces
+can be summarised anywhere: longest_paren_parallel does it with a pool of
+processes.
 """
+import mmap
+import os
 import sys
-with open(sys.argv[1]) as f:
-    test_parens = [line for line in f]
-
-def longest_paren(parens):
-    paren_stack = []
-    valid_subs = [1]
-    curr_sum = 0
-    for char in parens:
-        if char == "(":
-            paren_stack.append("(")
-        if char == ")":
-            if paren_stack:
-                paren_stack.pop()
-                curr_sum += 2
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# How many bytes longest_paren_file reads at a time
+CHUNK_SIZE = 2 ** 18
+# Below this many bytes longest_paren_parallel just streams the file
+PARALLEL_THRESHOLD = 2 ** 26
+# Aim for a few ranges of the file per worker, so one slow range does not
+# leave the rest of the pool idle
+TASKS_PER_WORKER = 4
+OPEN = ord('(')
+CLOSE = ord(')')
+
+def longest_paren(parens, offsets=False):
+    """
+    Returns the length of the longest valid string of parens in parens (a
+    str or bytes). With offsets, returns (length, start, stop) instead,
+    where parens[start:stop] is that string.
+    """
+    if isinstance(parens, str):
+        opening, closing = '(', ')'
+    else:
+        opening, closing = OPEN, CLOSE
+    start = (0, 0, (0, 0))
+    forward = _pass_python(parens, 0, opening, closing, start)[2]
+    backward = _pass_python(parens[::-1], 0, closing, opening, start)[2]
+    return _result(forward, backward, len(parens), offsets)
+
+def longest_paren_file(path, chunk_size=CHUNK_SIZE, use_mmap=False,
+                       offsets=False):
+    """
+    longest_paren for the bytes of the file at path, read chunk_size bytes
+    at a time (or through mmap, with use_mmap), so it never has to fit in
+    memory. Offsets are byte offsets into the file. Each chunk is counted
+    with NumPy if it is installed.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if use_mmap and size:
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            source = f
+        try:
+            forward = _pass(_chunks(source, size, chunk_size, False),
+                            OPEN, CLOSE)
+            backward = _pass(_chunks(source, size, chunk_size, True),
+                             CLOSE, OPEN)
+        finally:
+            if source is not f:
+                source.close()
+    return _result(forward, backward, size, offsets)
+
+def _result(forward, backward, size, offsets):
+    """
+    Picks the longer of the best strings found by the two passes, each a
+    (length, start) pair counted from its own end, preferring the forward
+    one on a tie, and returns it as longest_paren does
+    """
+    length, start = forward
+    if backward[0] > length:
+        length = backward[0]
+        # The backward pass counted from the end of the input
+        start = size - backward[1] - length
+    if offsets:
+        return length, start, start + length
+    return length
+
+def _chunks(source, size, chunk_size, backwards):
+    """
+    Yields (position, chunk) for a file object or mmap holding size bytes,
+    front to back, or with backwards back to front with every chunk
+    reversed, so position counts from the end. Chunks are NumPy arrays
+    when NumPy is installed, which over an mmap are views rather than
+    copies.
+    """
+    mapped = isinstance(source, mmap.mmap)
+    if mapped and numpy is not None:
+        whole = numpy.frombuffer(source, dtype=numpy.uint8)
+    for position in range(0, size, chunk_size):
+        stop = size - position if backwards else position + chunk_size
+        start = max(stop - chunk_size, 0) if backwards else position
+        if mapped and numpy is not None:
+            chunk = whole[start:stop]
+        elif mapped:
+            chunk = source[start:stop]
+        else:
+            source.seek(start)
+            chunk = source.read(stop - start)
+            if numpy is not None:
+                chunk = numpy.frombuffer(chunk, dtype=numpy.uint8)
+        yield position, chunk[::-1] if backwards else chunk
+    if mapped and numpy is not None:
+        # The mmap cannot be closed while an array still points into it
+        del whole, chunk
+
+def _pass(chunks, opening, closing):
+    """
+    Runs one counting pass over (position, chunk) pairs and returns the
+    longest valid string it saw as (length, start)
+    """
+    state = (0, 0, (0, 0))
+    for position, chunk in chunks:
+        if numpy is not None:
+            state = _pass_numpy(chunk, position, opening, closing, state)
+        else:
+            state = _pass_python(chunk, position, opening, closing, state)
+    return state[2]
+
+def _pass_python(parens, position, opening, closing, state):
+    """
+    Counts one chunk the plain way. state is the (depth, run_start, best)
+    left by the chunk before: how many opens are still waiting for a close,
+    where the current run began and the longest string so far as (length,
+    start). Returns the state after this chunk.
+    """
+    depth, run_start, best = state
+    for index, char in enumerate(parens, position):
+        if char == opening:
+            depth += 1
+        elif char == closing and depth:
+            depth -= 1
+            if depth == 0 and index + 1 - run_start > best[0]:
+                best = (index + 1 - run_start, run_start)
+        else:
+            # Too many closes, or not a paren at all
+            depth = 0
+            run_start = index + 1
+    return depth, run_start, best
+
+def _pass_numpy(chunk, position, opening, closing, state):
+    """
+    _pass_python for a uint8 array, with the loop done as prefix sums. An
+    open is +1 and a close -1, and the running depth is the prefix sum less
+    its running minimum: a new minimum is a reset, and touching the minimum
+    again closes a valid string.
+    """
+    depth, run_start, best = state
+    prefix, lowest = _prefix_minimum(chunk, opening, closing, depth)
+    # Where each reset happened, led by the one the carried run began after
+    resets = numpy.flatnonzero(lowest[1:] != lowest[:-1]) + 1
+    first = [0] if lowest[0] < -depth else []
+    resets = numpy.concatenate(
+        ([run_start - position - 1], first, resets)).astype(numpy.int64)
+    # Every byte back at the minimum ends a valid string since the last
+    # reset (resets themselves end an empty one)
+    closed = numpy.flatnonzero(prefix == lowest)
+    if len(closed):
+        starts = resets[numpy.searchsorted(resets, closed, side='right') - 1]
+        lengths = closed - starts
+        longest = lengths.argmax()
+        if lengths[longest] > best[0]:
+            best = (int(lengths[longest]),
+                    position + int(starts[longest]) + 1)
+    run_start = position + int(resets[-1]) + 1
+    return int(prefix[-1] - lowest[-1]), run_start, best
+
+def _prefix_minimum(chunk, opening, closing, depth):
+    """
+    Returns the prefix sums of a uint8 array of parens and their running
+    minimum, as _pass_numpy uses them, for a run entering depth deep. The
+    sums start from 0 rather than depth, so the minimum the carried run
+    started from is -depth. Anything but a paren is a drop deeper than the
+    depth could have reached, so it always sets a new minimum.
+    """
+    steps = (chunk == opening).view(numpy.int8) - \
+        (chunk == closing).view(numpy.int8)
+    walls = numpy.flatnonzero(steps == 0)
+    drop = depth + len(chunk) + 1
+    # Paren files rarely have anything else in them, and without it the
+    # sums fit in half the memory, which makes every step quicker
+    if len(walls) or drop >= 2 ** 31:
+        prefix = steps.astype(numpy.int64)
+        prefix[walls] = -drop
+    else:
+        prefix = steps.astype(numpy.int32)
+    # Summed in place, since cumsum would otherwise widen int32 to int64
+    numpy.cumsum(prefix, out=prefix)
+    lowest = numpy.minimum.accumulate(prefix)
+    numpy.minimum(lowest, -depth, out=lowest)
+    return prefix, lowest
+
+def _resets_numpy(chunk, opening, closing):
+    """
+    Returns the indices in a uint8 array where a pass starting from depth
+    0 would reset: the unmatched closes and anything but a paren
+    """
+    if not len(chunk):
+        return numpy.empty(0, dtype=numpy.int64)
+    lowest = _prefix_minimum(chunk, opening, closing, 0)[1]
+    resets = numpy.flatnonzero(lowest[1:] != lowest[:-1]) + 1
+    if lowest[0] < 0:
+        resets = numpy.concatenate(([0], resets))
+    return resets
+
+def _resets_python(parens, opening, closing):
+    """
+    _resets_numpy for a str or bytes, the plain way
+    """
+    resets = []
+    depth = 0
+    for index, char in enumerate(parens):
+        if char == opening:
+            depth += 1
+        elif char == closing and depth:
+            depth -= 1
+        else:
+            depth = 0
+            resets.append(index)
+    return resets
+
+class ParenSummary(object):
+    """
+    What the rest of the input needs to know about one stretch of parens to
+    find the longest valid string across it. Once its matching pairs are
+    cancelled, a stretch always comes down to
+
+        closers[0] ) closers[1] ) ... ) head ( openers[0] ( openers[1] ...
+
+    where every number is the length of a block of valid parens, or, if
+    anything other than a paren turns up in it, to
+
+        closers[0] ) ... ) head  ...  tail ( openers[0] ( ...
+
+    with everything between head and tail sealed off for good. Only the
+    unmatched parens at the ends can still be matched by a neighbour, so
+    only the blocks around them are kept, along with the longest block seen
+    anywhere (best, starting at offset best_start). That is usually a
+    handful of numbers, though a stretch with a lot of unmatched parens
+    keeps a block for each of them.
+
+    merge is associative: summaries can be made for pieces of any size, in
+    any grouping, and merged in order. extend does the same in place, for
+    folding a long run of summaries into one.
+    """
+    __slots__ = ('start', 'length', 'closers', 'head', 'tail', 'openers',
+                 'best', 'best_start')
+
+    def __init__(self, start=0, length=0, closers=(), head=0, tail=None,
+                 openers=(), best=0, best_start=None):
+        self.start = start
+        self.length = length
+        self.closers = list(closers)
+        self.head = head
+        # None while the stretch holds nothing but parens
+        self.tail = tail
+        self.openers = list(openers)
+        self.best = best
+        self.best_start = start if best_start is None else best_start
+
+    def copy(self):
+        """
+        Returns a summary of the same stretch that shares no lists with this
+        one
+        """
+        return ParenSummary(self.start, self.length, self.closers, self.head,
+                            self.tail, self.openers, self.best,
+                            self.best_start)
+
+    def merge(self, other):
+        """
+        Returns the summary of this stretch followed straight on by other,
+        leaving both as they are
+        """
+        return self.copy().extend(other)
+
+    def extend(self, other):
+        """
+        Turns this summary, in place, into that of this stretch followed
+        straight on by other, and returns it. Only the blocks other still
+        leaves open are copied over, so folding summaries into one keeps
+        the cost of each step to the size of what it adds, even when
+        unmatched parens pile up, rather than copying everything so far.
+        """
+        if other is self:
+            other = other.copy()
+        end = self.start + self.length
+        opens = self.openers
+        closes = other.closers
+        matched = min(len(opens), len(closes))
+        # The last opens here match the first closes there, and they and the
+        # blocks between them join into one block with whatever is either
+        # side of them
+        inner = sum(opens[len(opens) - matched:]) + sum(closes[:matched]) + \
+            2 * matched
+        first = self.head if self.tail is None else self.tail
+        if len(opens) > matched:
+            joined = opens[-matched - 1] + inner + other.head
+            joined_start = end - sum(opens[-matched - 1:]) - matched
+            if other.tail is None:
+                del opens[len(opens) - matched - 1:]
+                opens.append(joined)
+                opens.extend(other.openers)
             else:
-                valid_subs.append(curr_sum)
-                curr_sum = 0
-    valid_subs.append(curr_sum)
-    return max(valid_subs)  
+                self.tail = other.tail
+                self.openers = list(other.openers)
+        else:
+            # Every open here is matched, so only other's are left open
+            joined_start = end - sum(opens) - len(opens) - first
+            if len(closes) > matched:
+                joined = first + inner + closes[matched]
+                if self.tail is None:
+                    self.closers.append(joined)
+                    self.closers.extend(closes[matched + 1:])
+                    self.head, self.tail = other.head, other.tail
+                else:
+                    # Our wall seals off the closes left over there
+                    self.tail = other.head if other.tail is None \
+                        else other.tail
+            else:
+                joined = first + inner + other.head
+                if self.tail is None:
+                    self.head, self.tail = joined, other.tail
+                else:
+                    self.tail = joined if other.tail is None else other.tail
+            self.openers = list(other.openers)
+        self.best, self.best_start = max(
+            (self.best, self.best_start), (other.best, other.best_start),
+            (joined, joined_start),
+            key=lambda candidate: (candidate[0], -candidate[1]))
+        self.length += other.length
+        return self
+
+    def longest(self, offsets=False):
+        """
+        Returns the length of the longest valid string in the stretch, or
+        with offsets (length, start, stop) as longest_paren does
+        """
+        if offsets:
+            return self.best, self.best_start, self.best_start + self.best
+        return self.best
+
+def summarize(parens, start=0):
+    """
+    Returns the ParenSummary of parens (a str, bytes or uint8 NumPy array),
+    taking it to begin at offset start of the whole input
+    """
+    length = len(parens)
+    if not length:
+        return ParenSummary(start)
+    if numpy is not None and not isinstance(parens, str):
+        opening, closing = OPEN, CLOSE
+        if not isinstance(parens, numpy.ndarray):
+            parens = numpy.frombuffer(parens, dtype=numpy.uint8)
+        # The unmatched parens are where a forward pass resets (the closes)
+        # and where a backward one does (the opens)
+        barriers = numpy.union1d(
+            _resets_numpy(parens, OPEN, CLOSE),
+            length - 1 - _resets_numpy(parens[::-1], CLOSE, OPEN))
+        kinds = parens[barriers].tolist()
+        barriers = barriers.tolist()
+    else:
+        if isinstance(parens, str):
+            opening, closing = '(', ')'
+        else:
+            opening, closing = OPEN, CLOSE
+        backward = _resets_python(parens[::-1], closing, opening)
+        barriers = sorted(set(_resets_python(parens, opening, closing)) |
+                          {length - 1 - index for index in backward})
+        kinds = [parens[index] for index in barriers]
+    edges = [-1] + barriers + [length]
+    # blocks[i] is the valid block just before barrier i (the last one runs
+    # to the end)
+    blocks = [after - before - 1 for before, after in zip(edges, edges[1:])]
+    longest = max(range(len(blocks)), key=blocks.__getitem__)
+    leading = 0
+    while leading < len(kinds) and kinds[leading] == closing:
+        leading += 1
+    trailing = 0
+    while trailing < len(kinds) - leading and kinds[-1 - trailing] == opening:
+        trailing += 1
+    # Unmatched closes come before unmatched opens unless something that
+    # is not a paren stands between them
+    sealed = leading + trailing < len(kinds)
+    return ParenSummary(
+        start, length, blocks[:leading], blocks[leading],
+        blocks[len(kinds) - trailing] if sealed else None,
+        blocks[len(blocks) - trailing:], blocks[longest],
+        start + edges[longest] + 1)
+
+def merge_summaries(summaries, start=0):
+    """
+    Merges the summaries of consecutive stretches, in order, into one. An
+    empty list gives the summary of nothing at offset start.
+    """
+    return reduce(ParenSummary.extend, summaries, ParenSummary(start))
+
+def summarize_file(path, start=0, stop=None, chunk_size=CHUNK_SIZE):
+    """
+    Returns the ParenSummary of bytes start up to stop (by default the end)
+    of the file at path, reading chunk_size bytes at a time
+    """
+    if stop is None:
+        stop = os.path.getsize(path)
+    summary = ParenSummary(start)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for position in range(start, stop, chunk_size):
+            chunk = f.read(min(chunk_size, stop - position))
+            summary.extend(summarize(chunk, position))
+    return summary
+
+def longest_paren_parallel(path, workers=None, chunk_size=CHUNK_SIZE,
+                           offsets=False):
+    """
+    longest_paren_file with the file split into ranges that a pool of
+    workers processes (by default one per core) summarise at the same time.
+    The summaries are merged in order for the answer. Small files, or a
+    single worker, are just streamed.
+    """
+    size = os.path.getsize(path)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or size < PARALLEL_THRESHOLD:
+        return longest_paren_file(path, chunk_size, offsets=offsets)
+    step = -(-size // (workers * TASKS_PER_WORKER))
+    starts = list(range(0, size, step))
+    with ProcessPoolExecutor(workers) as pool:
+        summaries = pool.map(summarize_file, [path] * len(starts), starts,
+                             [min(start + step, size) for start in starts],
+                             [chunk_size] * len(starts))
+        return merge_summaries(summaries).longest(offsets)
+
 
-for paren in test_parens:
-    print(longest_paren(paren))
+if __name__ == '__main__':
+    with open(sys.argv[1]) as f:
+        for paren in f:
+            print(longest_paren(paren))